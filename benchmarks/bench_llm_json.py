@@ -0,0 +1,122 @@
+"""
+Benchmark de `extract_json` contra la implementación anterior (regex DOTALL +
+`re.findall(r'(\\{.*\\})')` + json.loads por coincidencia) sobre entradas
+patológicas, y del extractor incremental alimentado por fragmentos.
+
+Uso:
+    python -m benchmarks.bench_llm_json [--size 200000] [--repeat 5] [--chunk 64]
+"""
+
+import re
+import json
+import time
+import argparse
+import timeit
+from typing import Any, Callable
+
+from utils.llm_json import JsonStreamExtractor, extract_json
+
+
+def _extract_json_anterior(text):
+    # Copia de la implementación previa, como referencia
+    md_json = re.search(r"```(?:json)?\s*(\{.*?\})\s*```", text, re.DOTALL)
+    if md_json:
+        text = md_json.group(1)
+    text = text.strip()
+    try:
+        return json.loads(text)
+    except Exception:
+        matches = re.findall(r'(\{.*\})', text, re.DOTALL)
+        for m in matches:
+            try:
+                return json.loads(m)
+            except Exception:
+                continue
+    raise ValueError("No se encontró un JSON válido en la respuesta.")
+
+
+def _objeto(n_campos: int) -> str:
+    return json.dumps({
+        str(2015 + i % 10): {f"Campo {j}": str(j * 1000) for j in range(16)}
+        for i in range(n_campos)
+    }, ensure_ascii=False)
+
+
+def _casos(size: int) -> dict[str, str]:
+    objeto = _objeto(4)
+    prosa = "La empresa {nota} reporta cifras \"relevantes\" del ejercicio. "
+    relleno = prosa * (size // len(prosa) + 1)
+    return {
+        # Lo normal: bloque ```json con poca prosa
+        "markdown_normal": f"Aquí está el resultado:\n```json\n{objeto}\n```\n",
+        # Respuesta larga y conversacional con llaves sueltas antes y después del JSON
+        "prosa_con_llaves": f"{relleno}\n```json\n{objeto}\n```\n{relleno}",
+        # Muchas aperturas sin cierre: el regex perezoso dentro del fence retrocede
+        "fence_sin_cierre": "```json\n" + "{" * (size // 10) + "\n" + "x" * size + "\n```\n" + objeto,
+        # Muchos fences sin cierre válido: el regex reintenta desde cada uno hasta el final
+        "fences_sin_cierre": "```json\n{\"a\" texto} más\n" * (size // 24) + objeto,
+        # Anidamiento profundo sin cerrar antes del JSON real
+        "anidado_profundo": '{"a": ' * (size // 6) + "\n" + objeto,
+        # Muchos objetos pequeños inválidos seguidos del JSON real
+        "muchas_llaves": "{a} " * (size // 4) + objeto,
+        # JSON grande sin markdown
+        "json_grande": _objeto(max(1, size // 1200)),
+    }
+
+
+def _medir(func: Callable[[str], Any], texto: str, repeat: int) -> tuple[float, Any]:
+    try:
+        resultado = func(texto)
+    except ValueError as e:
+        resultado = e
+    tiempos = timeit.repeat(lambda: _intentar(func, texto), number=1, repeat=repeat)
+    return min(tiempos), resultado
+
+
+def _intentar(func, texto):
+    try:
+        return func(texto)
+    except ValueError:
+        return None
+
+
+def _tiempo_a_resultado(texto: str, chunk: int) -> tuple[float, int]:
+    """
+    Alimenta el extractor por fragmentos y devuelve (segundos, fragmentos consumidos)
+    hasta obtener el objeto.
+    """
+    extractor = JsonStreamExtractor()
+    inicio = time.perf_counter()
+    for n, i in enumerate(range(0, len(texto), chunk), start=1):
+        if extractor.feed(texto[i:i + chunk]) is not None:
+            return time.perf_counter() - inicio, n
+    return time.perf_counter() - inicio, -1
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=200_000, help="tamaño aproximado del texto patológico")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--chunk", type=int, default=64, help="tamaño de fragmento para el modo streaming")
+    args = parser.parse_args()
+
+    print(f"{'caso':<20} {'chars':>9} {'anterior':>12} {'nuevo':>12} {'x':>8}  {'resultado':>10}  streaming")
+    for nombre, texto in _casos(args.size).items():
+        t_ant, r_ant = _medir(_extract_json_anterior, texto, args.repeat)
+        t_new, r_new = _medir(extract_json, texto, args.repeat)
+        t_stream, fragmentos = _tiempo_a_resultado(texto, args.chunk)
+        total = (len(texto) + args.chunk - 1) // args.chunk
+        if r_ant == r_new:
+            mismo = "sí"
+        elif isinstance(r_ant, ValueError):
+            mismo = "sólo nuevo" if not isinstance(r_new, ValueError) else "ninguno"
+        else:
+            mismo = "no"
+        print(
+            f"{nombre:<20} {len(texto):>9} {t_ant * 1000:>10.2f}ms {t_new * 1000:>10.2f}ms "
+            f"{t_ant / t_new:>7.1f}x  {mismo:>10}  {t_stream * 1000:.2f}ms, {fragmentos}/{total} fragmentos"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,326 @@
+"""
+Prueba de carga de extremo a extremo con Gemini simulado.
+
+Levanta:
+  - Un servidor HTTP local que sirve PDFs sintéticos para `downloadUrl`.
+  - El servicio con uvicorn (`benchmarks.stub_app:app`) y el stub de
+    `google.generativeai` (ver benchmarks/gemini_stub.py para la latencia,
+    tasa de error y tamaño de respuesta).
+
+Después recorre cada ruta a cada nivel de concurrencia y reporta throughput,
+latencias p50/p95/p99, errores y memoria RSS máxima por worker (vía /proc).
+
+Uso:
+    python -m benchmarks.bench_load --workers 6 --concurrency 1,8,32 --duration 20
+    python -m benchmarks.bench_load --routes analyze_info,financial_analytics \\
+        --stub-latency-ms 1200 --stub-error-rate 0.05 --json resultados.json
+
+Con --unique-pdfs cada petición descarga un PDF distinto (sin hits de caché).
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import argparse
+import itertools
+import subprocess
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+import httpx
+
+ACCESS_TOKEN = "bench-token"
+HEADERS = {"Authorization": f"Bearer {ACCESS_TOKEN}"}
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ROUTES = [
+    "analyze_pdf",
+    "analyze_url_pdf",
+    "analyze_info",
+    "analyze_info_stream",
+    "financial_analytics",
+    "financial_analytics_external",
+]
+
+
+def _puerto_libre() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _pdf_sintetico(nombre: str, tamano: int) -> bytes:
+    cuerpo = f"%PDF-1.4\n% {nombre}\n".encode()
+    relleno = b"0" * max(0, tamano - len(cuerpo) - 6)
+    return cuerpo + relleno + b"\n%%EOF"
+
+
+# --- Servidor de PDFs ---
+
+class _PdfHandler(BaseHTTPRequestHandler):
+    tamano = 200_000
+
+    def do_GET(self):
+        contenido = _pdf_sintetico(self.path, self.tamano)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/pdf")
+        self.send_header("Content-Length", str(len(contenido)))
+        self.end_headers()
+        self.wfile.write(contenido)
+
+    def log_message(self, *args):
+        pass
+
+
+def _iniciar_servidor_pdfs(tamano: int) -> tuple[ThreadingHTTPServer, str]:
+    _PdfHandler.tamano = tamano
+    servidor = ThreadingHTTPServer(("127.0.0.1", _puerto_libre()), _PdfHandler)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return servidor, f"http://127.0.0.1:{servidor.server_address[1]}"
+
+
+# --- Servicio bajo prueba ---
+
+def _iniciar_servicio(args, puerto: int) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        "GEMINI_API_KEY": "stub",
+        "FIREBASE_PROJECT_ID": "bench",
+        "ACCESS_TOKEN": ACCESS_TOKEN,
+        "STUB_LATENCY_MS": str(args.stub_latency_ms),
+        "STUB_ERROR_RATE": str(args.stub_error_rate),
+        "STUB_PAYLOAD_CHARS": str(args.stub_payload_chars),
+        # Todas las peticiones usan el token estático (un solo tenant): sin
+        # admisión para medir el servicio y no el límite por tenant
+        "ADMISSION_ENABLED": "false",
+    }
+    return subprocess.Popen(
+        [
+            sys.executable, "-m", "uvicorn", "benchmarks.stub_app:app",
+            "--host", "127.0.0.1", "--port", str(puerto),
+            "--workers", str(args.workers), "--log-level", "warning",
+        ],
+        cwd=RAIZ,
+        env=env,
+        stdout=subprocess.DEVNULL if not args.verbose else None,
+    )
+
+
+def _esperar_servicio(base_url: str, timeout: float = 30) -> None:
+    limite = time.time() + timeout
+    while time.time() < limite:
+        try:
+            if httpx.get(f"{base_url}/openapi.json", timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError("El servicio no respondió a tiempo")
+
+
+def _pids_workers(pid_padre: int) -> list[int]:
+    try:
+        with open(f"/proc/{pid_padre}/task/{pid_padre}/children") as f:
+            return [int(p) for p in f.read().split()]
+    except OSError:
+        return []
+
+
+def _rss_kb(pid: int) -> Optional[int]:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for linea in f:
+                if linea.startswith("VmRSS:"):
+                    return int(linea.split()[1])
+    except OSError:
+        return None
+    return None
+
+
+class _MuestreoMemoria:
+    """Registra el RSS máximo de cada worker mientras dura una corrida."""
+
+    def __init__(self, pid_padre: int, intervalo: float = 0.2):
+        self.pid_padre = pid_padre
+        self.intervalo = intervalo
+        self.maximos: dict[int, int] = {}
+        self._detener = threading.Event()
+
+    def __enter__(self):
+        self._hilo = threading.Thread(target=self._correr, daemon=True)
+        self._hilo.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._detener.set()
+        self._hilo.join()
+
+    def _correr(self):
+        while not self._detener.is_set():
+            for pid in _pids_workers(self.pid_padre):
+                rss = _rss_kb(pid)
+                if rss is not None:
+                    self.maximos[pid] = max(self.maximos.get(pid, 0), rss)
+            self._detener.wait(self.intervalo)
+
+
+# --- Generador de carga ---
+
+def _datos_externos() -> dict:
+    return {
+        str(anio): {
+            "Total Activo Circulante": "10500000", "Total Pasivo a Corto Plazo": "6500",
+            "Total Activo": "27869960", "Total Pasivo": "12721", "Ingresos": "31084188",
+            "Utilidad o pérdida del ejercicio": "456408", "Total Capital Contable": "15148",
+        }
+        for anio in range(2019, 2024)
+    }
+
+
+def _peticion(route: str, pdf_url: str, contador: itertools.count, args) -> tuple[str, str, dict]:
+    """Devuelve (método, ruta, kwargs de httpx) para una petición de `route`."""
+    n = next(contador)
+    sufijo = f"?n={n}" if args.unique_pdfs else ""
+    if route == "analyze_pdf":
+        contenido = _pdf_sintetico(f"upload-{n if args.unique_pdfs else 0}", args.pdf_bytes)
+        return "POST", "/analyze_pdf/INE", {"files": {"file": ("doc.pdf", contenido, "application/pdf")}}
+    if route == "analyze_url_pdf":
+        return "POST", "/analyze_url_pdf/INE", {"json": {"downloadUrl": f"{pdf_url}/doc.pdf{sufijo}"}}
+    if route == "analyze_info":
+        return "POST", "/analyze_info", {"json": {"prompt": "Resume la situación financiera.", "contexto": "x" * 2000}}
+    if route == "analyze_info_stream":
+        return "POST", "/analyze_info/stream", {"json": {"prompt": "Resume la situación financiera.", "contexto": "x" * 2000}}
+    if route == "financial_analytics":
+        return "POST", "/financial/analytics", {"json": [
+            {"downloadUrl": f"{pdf_url}/{anio}.pdf{sufijo}"} for anio in range(2019, 2019 + args.years)
+        ]}
+    if route == "financial_analytics_external":
+        return "POST", "/financial/analytics/external", {"json": _datos_externos()}
+    raise ValueError(f"Ruta desconocida: {route}")
+
+
+def _percentil(valores: list[float], p: float) -> Optional[float]:
+    if not valores:
+        return None
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(p * len(ordenados)))]
+
+
+async def _correr(base_url: str, pdf_url: str, route: str, concurrencia: int, args) -> dict:
+    latencias: list[float] = []
+    errores: dict[str, int] = {}
+    contador = itertools.count()
+    fin = time.perf_counter() + args.duration
+
+    limits = httpx.Limits(max_connections=concurrencia, max_keepalive_connections=concurrencia)
+    async with httpx.AsyncClient(base_url=base_url, headers=HEADERS, timeout=args.timeout, limits=limits) as client:
+        async def usuario():
+            while time.perf_counter() < fin:
+                metodo, ruta, kwargs = _peticion(route, pdf_url, contador, args)
+                inicio = time.perf_counter()
+                try:
+                    resp = await client.request(metodo, ruta, **kwargs)
+                    if resp.status_code == 200:
+                        latencias.append(time.perf_counter() - inicio)
+                    else:
+                        errores[str(resp.status_code)] = errores.get(str(resp.status_code), 0) + 1
+                except httpx.HTTPError as e:
+                    errores[type(e).__name__] = errores.get(type(e).__name__, 0) + 1
+
+        inicio = time.perf_counter()
+        await asyncio.gather(*(usuario() for _ in range(concurrencia)))
+        transcurrido = time.perf_counter() - inicio
+
+    def ms(v):
+        return round(v * 1000, 1) if v is not None else None
+
+    return {
+        "route": route,
+        "concurrencia": concurrencia,
+        "ok": len(latencias),
+        "errores": errores,
+        "rps": round(len(latencias) / transcurrido, 2),
+        "p50_ms": ms(_percentil(latencias, 0.50)),
+        "p95_ms": ms(_percentil(latencias, 0.95)),
+        "p99_ms": ms(_percentil(latencias, 0.99)),
+    }
+
+
+def _imprimir(resultado: dict) -> None:
+    errores = sum(resultado["errores"].values())
+    print(
+        f"{resultado['route']:<30} c={resultado['concurrencia']:<4} "
+        f"ok={resultado['ok']:<6} err={errores:<5} rps={resultado['rps']:<8} "
+        f"p50={resultado['p50_ms']}ms p95={resultado['p95_ms']}ms p99={resultado['p99_ms']}ms "
+        f"rss_max={resultado['rss_max_mb']}MB/worker"
+    )
+
+
+def _commit_actual() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=RAIZ, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--routes", default=",".join(ROUTES), help="rutas separadas por coma")
+    parser.add_argument("--concurrency", default="1,8,32", help="niveles de concurrencia separados por coma")
+    parser.add_argument("--duration", type=float, default=15, help="segundos por corrida")
+    parser.add_argument("--workers", type=int, default=6, help="workers de uvicorn")
+    parser.add_argument("--timeout", type=float, default=120, help="timeout por petición (s)")
+    parser.add_argument("--years", type=int, default=3, help="PDFs por petición de /financial/analytics")
+    parser.add_argument("--pdf-bytes", type=int, default=200_000, help="tamaño de los PDFs sintéticos")
+    parser.add_argument("--unique-pdfs", action="store_true", help="un PDF distinto por petición")
+    parser.add_argument("--stub-latency-ms", type=float, default=800)
+    parser.add_argument("--stub-error-rate", type=float, default=0.0)
+    parser.add_argument("--stub-payload-chars", type=int, default=1500)
+    parser.add_argument("--json", help="guarda los resultados en este archivo")
+    parser.add_argument("--verbose", action="store_true", help="muestra la salida del servicio")
+    args = parser.parse_args()
+
+    routes = [r.strip() for r in args.routes.split(",") if r.strip()]
+    niveles = [int(c) for c in args.concurrency.split(",")]
+
+    servidor_pdfs, pdf_url = _iniciar_servidor_pdfs(args.pdf_bytes)
+    puerto = _puerto_libre()
+    base_url = f"http://127.0.0.1:{puerto}"
+    servicio = _iniciar_servicio(args, puerto)
+    resultados = []
+    try:
+        _esperar_servicio(base_url)
+        for route in routes:
+            for concurrencia in niveles:
+                with _MuestreoMemoria(servicio.pid) as memoria:
+                    resultado = asyncio.run(_correr(base_url, pdf_url, route, concurrencia, args))
+                resultado["rss_max_mb"] = round(max(memoria.maximos.values(), default=0) / 1024, 1)
+                resultado["rss_por_worker_mb"] = {
+                    str(pid): round(kb / 1024, 1) for pid, kb in sorted(memoria.maximos.items())
+                }
+                resultados.append(resultado)
+                _imprimir(resultado)
+    finally:
+        servicio.terminate()
+        try:
+            servicio.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            servicio.kill()
+        servidor_pdfs.shutdown()
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({
+                "commit": _commit_actual(),
+                "parametros": vars(args),
+                "resultados": resultados,
+            }, f, indent=2, ensure_ascii=False)
+        print(f"Resultados guardados en {args.json}")
+
+
+if __name__ == "__main__":
+    main()
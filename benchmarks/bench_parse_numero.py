@@ -0,0 +1,133 @@
+"""
+Micro-benchmark del normalizador numérico contra la implementación anterior
+de `_parse_numero` (cadena de str.replace), sobre valores típicos del LLM.
+
+Los montos se generan al azar y son todos distintos, como en una cartera real;
+los formatos siguen los que aparecen en las respuestas de Gemini.
+
+Uso:
+    python -m benchmarks.bench_parse_numero [--n 200000] [--repeat 5] [--sucios 0.2]
+"""
+
+import argparse
+import random
+import timeit
+from typing import Optional, Union
+
+from utils.numberNormalizer import MODO_AUTO, MODO_ENTEROS, parse_numero
+
+# Valores con la forma que devuelve Gemini con PROMPT_ESTADO_SITUACION_FINANCIERA:
+# la mayoría enteros limpios o vacíos, y una fracción con formato residual.
+MUESTRAS_LIMPIAS = [
+    "31084188", "24591962", "10500", "3500000", "2020513", "456408", "0", "", "",
+]
+MUESTRAS_SUCIAS = [
+    "12,721", "$ 26,621", "(12,300)", "-3500", "USD 45,000", "45,000 MXN",
+    "1,234,567.00", "12721.65", "n/a", "Sin dato", "15%", "+2,020,513",
+    456408, 27869960.0, None,
+]
+MUESTRAS = MUESTRAS_LIMPIAS + MUESTRAS_SUCIAS
+
+# Formatos residuales con los que se generan montos distintos
+FORMATOS_SUCIOS = [
+    lambda n: f"{n:,}",
+    lambda n: f"$ {n:,}",
+    lambda n: f"({n:,})",
+    lambda n: f"-{n}",
+    lambda n: f"USD {n:,}",
+    lambda n: f"{n:,} MXN",
+    lambda n: f"{n:,}.{n % 100:02d}",
+    lambda n: f"{n}.{n % 100:02d}",
+    lambda n: f"{n % 100}%",
+    lambda n: f"+{n:,}",
+]
+
+
+def _limpio(rng: random.Random) -> str:
+    return "" if rng.random() < 0.1 else str(rng.randrange(1_000_000_000))
+
+
+def _sucio(rng: random.Random) -> str:
+    return rng.choice(FORMATOS_SUCIOS)(rng.randrange(1_000, 1_000_000_000))
+
+
+def _parse_numero_anterior(valor: Union[str, float, int, None]) -> Optional[float]:
+    # Copia de la implementación previa, como referencia
+    if valor is None:
+        return None
+    if isinstance(valor, (int, float)):
+        return abs(float(valor))
+    if not isinstance(valor, str):
+        return None
+
+    s = valor.strip()
+    if not s or s.lower() in ["na", "n/a", "sin dato"]:
+        return None
+    if s.startswith("(") and s.endswith(")"):
+        s = s[1:-1]
+    for simbolo in ["$", "USD", "MXN", "%", "+", "-"]:
+        s = s.replace(simbolo, "")
+    s = s.replace(",", "")
+    s = s.replace(".", "")
+    try:
+        val = float(s)
+        return abs(val)
+    except ValueError:
+        return None
+
+
+def _mismo(a: Optional[float], b: Optional[float]) -> bool:
+    return a == b or (a is None and b is None)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n", type=int, default=200_000, help="valores por corrida")
+    parser.add_argument("--repeat", type=int, default=5, help="corridas (se reporta la mejor)")
+    parser.add_argument("--sucios", type=float, default=0.2, help="fracción de valores con formato residual")
+    args = parser.parse_args()
+
+    # El modo "enteros" debe ser idéntico a la implementación anterior
+    for v in MUESTRAS:
+        assert _mismo(parse_numero(v, MODO_ENTEROS), _parse_numero_anterior(v)), v
+
+    rng = random.Random(0)
+    distribuciones = {
+        f"mezcla ({args.sucios:.0%} con formato)": [
+            _sucio(rng) if rng.random() < args.sucios else _limpio(rng) for _ in range(args.n)
+        ],
+        "sólo valores con formato": [_sucio(rng) for _ in range(args.n)],
+    }
+    for valores in distribuciones.values():
+        for v in valores[:5000]:
+            assert _mismo(parse_numero(v, MODO_ENTEROS), _parse_numero_anterior(v)), v
+
+    for titulo, valores in distribuciones.items():
+        casos = {
+            "anterior (str.replace)": lambda: [_parse_numero_anterior(v) for v in valores],
+            "parse_numero enteros": lambda: [parse_numero(v, MODO_ENTEROS) for v in valores],
+            "parse_numero auto": lambda: [parse_numero(v, MODO_AUTO) for v in valores],
+        }
+
+        # Corridas intercaladas entre casos: el ruido del host afecta a todos por igual
+        mejores = dict.fromkeys(casos, float("inf"))
+        for _ in range(args.repeat):
+            for nombre, fn in casos.items():
+                mejores[nombre] = min(mejores[nombre], timeit.timeit(fn, number=1))
+
+        base = mejores["anterior (str.replace)"]
+        distintos = len(set(valores))
+        print(f"{titulo}: {args.n} valores ({distintos} distintos), mejor de {args.repeat} corridas")
+        for nombre, mejor in mejores.items():
+            print(f"  {nombre:<24} {mejor * 1000:8.1f} ms  {mejor * 1e9 / args.n:7.1f} ns/valor  x{base / mejor:4.1f}")
+        print()
+
+    print("Diferencias de interpretación (anterior → auto):")
+    for v in MUESTRAS:
+        antes, ahora = _parse_numero_anterior(v), parse_numero(v)
+        if not _mismo(antes, ahora):
+            print(f"  {v!r:>18}: {antes} → {ahora}")
+
+
+if __name__ == "__main__":
+    main()
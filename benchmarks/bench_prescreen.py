@@ -0,0 +1,316 @@
+"""
+Exactitud de la pre-clasificación local de /analyze_pdf contra los veredictos del modelo.
+
+Para cada par (PDF, tipo_doc) compara lo que respondería prescreen_service con
+huellas de texto (sin índice de hashes) contra el veredicto de Gemini, y reporta:
+  - cobertura: pares que se responden sin llamar al modelo,
+  - exactitud sobre los respondidos, falsos positivos y falsos negativos,
+  - tiempo de lectura + clasificación por PDF (p50/p95),
+  - desglose por tipo_doc y los desacuerdos, para ajustar huellas y umbrales.
+
+Fuentes de veredictos:
+  --verdicts archivo.jsonl   líneas {"archivo", "tipo_doc", "esDocumentoValido", "documentoDetectado"}
+                             con rutas relativas a --dir (p. ej. exportadas de producción).
+  --llm                      los obtiene llamando a Gemini (GEMINI_API_KEY) para cada PDF de
+                             --dir y cada tipo de --tipos, y los guarda en --verdicts.
+  --sintetico N              genera N PDFs con capa de texto por tipo más distractores
+                             y escaneos; el veredicto es la etiqueta del generador.
+
+Uso:
+    python -m benchmarks.bench_prescreen --sintetico 20
+    python -m benchmarks.bench_prescreen --dir muestras/ --verdicts veredictos.jsonl
+    python -m benchmarks.bench_prescreen --dir muestras/ --tipos INE,CSF,CFDI --llm --verdicts veredictos.jsonl
+"""
+
+import os
+import io
+import json
+import time
+import random
+import asyncio
+import argparse
+import hashlib
+from collections import defaultdict
+
+from services import prescreen_service
+from utils import doc_fingerprints
+
+_CARTA = (612, 792)
+_CREDENCIAL = (243, 153)
+
+
+def _pdf_con_texto(paginas: list[list[str]], tamano: tuple[int, int] = _CARTA) -> bytes:
+    """
+    PDF mínimo con una línea de texto Helvetica por elemento de cada página.
+    """
+    n = len(paginas)
+    objetos = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        f"<< /Type /Pages /Kids [{' '.join(f'{4 + 2 * i} 0 R' for i in range(n))}] /Count {n} >>".encode(),
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>",
+    ]
+    for i, lineas in enumerate(paginas):
+        operaciones = ["BT", "/F1 6 Tf", "8 TL", f"10 {tamano[1] - 14} Td"]
+        for linea in lineas:
+            linea = linea.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+            operaciones.append(f"({linea}) Tj T*")
+        operaciones.append("ET")
+        contenido = "\n".join(operaciones).encode("cp1252", errors="replace")
+        objetos.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {tamano[0]} {tamano[1]}]"
+            f" /Resources << /Font << /F1 3 0 R >> >> /Contents {5 + 2 * i} 0 R >>".encode()
+        )
+        objetos.append(b"<< /Length %d >>\nstream\n" % len(contenido) + contenido + b"\nendstream")
+
+    salida = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for k, objeto in enumerate(objetos, start=1):
+        offsets.append(len(salida))
+        salida += f"{k} 0 obj\n".encode() + objeto + b"\nendobj\n"
+    xref = len(salida)
+    salida += f"xref\n0 {len(objetos) + 1}\n0000000000 65535 f \n".encode()
+    for offset in offsets:
+        salida += f"{offset:010d} 00000 n \n".encode()
+    salida += f"trailer\n<< /Size {len(objetos) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return bytes(salida)
+
+
+def _rfc(r: random.Random) -> str:
+    letras = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+    return "".join(r.choices(letras, k=4)) + f"{r.randint(50, 99)}{r.randint(1, 12):02d}{r.randint(1, 28):02d}" + "".join(r.choices(letras + "0123456789", k=3))
+
+
+def _curp(r: random.Random) -> str:
+    letras = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+    return ("".join(r.choices(letras, k=4)) + f"{r.randint(50, 99)}{r.randint(1, 12):02d}{r.randint(1, 28):02d}"
+            + r.choice("HM") + "".join(r.choices(letras, k=5)) + r.choice(letras) + str(r.randint(0, 9)))
+
+
+def _uuid(r: random.Random) -> str:
+    h = "".join(r.choices("0123456789ABCDEF", k=32))
+    return f"{h[:8]}-{h[8:12]}-{h[12:16]}-{h[16:20]}-{h[20:]}"
+
+
+def _relleno(r: random.Random, n: int) -> list[str]:
+    palabras = ("el contribuyente", "fecha", "importe", "domicilio", "numero", "calle", "colonia",
+                "municipio", "referencia", "total", "periodo", "descripcion", "observaciones")
+    return [" ".join(r.choices(palabras, k=8)) for _ in range(n)]
+
+
+def _quitar(r: random.Random, lineas: list[str], fijas: int = 1) -> list[str]:
+    # Simula variaciones de formato: cada línea (salvo las primeras `fijas`) puede faltar
+    return lineas[:fijas] + [l for l in lineas[fijas:] if r.random() > 0.2]
+
+
+def _documentos_sinteticos(n: int, semilla: int) -> list[tuple[str, bytes, str]]:
+    """
+    (nombre, bytes, etiqueta) con etiqueta = clave del tipo u "OTRO".
+    """
+    r = random.Random(semilla)
+    documentos = []
+    for i in range(n):
+        documentos.append((f"ine_{i}.pdf", _pdf_con_texto([_quitar(r, [
+            "INSTITUTO NACIONAL ELECTORAL", "MÉXICO", "CREDENCIAL PARA VOTAR", "NOMBRE", "GÓMEZ LÓPEZ MARÍA",
+            "DOMICILIO C JUÁREZ 12 COL CENTRO", f"CLAVE DE ELECTOR {_rfc(r)}01M100", f"CURP {_curp(r)}",
+            f"AÑO DE REGISTRO 2005 01", f"SECCIÓN {r.randint(100, 9999)}", f"VIGENCIA {r.randint(2026, 2034)}",
+        ], fijas=2)], _CREDENCIAL), "INE"))
+        documentos.append((f"csf_{i}.pdf", _pdf_con_texto([_quitar(r, [
+            "CÉDULA DE IDENTIFICACIÓN FISCAL", "SERVICIO DE ADMINISTRACIÓN TRIBUTARIA",
+            "CONSTANCIA DE SITUACIÓN FISCAL", f"idCIF: {r.randint(10**10, 10**11)}", f"RFC: {_rfc(r)}",
+            "Datos de Identificación del Contribuyente:", f"CURP: {_curp(r)}", "Datos del domicilio registrado",
+            *_relleno(r, 6),
+        ], fijas=3), ["Actividades Económicas:", "Regímenes:", "Régimen General de Ley Personas Morales",
+                      *_relleno(r, 8)]]), "CSF"))
+        documentos.append((f"cfdi_{i}.pdf", _pdf_con_texto([_quitar(r, [
+            "Folio fiscal:", _uuid(r), f"RFC emisor: {_rfc(r)}", f"RFC receptor: {_rfc(r)}",
+            "Uso CFDI: G03 Gastos en general", "No. de serie del certificado del SAT 00001000000504465028",
+            *_relleno(r, 8), "Sello digital del CFDI:", "aGVsbG8gd29ybGQ=" * 4, "Sello digital del SAT:",
+            "Cadena Original del complemento de certificación digital del SAT:",
+            "Este documento es una representación impresa de un CFDI",
+        ])]), "CFDI"))
+        documentos.append((f"opinion_{i}.pdf", _pdf_con_texto([_quitar(r, [
+            "Opinión del cumplimiento de obligaciones fiscales", "Servicio de Administración Tributaria",
+            f"Folio {r.randint(10**9, 10**10)}", f"RFC {_rfc(r)}", "Sentido de la opinión: POSITIVO",
+            "En los términos del artículo 32-D del Código Fiscal de la Federación", *_relleno(r, 6),
+        ])]), "OPINION"))
+        documentos.append((f"curp_{i}.pdf", _pdf_con_texto([_quitar(r, [
+            "CONSTANCIA DE LA CLAVE ÚNICA DE REGISTRO DE POBLACIÓN", f"Clave: {_curp(r)}",
+            "Registro Nacional de Población", "Entidad de registro: CIUDAD DE MÉXICO",
+            f"Fecha de inscripción {r.randint(1, 28):02d}/05/1998", *_relleno(r, 4),
+        ])]), "CURP"))
+        documentos.append((f"estado_cuenta_{i}.pdf", _pdf_con_texto([_quitar(r, [
+            "ESTADO DE CUENTA", f"Periodo del 01/0{r.randint(1, 9)}/2024 al 30/0{r.randint(1, 9)}/2024",
+            f"CLABE 0121800{r.randint(10**10, 10**11)}", f"Saldo anterior {r.randint(1000, 99999)}.00",
+            "Depósitos / Abonos", "Retiros / Cargos", f"Saldo final {r.randint(1000, 99999)}.00",
+            *_relleno(r, 20),
+        ])] * r.randint(2, 6)), "ESTADO_CUENTA"))
+        documentos.append((f"acta_{i}.pdf", _pdf_con_texto([_quitar(r, [
+            f"ESCRITURA PÚBLICA NÚMERO {r.randint(1000, 99999)}", "ACTA CONSTITUTIVA",
+            f"ante mí, Licenciado Juan Pérez, Notario Público número {r.randint(1, 250)}",
+            "comparecen para constituir una Sociedad Anónima de Capital Variable",
+            "OBJETO SOCIAL", "CAPITAL SOCIAL", "Registro Público de Comercio", *_relleno(r, 10),
+        ], fijas=2)] + [_relleno(r, 30)] * r.randint(4, 12)), "ACTA_CONSTITUTIVA"))
+        # Distractores: mencionan conceptos de otros tipos sin serlo
+        documentos.append((f"contrato_{i}.pdf", _pdf_con_texto([[
+            "CONTRATO DE ARRENDAMIENTO", "El arrendatario se identifica con credencial para votar expedida por el",
+            "Instituto Nacional Electoral y exhibe su constancia de situación fiscal emitida por el SAT.",
+            f"RFC {_rfc(r)}", *_relleno(r, 25),
+        ]] * 3), "OTRO"))
+        documentos.append((f"carta_{i}.pdf", _pdf_con_texto([_relleno(r, 30)]), "OTRO"))
+        # Escaneo: sin capa de texto
+        documentos.append((f"escaneo_{i}.pdf", _pdf_con_texto([[]]), "OTRO"))
+    return documentos
+
+
+def _pares_sinteticos(n: int, semilla: int) -> tuple[dict[str, bytes], list[dict]]:
+    documentos = _documentos_sinteticos(n, semilla)
+    tipos = [t.clave for t in doc_fingerprints.TIPOS] + ["comprobante de domicilio"]
+    archivos = {nombre: datos for nombre, datos, _ in documentos}
+    pares = [
+        {"archivo": nombre, "tipo_doc": tipo, "esDocumentoValido": etiqueta == tipo}
+        for nombre, _, etiqueta in documentos
+        for tipo in tipos
+    ]
+    return archivos, pares
+
+
+def _leer_veredictos(ruta: str, directorio: str) -> tuple[dict[str, bytes], list[dict]]:
+    pares = []
+    archivos = {}
+    with open(ruta, encoding="utf-8") as f:
+        for linea in f:
+            if not linea.strip():
+                continue
+            par = json.loads(linea)
+            if par["archivo"] not in archivos:
+                with open(os.path.join(directorio, par["archivo"]), "rb") as pdf:
+                    archivos[par["archivo"]] = pdf.read()
+            pares.append(par)
+    return archivos, pares
+
+
+async def _veredictos_llm(directorio: str, tipos: list[str], salida: str) -> None:
+    """
+    Pide a Gemini el veredicto de cada PDF de `directorio` para cada tipo, sin
+    pre-clasificación, y los guarda en `salida` (JSONL).
+    """
+    prescreen_service.PRESCREEN_ENABLED = False
+    from controllers.pdf_controller import analyze_file
+    from services import upload_registry_service
+
+    with open(salida, "w", encoding="utf-8") as f:
+        for nombre in sorted(os.listdir(directorio)):
+            if not nombre.lower().endswith(".pdf"):
+                continue
+            ruta = os.path.join(directorio, nombre)
+            with open(ruta, "rb") as pdf:
+                sha256 = hashlib.file_digest(pdf, "sha256").hexdigest()
+            for tipo in tipos:
+                resultado = await analyze_file(tipo, ruta, sha256)
+                f.write(json.dumps({
+                    "archivo": nombre,
+                    "tipo_doc": tipo,
+                    "esDocumentoValido": resultado["esDocumentoValido"],
+                    "documentoDetectado": resultado["documentoDetectado"],
+                }, ensure_ascii=False) + "\n")
+                print(f"{nombre} / {tipo}: {resultado['documentoDetectado']}")
+    await upload_registry_service.collect(force=True)
+
+
+def _percentil(valores: list[float], p: float) -> float:
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(p * len(ordenados)))] if ordenados else 0.0
+
+
+def _evaluar(archivos: dict[str, bytes], pares: list[dict]) -> dict:
+    lecturas = {}
+    tiempos_ms = []
+    for nombre, datos in archivos.items():
+        inicio = time.perf_counter()
+        try:
+            lecturas[nombre] = prescreen_service.read_text(io.BytesIO(datos))
+        except Exception as e:
+            print(f"{nombre}: no se pudo leer ({e})")
+            lecturas[nombre] = ("", 0)
+        tiempos_ms.append((time.perf_counter() - inicio) * 1000)
+
+    totales = defaultdict(lambda: defaultdict(int))
+    desacuerdos = []
+    for par in pares:
+        texto, paginas = lecturas[par["archivo"]]
+        inicio = time.perf_counter()
+        veredicto, motivo = prescreen_service.classify_text(par["tipo_doc"], texto, paginas)
+        tiempos_ms.append((time.perf_counter() - inicio) * 1000)
+        fila = totales[par["tipo_doc"]]
+        fila["pares"] += 1
+        if veredicto is None:
+            fila[f"modelo_{motivo}"] += 1
+            continue
+        fila["locales"] += 1
+        if veredicto.es_valido == par["esDocumentoValido"]:
+            fila["aciertos"] += 1
+        else:
+            fila["falsos_positivos" if veredicto.es_valido else "falsos_negativos"] += 1
+            desacuerdos.append({**par, "local": veredicto.detectado, "confianza": veredicto.confianza})
+
+    global_ = defaultdict(int)
+    for fila in totales.values():
+        for k, v in fila.items():
+            global_[k] += v
+    return {
+        "por_tipo": {t: dict(f) for t, f in totales.items()},
+        "global": dict(global_),
+        "cobertura": round(global_["locales"] / max(1, global_["pares"]), 3),
+        "exactitud": round(global_["aciertos"] / max(1, global_["locales"]), 4),
+        "tiempo_p50_ms": round(_percentil(tiempos_ms, 0.5), 2),
+        "tiempo_p95_ms": round(_percentil(tiempos_ms, 0.95), 2),
+        "desacuerdos": desacuerdos,
+    }
+
+
+def _imprimir(resultado: dict) -> None:
+    print(f"{'tipo_doc':<28} {'pares':>6} {'locales':>8} {'aciertos':>9} {'FP':>4} {'FN':>4}  al modelo")
+    for tipo, fila in sorted(resultado["por_tipo"].items()):
+        al_modelo = {k[7:]: v for k, v in fila.items() if k.startswith("modelo_")}
+        print(f"{tipo:<28} {fila['pares']:>6} {fila.get('locales', 0):>8} {fila.get('aciertos', 0):>9} "
+              f"{fila.get('falsos_positivos', 0):>4} {fila.get('falsos_negativos', 0):>4}  {al_modelo}")
+    print(f"\ncobertura local: {resultado['cobertura']:.1%}   exactitud sobre respondidos: "
+          f"{resultado['exactitud']:.2%}   lectura/clasificación p50 {resultado['tiempo_p50_ms']} ms, "
+          f"p95 {resultado['tiempo_p95_ms']} ms")
+    for d in resultado["desacuerdos"][:10]:
+        print(f"  desacuerdo: {d['archivo']} / {d['tipo_doc']}: modelo={d['esDocumentoValido']} "
+              f"local={d['local']!r} ({d['confianza']})")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dir", help="carpeta con los PDFs")
+    parser.add_argument("--verdicts", help="JSONL de veredictos del modelo (entrada, o salida con --llm)")
+    parser.add_argument("--llm", action="store_true", help="obtiene los veredictos llamando a Gemini")
+    parser.add_argument("--tipos", default="INE,CSF,CFDI", help="tipos a consultar con --llm, separados por coma")
+    parser.add_argument("--sintetico", type=int, default=0, help="PDFs sintéticos por tipo")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", help="guarda los resultados en este archivo")
+    args = parser.parse_args()
+
+    if args.llm:
+        if not (args.dir and args.verdicts):
+            parser.error("--llm requiere --dir y --verdicts")
+        asyncio.run(_veredictos_llm(args.dir, [t.strip() for t in args.tipos.split(",") if t.strip()], args.verdicts))
+
+    if args.verdicts:
+        archivos, pares = _leer_veredictos(args.verdicts, args.dir or os.path.dirname(args.verdicts))
+    else:
+        archivos, pares = _pares_sinteticos(args.sintetico or 10, args.seed)
+
+    print(f"{len(archivos)} PDFs, {len(pares)} pares (PDF, tipo_doc); umbrales: confianza ≥ "
+          f"{prescreen_service.PRESCREEN_MIN_CONFIDENCE}, rival ≤ {prescreen_service.PRESCREEN_MAX_RIVAL}\n")
+    resultado = _evaluar(archivos, pares)
+    _imprimir(resultado)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(resultado, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
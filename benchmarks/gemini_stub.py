@@ -0,0 +1,187 @@
+"""
+Sustituto local de `google.generativeai` para pruebas de carga.
+
+Implementa sólo lo que usa el servicio (configure, upload_file, GenerativeModel,
+generate_content_async, File.delete) con latencia, tasa de error y tamaño de
+respuesta configurables por variables de entorno:
+
+    STUB_LATENCY_MS          mediana de latencia de generate_content (default 800)
+    STUB_LATENCY_SIGMA       sigma de la distribución log-normal (default 0.5)
+    STUB_UPLOAD_LATENCY_MS   latencia de upload_file (default 150)
+    STUB_ERROR_RATE          probabilidad de error por llamada (default 0.0)
+    STUB_PAYLOAD_CHARS       tamaño de las respuestas de texto libre (default 1500)
+    STUB_YEARS               años en las extracciones financieras (default "2022,2023")
+
+`install()` registra el módulo en sys.modules antes de importar la aplicación.
+"""
+
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import asyncio
+import types
+
+STUB_LATENCY_MS = float(os.getenv("STUB_LATENCY_MS", "800"))
+STUB_LATENCY_SIGMA = float(os.getenv("STUB_LATENCY_SIGMA", "0.5"))
+STUB_UPLOAD_LATENCY_MS = float(os.getenv("STUB_UPLOAD_LATENCY_MS", "150"))
+STUB_ERROR_RATE = float(os.getenv("STUB_ERROR_RATE", "0.0"))
+STUB_PAYLOAD_CHARS = int(os.getenv("STUB_PAYLOAD_CHARS", "1500"))
+STUB_YEARS = [y.strip() for y in os.getenv("STUB_YEARS", "2022,2023").split(",") if y.strip()]
+
+_CAMPOS_BALANCE = [
+    "Bancos", "Clientes", "Inventarios", "Total Activo Circulante",
+    "Total Activo No Circulante", "Total Activo", "Proveedores",
+    "Total Pasivo a Corto Plazo", "Total Pasivo a Largo Plazo", "Total Pasivo",
+    "Capital Social", "Utilidad o pérdida del ejercicio", "Total Capital Contable",
+    "Total Pasivo y Capital Contable", "Ingresos", "Costos de venta y/o servicio",
+]
+_LOREM = (
+    "La empresa presenta una estructura financiera estable con liquidez suficiente "
+    "para cubrir sus obligaciones de corto plazo. "
+)
+
+
+class StubError(Exception):
+    """Error simulado de la API (equivalente a un 503 de Gemini)."""
+
+
+def _latencia(mediana_ms: float) -> float:
+    if mediana_ms <= 0:
+        return 0.0
+    return random.lognormvariate(0, STUB_LATENCY_SIGMA) * mediana_ms / 1000
+
+
+def _quizas_fallar() -> None:
+    if random.random() < STUB_ERROR_RATE:
+        raise StubError("503 Servicio simulado no disponible")
+
+
+def _texto_para(prompt: str, generation_config=None) -> str:
+    if "ESTADO" in prompt.upper() and "CONCEPTOS EST" in prompt.upper():
+        datos = {
+            anio: {campo: str(random.randint(1_000, 50_000_000)) for campo in _CAMPOS_BALANCE}
+            for anio in STUB_YEARS
+        }
+        if generation_config and generation_config.get("response_schema") is not None:
+            # Salida estructurada: JSON puro con la lista de años del esquema
+            return json.dumps(
+                {"anios": [{"anio": anio, **campos} for anio, campos in datos.items()]},
+                ensure_ascii=False,
+            )
+        return "```json\n" + json.dumps(datos, ensure_ascii=False) + "\n```"
+    if '"veredictos"' in prompt:
+        return json.dumps({"veredictos": {}, "documentoDetectado": "INE"})
+    if "Tu tarea es verificar si el archivo PDF" in prompt:
+        return "True"
+    repeticiones = STUB_PAYLOAD_CHARS // len(_LOREM) + 1
+    return (_LOREM * repeticiones)[:STUB_PAYLOAD_CHARS]
+
+
+class _UsageMetadata:
+    def __init__(self, prompt: str, text: str):
+        # Aproximación de 4 caracteres por token
+        self.prompt_token_count = len(prompt) // 4 + 258
+        self.candidates_token_count = len(text) // 4
+        self.total_token_count = self.prompt_token_count + self.candidates_token_count
+
+
+class _Response:
+    def __init__(self, prompt: str, text: str):
+        self.text = text
+        self.usage_metadata = _UsageMetadata(prompt, text)
+
+
+class _StreamResponse:
+    """Respuesta con stream=True: el texto llega en fragmentos durante el resto de la latencia."""
+
+    FRAGMENTOS = 8
+
+    def __init__(self, prompt: str, text: str):
+        self._prompt = prompt
+        self._text = text
+
+    async def __aiter__(self):
+        paso = max(1, len(self._text) // self.FRAGMENTOS + 1)
+        espera = _latencia(STUB_LATENCY_MS) * 0.75 / self.FRAGMENTOS
+        for i in range(0, len(self._text), paso):
+            await asyncio.sleep(espera)
+            yield _Response(self._prompt, self._text[i:i + paso])
+
+
+class File:
+    def __init__(self, display_name: str):
+        self.name = f"files/{uuid.uuid4().hex[:12]}"
+        self.display_name = display_name
+
+    def delete(self) -> None:
+        time.sleep(_latencia(STUB_UPLOAD_LATENCY_MS) / 4)
+
+
+class GenerationConfig(dict):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+
+    def __getattr__(self, nombre):
+        return self.get(nombre)
+
+
+class GenerativeModel:
+    def __init__(self, model_name: str, **kwargs):
+        self.model_name = model_name
+
+    @staticmethod
+    def _prompt(contents) -> str:
+        if isinstance(contents, str):
+            return contents
+        return "\n".join(c for c in contents if isinstance(c, str))
+
+    def generate_content(self, contents, **kwargs):
+        time.sleep(_latencia(STUB_LATENCY_MS))
+        _quizas_fallar()
+        prompt = self._prompt(contents)
+        return _Response(prompt, _texto_para(prompt))
+
+    async def generate_content_async(self, contents, stream=False, generation_config=None, **kwargs):
+        await asyncio.sleep(_latencia(STUB_LATENCY_MS) / (4 if stream else 1))
+        _quizas_fallar()
+        prompt = self._prompt(contents)
+        texto = _texto_para(prompt, generation_config)
+        if stream:
+            return _StreamResponse(prompt, texto)
+        return _Response(prompt, texto)
+
+
+def configure(**kwargs) -> None:
+    pass
+
+
+def upload_file(path, *, mime_type=None, name=None, display_name=None, resumable=True) -> File:
+    # Lee el contenido como lo haría el SDK real
+    if hasattr(path, "read"):
+        path.read()
+        nombre = display_name or "upload"
+    else:
+        with open(path, "rb") as f:
+            f.read()
+        nombre = display_name or os.path.basename(str(path))
+    time.sleep(_latencia(STUB_UPLOAD_LATENCY_MS))
+    _quizas_fallar()
+    return File(nombre)
+
+
+def delete_file(name) -> None:
+    time.sleep(_latencia(STUB_UPLOAD_LATENCY_MS) / 4)
+
+
+def install() -> types.ModuleType:
+    """
+    Registra este módulo como `google.generativeai` en sys.modules.
+    """
+    modulo = sys.modules[__name__]
+    sys.modules["google.generativeai"] = modulo
+    import google
+    google.generativeai = modulo
+    return modulo
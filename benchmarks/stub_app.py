@@ -0,0 +1,12 @@
+"""
+Punto de entrada de uvicorn para pruebas de carga: instala el stub de Gemini
+antes de importar la aplicación.
+
+    uvicorn benchmarks.stub_app:app --workers 6
+"""
+
+from benchmarks import gemini_stub
+
+gemini_stub.install()
+
+from main import app  # noqa: E402
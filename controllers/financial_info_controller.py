@@ -1,15 +1,29 @@
 import os
-import json
-import re
+import time
+import asyncio
+from contextlib import aclosing
 import google.generativeai as genai
-from fastapi import APIRouter, Body, Depends, HTTPException, status
+from typing import AsyncIterator, Optional
+from fastapi import APIRouter, Body, Depends, Header, HTTPException, Request, status
 from fastapi.responses import JSONResponse
 
+from middlewares.admission_middleware import admission
 from middlewares.auth_middleware import validate_access_token
-from services.download_service import download_pdf_from_url
+from services.download_service import download_pdf
+from services.upload_file_service import delete_local_file
+from services import (
+    gemini_service, extraction_cache_service, job_service, metrics_service, model_router_service,
+    pdf_text_service, upload_registry_service,
+)
+from services.executor_service import run_blocking
 from schemas.analyze_schemas import AnalyzeUrlPdfInput
+from schemas.financial_schemas import EstadoSituacionFinanciera
 from utils.financialAnalitics import calcular_razones_financieras_bancario
-from utils.templates import PROMPT_ESTADO_SITUACION_FINANCIERA
+from utils.financialAnaliticsBatch import calcular_razones_financieras_batch
+from utils.financial_merge import BALANCE, RESULTADOS, combinar_extracciones
+from utils.templates import PROMPT_ESTADO_SITUACION_FINANCIERA, PROMPT_ESTADO_SITUACION_FINANCIERA_ESTRUCTURADO
+from utils.llm_json import JsonStreamExtractor
+from utils.stream_format import streaming_response
 
 router = APIRouter()
 
@@ -20,144 +34,397 @@ if not API_KEY:
 genai.configure(api_key=API_KEY)
 MODEL_NAME = "gemini-2.5-flash-lite"
 
-def extract_json(text):
+# Archivos procesados en paralelo por petición de /financial/analytics
+FINANCIAL_MAX_CONCURRENCY = int(os.getenv("FINANCIAL_MAX_CONCURRENCY", "4"))
+# Fragmentos de páginas extraídos en paralelo por archivo
+FINANCIAL_CHUNK_CONCURRENCY = int(os.getenv("FINANCIAL_CHUNK_CONCURRENCY", "3"))
+
+# Salida estructurada: el modelo recibe el esquema de EstadoSituacionFinanciera y
+# responde JSON puro (un json.loads); con "false" se usa el prompt en prosa en streaming
+FINANCIAL_STRUCTURED_OUTPUT = os.getenv("FINANCIAL_STRUCTURED_OUTPUT", "true").lower() == "true"
+# Reintentos por archivo/fragmento ante JSON inválido o error transitorio del modelo
+FINANCIAL_EXTRACTION_RETRIES = int(os.getenv("FINANCIAL_EXTRACTION_RETRIES", "2"))
+FINANCIAL_RETRY_BACKOFF = float(os.getenv("FINANCIAL_RETRY_BACKOFF", "1"))
+
+PROMPT_EXTRACCION = (
+    PROMPT_ESTADO_SITUACION_FINANCIERA_ESTRUCTURADO if FINANCIAL_STRUCTURED_OUTPUT
+    else PROMPT_ESTADO_SITUACION_FINANCIERA
+)
+CONFIG_ESTRUCTURADA = genai.GenerationConfig(
+    response_mime_type="application/json",
+    response_schema=EstadoSituacionFinanciera,
+)
+
+CONTEXTO_ADJUNTO = "(El PDF irá adjunto, NO EN TEXTO)"
+
+JOB_ANALISIS_FINANCIERO = "financial_analytics"
+# Peso de una petición en la cola justa de admisión (≈ años por petición)
+COSTO_ANALISIS_FINANCIERO = 3
+
+async def _stream_json(contents: list) -> JsonStreamExtractor:
     """
-    Extrae el primer bloque JSON de una respuesta de LLM, eliminando encabezados tipo markdown.
+    Pide a MODEL_NAME la extracción y alimenta un JsonStreamExtractor conforme
+    llega el texto; al completarse el objeto se corta el stream sin esperar el
+    resto de la respuesta.
     """
-    md_json = re.search(r"```(?:json)?\s*(\{.*?\})\s*```", text, re.DOTALL)
-    if md_json:
-        text = md_json.group(1)
-    text = text.strip()
+    extractor = JsonStreamExtractor()
+    partes = []
+    parseo = 0.0  # Sólo el tiempo del extractor, no la espera del stream
+    async with aclosing(gemini_service.generate_content_stream(MODEL_NAME, contents)) as stream:
+        async for texto in stream:
+            partes.append(texto)
+            inicio = time.perf_counter()
+            completo = extractor.feed(texto) is not None
+            parseo += time.perf_counter() - inicio
+            if completo:
+                break
+    metrics_service.observe_phase(metrics_service.PARSEO_JSON, parseo)
+    if not extractor.done:
+        print("Error al parsear estado de situación financiera:", "".join(partes))
+    return extractor
+
+async def _json_estructurado(contents: list) -> Optional[dict]:
+    """
+    Pide a MODEL_NAME la extracción con el esquema de EstadoSituacionFinanciera
+    y la valida de una sola vez. Devuelve {año: datos} o None si la respuesta
+    no cumple el esquema.
+    """
+    response = await gemini_service.generate_content(
+        MODEL_NAME, contents, generation_config=CONFIG_ESTRUCTURADA
+    )
     try:
-        return json.loads(text)
-    except Exception:
-        matches = re.findall(r'(\{.*\})', text, re.DOTALL)
-        for m in matches:
-            try:
-                return json.loads(m)
-            except Exception:
-                continue
-    raise ValueError("No se encontró un JSON válido en la respuesta.")
-    """
-    Recibe una lista de archivos (uno por año), extrae los datos de cada uno usando Gemini,
-    arma el dict {año: datos} y calcula razones financieras multi-anuales.
+        with metrics_service.phase(metrics_service.PARSEO_JSON):
+            return EstadoSituacionFinanciera.model_validate_json(response.text).por_anio()
+    except ValueError as e:
+        # ValidationError, JSON inválido o respuesta sin texto (bloqueada)
+        print("Error al validar estado de situación financiera estructurado:", e)
+        return None
+
+async def _extraer_json(context: str, adjunto=None) -> Optional[dict]:
     """
-    datos_por_anio = {}
-    archivos_tmp = []
-    archivos_subidos = []
+    Extrae {año: datos} de `context` (y del archivo `adjunto`, si lo hay) con el
+    modo configurado. Si la respuesta no trae un JSON válido o el modelo falla de
+    forma transitoria, reintenta sólo esta extracción hasta
+    FINANCIAL_EXTRACTION_RETRIES veces con espera exponencial; los errores de la
+    petición (4xx, cuota agotada) se propagan sin reintentar. Devuelve None si
+    ningún intento produjo JSON.
+    """
+    contents = [PROMPT_EXTRACCION.substitute(context=context)]
+    if adjunto is not None:
+        contents.append(adjunto)
 
-    model = genai.GenerativeModel(MODEL_NAME)
+    for intento in range(FINANCIAL_EXTRACTION_RETRIES + 1):
+        ultimo = intento == FINANCIAL_EXTRACTION_RETRIES
+        try:
+            if FINANCIAL_STRUCTURED_OUTPUT:
+                datos = await _json_estructurado(contents)
+            else:
+                extractor = await _stream_json(contents)
+                datos = extractor.result if extractor.done else None
+        except HTTPException:
+            raise
+        except Exception as e:
+            if ultimo or not model_router_service.is_model_failure(e):
+                raise
+            print(f"[FINANCIAL] Error del modelo en el intento {intento + 1}: {e}; se reintenta")
+        else:
+            if datos is not None or ultimo:
+                return datos
+            print(f"[FINANCIAL] Sin JSON válido en el intento {intento + 1}; se reintenta")
+        await asyncio.sleep(FINANCIAL_RETRY_BACKOFF * 2 ** intento)
 
+def _razones(datos_por_anio: dict) -> dict:
+    with metrics_service.phase(metrics_service.CALCULO_RAZONES):
+        return calcular_razones_financieras_bancario(datos_por_anio)
+
+def _tiene_valores(datos) -> bool:
+    # Al menos un campo con valor en algún año
+    return isinstance(datos, dict) and any(
+        isinstance(campos, dict) and any(v not in ("", None) for v in campos.values())
+        for campos in datos.values()
+    )
+
+def _rango_paginas(paginas: list[int]) -> str:
+    # [0, 1, 2, 5] -> "1-3,6"
+    rangos = []
+    for i in paginas:
+        if rangos and rangos[-1][1] == i - 1:
+            rangos[-1][1] = i
+        else:
+            rangos.append([i, i])
+    return ",".join(f"{a + 1}-{b + 1}" if a != b else str(a + 1) for a, b in rangos)
+
+async def _extraer_fragmento(
+    downloaded, fragmento: pdf_text_service.Fragmento, limite: asyncio.Semaphore
+) -> dict:
+    """
+    Extrae un fragmento de páginas: con su texto en `$context` si es utilizable,
+    o subiendo un PDF con sólo esas páginas. Devuelve {} si no se obtuvo JSON.
+    """
+    async with limite:
+        if fragmento.texto is not None:
+            return await _extraer_json(fragmento.texto) or {}
+
+        # El registro de subidas se indexa por PDF original + páginas
+        clave = f"{downloaded.sha256}#paginas={_rango_paginas(fragmento.paginas)}"
+        sub_path = await pdf_text_service.write_pages(downloaded.path, fragmento.paginas)
+        try:
+            async with upload_registry_service.acquire(clave, sub_path) as uploaded_file:
+                try:
+                    datos = await _extraer_json(CONTEXTO_ADJUNTO, uploaded_file)
+                except Exception:
+                    upload_registry_service.invalidate(clave)
+                    raise
+            return datos or {}
+        finally:
+            await delete_local_file(sub_path)
+
+async def _extraer_por_paginas(downloaded, fragmentos: list[pdf_text_service.Fragmento]) -> dict:
+    """
+    Extrae los fragmentos en paralelo (máximo FINANCIAL_CHUNK_CONCURRENCY a la vez)
+    y combina sus {año: datos} resolviendo conflictos entre fragmentos.
+    """
+    limite = asyncio.Semaphore(FINANCIAL_CHUNK_CONCURRENCY)
     try:
-        # Procesa cada archivo recibido
-        for input in inputs:
-            temp_path = download_pdf_from_url(input.downloadUrl)
-            archivos_tmp.append(temp_path)
-            uploaded_file = genai.upload_file(temp_path)
-            archivos_subidos.append(uploaded_file)
-
-            prompt1 = PROMPT_ESTADO_SITUACION_FINANCIERA.substitute(context="(El PDF irá adjunto, NO EN TEXTO)")
-            resp1 = model.generate_content([prompt1, uploaded_file])
-            text1 = resp1.text.strip()
-
-            try:
-                datos1 = extract_json(text1)
-            except Exception as e:
-                print("Error al parsear estado de situación financiera:", text1, e)
+        async with asyncio.TaskGroup() as tg:
+            tareas = [tg.create_task(_extraer_fragmento(downloaded, f, limite)) for f in fragmentos]
+    except ExceptionGroup as eg:
+        raise eg.exceptions[0]
+
+    datos, conflictos = combinar_extracciones(
+        (tarea.result(), fragmento.tipos) for tarea, fragmento in zip(tareas, fragmentos)
+    )
+    if conflictos:
+        print(f"[FINANCIAL] {len(conflictos)} conflictos entre fragmentos resueltos: {'; '.join(conflictos)}")
+    return datos
+
+async def _extraer_estado_financiero(input: AnalyzeUrlPdfInput, limite: asyncio.Semaphore) -> dict:
+    """
+    Descarga y extrae con Gemini el estado de situación financiera de un PDF.
+    Si se localizan localmente las páginas del balance y del estado de resultados,
+    sólo esas páginas se extraen, por fragmentos en paralelo (con su texto en
+    `$context` o subiendo sólo esas páginas); si no (o si así no se obtienen
+    valores) se sube el PDF completo como antes.
+    Devuelve el dict {año: datos} de ese archivo y borra el temporal local al terminar
+    (también si la tarea se cancela); el archivo en Gemini queda en el registro de subidas.
+    """
+    temp_path = None
+    async with limite:
+        try:
+            downloaded = await download_pdf(input.downloadUrl)
+            temp_path = downloaded.path
+
+            # Mismo PDF + mismo prompt + mismo modelo → reutilizar extracción previa
+            key = extraction_cache_service.cache_key(
+                downloaded.sha256, PROMPT_EXTRACCION.template, MODEL_NAME
+            )
+            datos1 = await extraction_cache_service.get(key)
+            if datos1 is not None:
+                return datos1
+
+            fragmentos = await pdf_text_service.plan_extraction(temp_path)
+            if fragmentos:
+                # Si falta un estado en las páginas localizadas, el resultado saldría
+                # incompleto (y se cachearía así): mejor subir el PDF completo
+                cubiertos = set().union(*(f.tipos for f in fragmentos))
+                if not {BALANCE, RESULTADOS} <= cubiertos:
+                    print(
+                        f"[FINANCIAL] Sólo se localizó {', '.join(sorted(cubiertos)) or 'ningún estado'} "
+                        "en las páginas; se sube el PDF completo"
+                    )
+                    fragmentos = None
+            if fragmentos:
+                datos1 = await _extraer_por_paginas(downloaded, fragmentos)
+                if _tiene_valores(datos1):
+                    await extraction_cache_service.put(key, datos1)
+                    return datos1
+                print("[FINANCIAL] Sin valores desde las páginas localizadas; se sube el PDF completo")
+
+            async with upload_registry_service.acquire(downloaded.sha256, temp_path) as uploaded_file:
+                try:
+                    datos1 = await _extraer_json(CONTEXTO_ADJUNTO, uploaded_file)
+                except Exception:
+                    upload_registry_service.invalidate(downloaded.sha256)
+                    raise
+
+            if datos1 is None:
                 raise HTTPException(status_code=500, detail="Error al parsear JSON de situación financiera.")
 
-            # Esperamos que datos1 tenga la forma {'2022': {...campos...}}
-            for anio, datos in datos1.items():
+            # Una respuesta vacía ({} o años sin valores) no se cachea: se reintenta en la próxima petición
+            if _tiene_valores(datos1):
+                await extraction_cache_service.put(key, datos1)
+            else:
+                print("[FINANCIAL] Extracción sin valores; no se guarda en caché")
+            return datos1
+        finally:
+            if temp_path:
+                await delete_local_file(temp_path)
+
+async def analizar_estados_financieros(inputs: list[AnalyzeUrlPdfInput]) -> dict:
+    """
+    Extrae los datos de cada archivo (uno por año) usando Gemini, arma el dict
+    {año: datos} y calcula razones financieras multi-anuales.
+    Los archivos se procesan en paralelo (máximo FINANCIAL_MAX_CONCURRENCY a la vez);
+    si uno falla se cancelan los demás.
+    """
+    datos_por_anio = {}
+    limite = asyncio.Semaphore(FINANCIAL_MAX_CONCURRENCY)
+
+    try:
+        try:
+            async with asyncio.TaskGroup() as tg:
+                tareas = [tg.create_task(_extraer_estado_financiero(input, limite)) for input in inputs]
+        except ExceptionGroup as eg:
+            # Propagar el primer error real (HTTPException u otro)
+            raise eg.exceptions[0]
+
+        # Combinar en el orden de entrada para que el resultado sea determinista.
+        # Esperamos que cada resultado tenga la forma {'2022': {...campos...}}
+        for tarea in tareas:
+            for anio, datos in tarea.result().items():
                 datos_por_anio[anio] = datos
 
         # Una vez extraída la info de todos los años, calcular razones financieras
-        razones = calcular_razones_financieras_bancario(datos_por_anio)
-        print("Datos de situación financiera por año:", datos_por_anio)
-        print("Razones financieras calculadas:", razones)
+        razones = _razones(datos_por_anio)
+        # Sólo un resumen: imprimir los datos completos frena el camino de la petición
+        print(f"[FINANCIAL] {len(datos_por_anio)} años extraídos; razones de {sorted(razones)}")
 
-        return JSONResponse(
-            status_code=status.HTTP_200_OK,
-            content=razones
-        )
+        return {
+            "datos_por_anio": datos_por_anio,
+            "razones": razones
+        }
 
     except HTTPException:
         raise
     except Exception as e:
         print("Error general:", e)
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        # Limpieza de archivos temporales/subidos
-        for uploaded_file in archivos_subidos:
-            try:
-                uploaded_file.delete()
-            except Exception:
-                pass
-        for temp_path in archivos_tmp:
-            if temp_path and os.path.exists(temp_path):
-                os.remove(temp_path)
-
-@router.post("/financial/analytics", dependencies=[Depends(validate_access_token)])
+
+
+@router.post("/financial/analytics", dependencies=[Depends(admission(cost=COSTO_ANALISIS_FINANCIERO))])
 async def analisis_financiero_batch(inputs: list[AnalyzeUrlPdfInput] = Body(...)):
     """
-    Recibe una lista de archivos (uno por año), extrae los datos de cada uno usando Gemini,
-    arma el dict {año: datos} y calcula razones financieras multi-anuales.
+    Recibe una lista de archivos (uno por año) y devuelve los datos extraídos y las
+    razones financieras. Para análisis largos usar /financial/analytics/jobs.
     """
-    datos_por_anio = {}
-    archivos_tmp = []
-    archivos_subidos = []
+    resultado = await analizar_estados_financieros(inputs)
+    return JSONResponse(status_code=status.HTTP_200_OK, content=resultado)
 
-    model = genai.GenerativeModel(MODEL_NAME)
+
+def _anio_anterior(anio: str) -> Optional[str]:
+    # "2022" -> "2021"; claves no numéricas no tienen año anterior conocido
+    if not anio.isdigit():
+        return None
+    return str(int(anio) - 1).zfill(len(anio))
+
+
+async def _eventos_analisis(inputs: list[AnalyzeUrlPdfInput]) -> AsyncIterator[dict]:
+    """
+    Igual que analizar_estados_financieros, pero produce eventos conforme avanza:
+      - {"tipo": "datos", "anio", "datos"} al terminar la extracción de cada archivo.
+      - {"tipo": "razones", "anio", "razones"} en cuanto ese año y el anterior
+        están disponibles (el incremento interanual sólo depende de ambos).
+      - {"tipo": "resumen", "datos_por_anio", "razones"} al final, con las razones
+        pendientes ya emitidas; es el resultado definitivo.
+      - {"tipo": "error", "status_code", "detail"} si falla algún archivo.
+    Si el cliente se desconecta, las extracciones pendientes se cancelan.
+    """
+    limite = asyncio.Semaphore(FINANCIAL_MAX_CONCURRENCY)
+    tareas = [asyncio.create_task(_extraer_estado_financiero(input, limite)) for input in inputs]
+    disponibles: dict = {}
+    emitidas: set[str] = set()
 
     try:
-        # Procesa cada archivo recibido
-        for input in inputs:
-            temp_path = download_pdf_from_url(input.downloadUrl)
-            archivos_tmp.append(temp_path)
-            uploaded_file = genai.upload_file(temp_path)
-            archivos_subidos.append(uploaded_file)
-
-            prompt1 = PROMPT_ESTADO_SITUACION_FINANCIERA.substitute(context="(El PDF irá adjunto, NO EN TEXTO)")
-            resp1 = model.generate_content([prompt1, uploaded_file])
-            text1 = resp1.text.strip()
-
-            try:
-                datos1 = extract_json(text1)
-            except Exception as e:
-                print("Error al parsear estado de situación financiera:", text1, e)
-                raise HTTPException(status_code=500, detail="Error al parsear JSON de situación financiera.")
+        pendientes = set(tareas)
+        while pendientes:
+            done, pendientes = await asyncio.wait(pendientes, return_when=asyncio.FIRST_COMPLETED)
+            for tarea in done:
+                for anio, datos in tarea.result().items():
+                    disponibles[anio] = datos
+                    yield {"tipo": "datos", "anio": anio, "datos": datos}
 
-            # Esperamos que datos1 tenga la forma {'2022': {...campos...}}
-            for anio, datos in datos1.items():
+            for anio in sorted(disponibles):
+                anterior = _anio_anterior(anio)
+                if anio in emitidas or anterior not in disponibles:
+                    continue
+                razones = _razones({anterior: disponibles[anterior], anio: disponibles[anio]})
+                emitidas.add(anio)
+                yield {"tipo": "razones", "anio": anio, "razones": razones[anio]}
+
+        # Combinar en el orden de entrada, como la versión no streaming
+        datos_por_anio = {}
+        for tarea in tareas:
+            for anio, datos in tarea.result().items():
                 datos_por_anio[anio] = datos
+        razones = _razones(datos_por_anio)
 
-        # Una vez extraída la info de todos los años, calcular razones financieras
-        razones = calcular_razones_financieras_bancario(datos_por_anio)
-        print("Datos de situación financiera por año:", datos_por_anio)
-        print("Razones financieras calculadas:", razones)
+        for anio in sorted(razones):
+            if anio not in emitidas:
+                yield {"tipo": "razones", "anio": anio, "razones": razones[anio]}
+        yield {"tipo": "resumen", "datos_por_anio": datos_por_anio, "razones": razones}
 
-        return JSONResponse(
-            status_code=status.HTTP_200_OK,
-            content={
-                "datos_por_anio": datos_por_anio,
-                "razones": razones
-            }
-        )
-
-    except HTTPException:
-        raise
+    except HTTPException as e:
+        yield {"tipo": "error", "status_code": e.status_code, "detail": e.detail}
     except Exception as e:
-        print("Error general:", e)
-        raise HTTPException(status_code=500, detail=str(e))
+        print("Error general en streaming:", e)
+        yield {"tipo": "error", "status_code": 500, "detail": str(e)}
     finally:
-        # Limpieza de archivos temporales/subidos
-        for uploaded_file in archivos_subidos:
-            try:
-                uploaded_file.delete()
-            except Exception:
-                pass
-        for temp_path in archivos_tmp:
-            if temp_path and os.path.exists(temp_path):
-                os.remove(temp_path)
+        for tarea in tareas:
+            if not tarea.done():
+                tarea.cancel()
+        await asyncio.gather(*tareas, return_exceptions=True)
+
+
+@router.post(
+    "/financial/analytics/stream",
+    dependencies=[Depends(admission(cost=COSTO_ANALISIS_FINANCIERO))],
+    summary="Análisis financiero con resultados progresivos por año",
+)
+async def analisis_financiero_stream(request: Request, inputs: list[AnalyzeUrlPdfInput] = Body(...)):
+    """
+    Versión progresiva de /financial/analytics: emite los datos de cada año al
+    extraerse, sus razones en cuanto también está el año anterior y al final el
+    resumen completo. Responde NDJSON por defecto o Server-Sent Events si el
+    cliente envía `Accept: text/event-stream`.
+    """
+    if not inputs:
+        raise HTTPException(status_code=400, detail="Se requiere al menos un archivo.")
+
+    return streaming_response(request, _eventos_analisis(inputs))
+
+
+async def _job_analisis_financiero(payload: list) -> dict:
+    return await analizar_estados_financieros([AnalyzeUrlPdfInput(**item) for item in payload])
+
+job_service.register(JOB_ANALISIS_FINANCIERO, _job_analisis_financiero, cost=COSTO_ANALISIS_FINANCIERO)
+
+
+@router.post(
+    "/financial/analytics/jobs",
+    status_code=status.HTTP_202_ACCEPTED,
+    dependencies=[Depends(admission())],
+    summary="Encola un análisis financiero y devuelve el id del trabajo",
+)
+async def analisis_financiero_job(
+    inputs: list[AnalyzeUrlPdfInput] = Body(...),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+    tenant: str = Depends(validate_access_token),
+):
+    """
+    Versión asíncrona de /financial/analytics: responde 202 de inmediato con el
+    `job_id`; el estado se consulta en GET /jobs/{job_id} y el resultado en
+    GET /jobs/{job_id}/result. Reenviar con la misma `Idempotency-Key` devuelve
+    el mismo trabajo sin repetir la extracción. Con la cola llena responde 503.
+    """
+    if not inputs:
+        raise HTTPException(status_code=400, detail="Se requiere al menos un archivo.")
+    payload = [{"downloadUrl": str(input.downloadUrl)} for input in inputs]
+    job = await job_service.submit(JOB_ANALISIS_FINANCIERO, payload, tenant, idempotency_key)
+    return JSONResponse(
+        status_code=status.HTTP_202_ACCEPTED,
+        content={"job_id": job["job_id"], "estado": job["estado"]},
+        headers={"Location": f"/jobs/{job['job_id']}"},
+    )
 
 
 @router.post("/financial/analytics/external", summary="Recalcula razones a partir de datos completados")
@@ -172,7 +439,7 @@ async def recalcula_razones(datos_por_anio: dict = Body(...)):
             raise HTTPException(status_code=400, detail="Formato inválido de datos_por_anio")
         # (Opcional: Validar estructura por año y campos clave)
 
-        razones = calcular_razones_financieras_bancario(datos_por_anio)
+        razones = _razones(datos_por_anio)
         return JSONResponse(
             status_code=status.HTTP_200_OK,
             content={"razones": razones}
@@ -182,3 +449,31 @@ async def recalcula_razones(datos_por_anio: dict = Body(...)):
     except Exception as e:
         print("Error en recalculo de razones:", e)
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/financial/analytics/external/batch", summary="Recalcula razones de muchas empresas en una sola llamada")
+async def recalcula_razones_batch(empresas: dict = Body(...)):
+    """
+    Recibe un dict {empresa: {año: datos}} (p. ej. una cartera completa) y devuelve
+    {empresa: razones} usando el motor columnar, con los mismos resultados que
+    /financial/analytics/external aplicado a cada empresa.
+    """
+    try:
+        if not empresas or not isinstance(empresas, dict):
+            raise HTTPException(status_code=400, detail="Formato inválido: se espera {empresa: {año: datos}}")
+        for empresa, datos_por_anio in empresas.items():
+            if not isinstance(datos_por_anio, dict) or not all(isinstance(d, dict) for d in datos_por_anio.values()):
+                raise HTTPException(status_code=400, detail=f"Formato inválido de datos_por_anio para '{empresa}'")
+
+        # Cálculo CPU-bound: fuera del event loop
+        with metrics_service.phase(metrics_service.CALCULO_RAZONES):
+            razones = await run_blocking(calcular_razones_financieras_batch, empresas)
+        return JSONResponse(
+            status_code=status.HTTP_200_OK,
+            content={"razones": razones}
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        print("Error en recalculo de razones por lote:", e)
+        raise HTTPException(status_code=500, detail=str(e))
@@ -1,7 +1,11 @@
 import os
+from contextlib import aclosing
+from typing import AsyncIterator
 import google.generativeai as genai
-from fastapi import APIRouter, Body, HTTPException, Depends
-from middlewares.auth_middleware import validate_access_token
+from fastapi import APIRouter, Body, HTTPException, Depends, Request
+from middlewares.admission_middleware import admission
+from services import gemini_service, hedging_service, metrics_service, model_router_service
+from utils.stream_format import streaming_response
 
 router = APIRouter()
 
@@ -21,32 +25,95 @@ ANALYZE_PROMPT = (
     "Contexto: {contexto}\nPregunta: {prompt}"
 )
 
-def get_model_response(full_prompt: str, model_name: str):
-    model = genai.GenerativeModel(model_name)
-    resp = model.generate_content([full_prompt])
+async def get_model_response(full_prompt: str, model_name: str):
+    resp = await gemini_service.generate_content(model_name, [full_prompt])
     return resp.text.strip()
 
-@router.post("/analyze_info")
-async def analyze_info(
-    data: dict = Body(...),
-    _: None = Depends(validate_access_token)
-):
+def _build_prompt(data: dict) -> str:
     if not isinstance(data, dict):
         raise HTTPException(status_code=400, detail="Los datos deben ser un diccionario.")
     prompt = data.get("prompt")
     contexto = data.get("contexto")
     if not all(isinstance(x, str) for x in [prompt, contexto]):
         raise HTTPException(status_code=400, detail="Campos 'prompt' y 'contexto' deben ser texto.")
+    return ANALYZE_PROMPT.format(prompt=prompt, contexto=contexto)
 
-    full_prompt = ANALYZE_PROMPT.format(prompt=prompt, contexto=contexto)
+@router.post("/analyze_info")
+async def analyze_info(
+    data: dict = Body(...),
+    _: None = Depends(admission())
+):
+    full_prompt = _build_prompt(data)
     last_error = None
 
-    for model_name in GEMINI_MODELS:
+    # Omite los modelos con el breaker abierto
+    models = await model_router_service.route(GEMINI_MODELS)
+
+    if hedging_service.HEDGING_ENABLED and len(models) >= 2:
+        # Primario y secundario compiten; el resto queda como fallback secuencial
+        try:
+            summary = await hedging_service.hedged_call(
+                lambda model_name: get_model_response(full_prompt, model_name),
+                models[0],
+                models[1],
+            )
+            return {"summary": summary}
+        except Exception as e:
+            last_error = str(e)
+            metrics_service.fallback(models[0])
+        models = models[2:]
+
+    for model_name in models:
         try:
-            summary = get_model_response(full_prompt, model_name)
+            summary = await get_model_response(full_prompt, model_name)
             return {"summary": summary}
         except Exception as e:
             last_error = str(e)
+            metrics_service.fallback(model_name)
             continue
 
     raise HTTPException(status_code=500, detail=str(last_error))
+
+async def _stream_summary(full_prompt: str) -> AsyncIterator[dict]:
+    """
+    Eventos de /analyze_info/stream: {"tipo": "texto", "texto"} por fragmento,
+    {"tipo": "fin", "modelo"} al terminar o {"tipo": "error", "detail"}.
+    Si un modelo falla antes de enviar texto se intenta el siguiente; una vez
+    enviado texto ya no se puede cambiar de modelo y el error se reporta.
+    """
+    last_error = None
+    for model_name in await model_router_service.route(GEMINI_MODELS):
+        enviado = False
+        try:
+            # aclosing: si el cliente se desconecta, la cuota, el router y las métricas
+            # del stream se cierran de inmediato y no al recolectar el generador
+            async with aclosing(gemini_service.generate_content_stream(model_name, [full_prompt])) as stream:
+                async for texto in stream:
+                    enviado = True
+                    yield {"tipo": "texto", "texto": texto}
+        except Exception as e:
+            last_error = str(e)
+            print(f"[ANALYZE_INFO] Error en streaming con {model_name}: {e}")
+            if enviado:
+                yield {"tipo": "error", "detail": last_error}
+                return
+            metrics_service.fallback(model_name)
+            continue
+        yield {"tipo": "fin", "modelo": model_name}
+        return
+
+    yield {"tipo": "error", "detail": str(last_error)}
+
+@router.post("/analyze_info/stream")
+async def analyze_info_stream(
+    request: Request,
+    data: dict = Body(...),
+    _: None = Depends(admission())
+):
+    """
+    Igual que /analyze_info, pero reenvía el texto del modelo conforme se genera
+    (NDJSON, o SSE con `Accept: text/event-stream`). Si el cliente se desconecta,
+    la llamada al modelo se cancela.
+    """
+    full_prompt = _build_prompt(data)
+    return streaming_response(request, _stream_summary(full_prompt))
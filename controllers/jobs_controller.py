@@ -0,0 +1,45 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import JSONResponse
+
+from middlewares.auth_middleware import validate_access_token
+from services import job_service
+
+router = APIRouter()
+
+async def _obtener_job(job_id: str, tenant: str) -> dict:
+    # Un trabajo de otro tenant responde igual que uno inexistente
+    job = await job_service.get(job_id, tenant)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado.")
+    return job
+
+@router.get("/jobs/{job_id}")
+async def estado_job(job_id: str, tenant: str = Depends(validate_access_token)):
+    """
+    Estado de un trabajo: en_cola, en_proceso, completado o fallido.
+    """
+    job = await _obtener_job(job_id, tenant)
+    return {
+        "job_id": job["job_id"],
+        "estado": job["estado"],
+        "error": job["error"],
+        "creado": job["creado"],
+        "actualizado": job["actualizado"],
+    }
+
+@router.get("/jobs/{job_id}/result")
+async def resultado_job(job_id: str, tenant: str = Depends(validate_access_token)):
+    """
+    Resultado de un trabajo terminado. Mientras sigue pendiente responde 202 con
+    su estado y Retry-After; si falló, responde con el error original.
+    """
+    job = await _obtener_job(job_id, tenant)
+    if job["estado"] == job_service.DONE:
+        return JSONResponse(status_code=status.HTTP_200_OK, content=job["resultado"])
+    if job["estado"] == job_service.FAILED:
+        raise HTTPException(status_code=job["error_code"] or 500, detail=job["error"])
+    return JSONResponse(
+        status_code=status.HTTP_202_ACCEPTED,
+        content={"job_id": job["job_id"], "estado": job["estado"]},
+        headers={"Retry-After": "2"},
+    )
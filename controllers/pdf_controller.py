@@ -1,12 +1,16 @@
 import os
+from typing import Optional
 import google.generativeai as genai
-from fastapi import APIRouter, UploadFile, File, Body, Depends, HTTPException, status
+from fastapi import APIRouter, UploadFile, File, Form, Body, Depends, HTTPException, status
 from fastapi.responses import JSONResponse
 
+from middlewares.admission_middleware import admission
 from middlewares.auth_middleware_old import validate_access_static_token
-from services.upload_file_service import save_upload_file, delete_local_file
-from services.download_service import download_pdf_from_url
-from schemas.analyze_schemas import AnalyzeUrlPdfInput
+from services.upload_file_service import spool_upload_file, delete_local_file
+from services.download_service import download_pdf
+from services import gemini_service, metrics_service, model_router_service, prescreen_service, upload_registry_service
+from schemas.analyze_schemas import AnalyzeUrlPdfInput, AnalyzeUrlPdfMultiInput
+from utils.llm_json import extract_json
 
 router = APIRouter()
 
@@ -45,52 +49,152 @@ o
 "El documento corresponde a una cédula fiscal"
 """
 
+# Variante multi-tipo: una sola llamada devuelve un veredicto por cada tipo candidato
+PROMPT_TEMPLATE_MULTI = """
+Tu tarea es verificar a cuál de los siguientes tipos de documento corresponde el archivo PDF, tal como se usan en México:
+{tipos_doc}
+
+Evalúa cuidadosamente, incluso si el formato varía, pero asegúrate de evitar confusiones con documentos parecidos.
+
+**Instrucciones**:
+- Para cada tipo de la lista responde `true` si el PDF corresponde a ese tipo y `false` si no.
+- En "documentoDetectado" indica el tipo de documento detectado: uno de la lista si aplica; si no, el tipo más probable (ejemplo: "INE", "cédula fiscal", etc.).
+- Usa exactamente los nombres de la lista como claves de "veredictos".
+- Responde SOLO con el objeto JSON, sin explicaciones ni comentarios adicionales.
+
+**Ejemplo de respuesta válida**:
+{{"veredictos": {{"INE": true, "cédula fiscal": false}}, "documentoDetectado": "INE"}}
+"""
+
+# Máximo de tipos candidatos por petición multi-tipo
+MAX_TIPOS_DOC = 20
+
 def log(msg: str):
     print(f"[ANALYZE_PDF] {msg}")
 
-async def analyze_file(tipo_doc: str, local_path: str) -> dict:
-    uploaded_file = None
-    try:
-        uploaded_file = genai.upload_file(local_path)
+async def _generate_with_fallback(prompt: str, uploaded_file, etiqueta: str) -> str:
+    """
+    Recorre GEMINI_MODELS (omitiendo los que tienen el breaker abierto) hasta
+    obtener respuesta y devuelve el texto.
+    """
+    last_error = None
+
+    for model_name in await model_router_service.route(GEMINI_MODELS):
+        try:
+            log(f"Usando modelo {model_name} para '{etiqueta}'...")
+            response = await gemini_service.generate_content(model_name, [prompt, uploaded_file])
+            return response.text.strip()
+        except Exception as e:
+            last_error = str(e)
+            log(f"Error con modelo {model_name}: {e}")
+            metrics_service.fallback(model_name)
+            continue
+
+    raise Exception(f"Todos los modelos fallaron. Último error: {last_error}")
+
+async def analyze_file(tipo_doc: str, source, sha256: str, mime_type: Optional[str] = None) -> dict:
+    """
+    Verifica con Gemini si `source` (ruta local u objeto tipo archivo) es un `tipo_doc`.
+    Antes intenta responder localmente (índice de documentos conocidos y huellas
+    de texto, ver prescreen_service); `ruta` indica qué camino respondió.
+    El archivo remoto se toma del registro de subidas por `sha256`, así que analizar
+    el mismo PDF contra varios tipos sólo lo sube una vez.
+    """
+    local = await prescreen_service.classify(tipo_doc, source, sha256)
+    if local is not None:
+        log(f"'{tipo_doc}' resuelto por {local.ruta}: {local.detectado}")
+        return {
+            "tipo_doc": tipo_doc,
+            "esDocumentoValido": local.es_valido,
+            "documentoDetectado": local.detectado,
+            "response": local.detectado,
+            "ruta": local.ruta,
+            "confianza": local.confianza,
+        }
+
+    async with upload_registry_service.acquire(sha256, source, mime_type) as uploaded_file:
         prompt = PROMPT_TEMPLATE.format(tipo_doc=tipo_doc)
-        last_error = None
-
-        for model_name in GEMINI_MODELS:
-            try:
-                model = genai.GenerativeModel(model_name)
-                log(f"Usando modelo {model_name} para '{tipo_doc}'...")
-                response = model.generate_content([prompt, uploaded_file])
-                text = response.text.strip()
-                is_valid = text.strip() == "True"
-                return {
-                    "tipo_doc": tipo_doc,
-                    "esDocumentoValido": is_valid,
-                    "documentoDetectado": text,
-                    "response": text,
-                }
-            except Exception as e:
-                last_error = str(e)
-                log(f"Error con modelo {model_name}: {e}")
-                continue
-
-        raise Exception(f"Todos los modelos fallaron. Último error: {last_error}")
-    finally:
-        if uploaded_file:
-            try:
-                uploaded_file.delete()
-            except Exception as e:
-                log(f"Error borrando archivo Gemini: {e}")
+        try:
+            text = await _generate_with_fallback(prompt, uploaded_file, tipo_doc)
+        except Exception:
+            # Si todos fallan puede ser el handle remoto; forzar nueva subida la próxima vez
+            upload_registry_service.invalidate(sha256)
+            raise
+    await prescreen_service.record_verdict(tipo_doc, sha256, text)
+
+    is_valid = text.strip() == "True"
+    return {
+        "tipo_doc": tipo_doc,
+        "esDocumentoValido": is_valid,
+        "documentoDetectado": text,
+        "response": text,
+        "ruta": prescreen_service.RUTA_LLM,
+        "confianza": None,
+    }
+
+def _normalize_tipos_doc(tipos_doc: list[str]) -> list[str]:
+    # Acepta valores repetidos o separados por comas; quita vacíos y duplicados
+    tipos = []
+    for valor in tipos_doc:
+        for tipo in valor.split(","):
+            tipo = tipo.strip()
+            if tipo and tipo not in tipos:
+                tipos.append(tipo)
+    if not tipos:
+        raise HTTPException(status_code=400, detail="Debes indicar al menos un tipo de documento.")
+    if len(tipos) > MAX_TIPOS_DOC:
+        raise HTTPException(status_code=400, detail=f"Máximo {MAX_TIPOS_DOC} tipos de documento por petición.")
+    return tipos
+
+async def analyze_file_types(tipos_doc: list[str], source, sha256: str, mime_type: Optional[str] = None) -> dict:
+    """
+    Verifica con una sola subida y una sola llamada al modelo a cuál de `tipos_doc`
+    corresponde el PDF. Devuelve un veredicto por tipo y el tipo detectado.
+    """
+    async with upload_registry_service.acquire(sha256, source, mime_type) as uploaded_file:
+        prompt = PROMPT_TEMPLATE_MULTI.format(tipos_doc="\n".join(f"- {t}" for t in tipos_doc))
+        try:
+            text = await _generate_with_fallback(prompt, uploaded_file, ", ".join(tipos_doc))
+        except Exception:
+            upload_registry_service.invalidate(sha256)
+            raise
+
+    with metrics_service.phase(metrics_service.PARSEO_JSON):
+        data = extract_json(text)
+    veredictos_raw = data.get("veredictos") or {}
+    veredictos_lower = {str(k).strip().lower(): v for k, v in veredictos_raw.items()}
+    detectado = str(data.get("documentoDetectado") or "").strip()
+
+    veredictos = []
+    tipo_detectado = None
+    for tipo in tipos_doc:
+        valor = veredictos_lower.get(tipo.lower())
+        es_valido = valor is True or str(valor).strip().lower() == "true"
+        veredictos.append({"tipo_doc": tipo, "esDocumentoValido": es_valido})
+        if es_valido and tipo_detectado is None:
+            tipo_detectado = tipo
+    if tipo_detectado is None:
+        tipo_detectado = next((t for t in tipos_doc if t.lower() == detectado.lower()), None)
+
+    return {
+        "tiposDoc": tipos_doc,
+        "veredictos": veredictos,
+        "tipoDetectado": tipo_detectado,
+        "documentoDetectado": detectado,
+        "response": text,
+    }
 
 @router.post("/analyze_pdf/{tipo_doc}")
 async def analyze_pdf(
     tipo_doc: str,
     file: UploadFile = File(...),
-    _: None = Depends(validate_access_static_token),
+    _: None = Depends(admission(validate_access_static_token)),
 ):
-    local_path = None
+    spooled = None
     try:
-        local_path = await save_upload_file(file, UPLOAD_DIR)
-        result = await analyze_file(tipo_doc, local_path)
+        # Archivos chicos se quedan en memoria; grandes pasan a UPLOAD_DIR
+        spooled = await spool_upload_file(file, UPLOAD_DIR)
+        result = await analyze_file(tipo_doc, spooled.file, spooled.sha256, mime_type=spooled.mime_type)
         return JSONResponse(status_code=status.HTTP_200_OK, content=result)
     except HTTPException:
         raise
@@ -98,19 +202,20 @@ async def analyze_pdf(
         log(f"Error al analizar PDF: {e}")
         raise HTTPException(status_code=500, detail=str(e))
     finally:
-        if local_path:
-            await delete_local_file(local_path)
+        if spooled:
+            await spooled.close()
 
 @router.post("/analyze_url_pdf/{tipo_doc}")
 async def analyze_url_pdf(
     tipo_doc: str,
     input: AnalyzeUrlPdfInput = Body(...),
-    _: None = Depends(validate_access_static_token),
+    _: None = Depends(admission(validate_access_static_token)),
 ):
     temp_path = None
     try:
-        temp_path = download_pdf_from_url(input.downloadUrl)
-        result = await analyze_file(tipo_doc, temp_path)
+        downloaded = await download_pdf(input.downloadUrl)
+        temp_path = downloaded.path
+        result = await analyze_file(tipo_doc, temp_path, downloaded.sha256)
         return JSONResponse(status_code=status.HTTP_200_OK, content=result)
     except HTTPException:
         raise
@@ -120,3 +225,45 @@ async def analyze_url_pdf(
     finally:
         if temp_path:
             await delete_local_file(temp_path)
+
+@router.post("/analyze_pdf_multi")
+async def analyze_pdf_multi(
+    file: UploadFile = File(...),
+    tipos_doc: list[str] = Form(...),
+    _: None = Depends(admission(validate_access_static_token)),
+):
+    spooled = None
+    try:
+        tipos = _normalize_tipos_doc(tipos_doc)
+        spooled = await spool_upload_file(file, UPLOAD_DIR)
+        result = await analyze_file_types(tipos, spooled.file, spooled.sha256, mime_type=spooled.mime_type)
+        return JSONResponse(status_code=status.HTTP_200_OK, content=result)
+    except HTTPException:
+        raise
+    except Exception as e:
+        log(f"Error al clasificar PDF: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        if spooled:
+            await spooled.close()
+
+@router.post("/analyze_url_pdf_multi")
+async def analyze_url_pdf_multi(
+    input: AnalyzeUrlPdfMultiInput = Body(...),
+    _: None = Depends(admission(validate_access_static_token)),
+):
+    temp_path = None
+    try:
+        tipos = _normalize_tipos_doc(input.tiposDoc)
+        downloaded = await download_pdf(input.downloadUrl)
+        temp_path = downloaded.path
+        result = await analyze_file_types(tipos, temp_path, downloaded.sha256)
+        return JSONResponse(status_code=status.HTTP_200_OK, content=result)
+    except HTTPException:
+        raise
+    except Exception as e:
+        log(f"Error al clasificar PDF desde URL: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        if temp_path:
+            await delete_local_file(temp_path)
@@ -0,0 +1,35 @@
+from fastapi import APIRouter, Depends
+from fastapi.responses import PlainTextResponse
+
+from middlewares import auth_middleware
+from middlewares.auth_middleware import validate_access_token
+from services import admission_service, executor_service, extraction_cache_service, hedging_service, job_service, metrics_service, model_router_service, prescreen_service, profiling_service, quota_service, upload_registry_service
+
+router = APIRouter()
+
+@router.get("/stats", dependencies=[Depends(validate_access_token)])
+async def get_stats():
+    """
+    Estado interno del worker que atiende la petición.
+    """
+    return {
+        "executor": executor_service.stats(),
+        "extraction_cache": extraction_cache_service.stats(),
+        "upload_registry": upload_registry_service.stats(),
+        "model_router": await model_router_service.stats(),
+        "gemini_quota": await quota_service.stats(),
+        "hedging": hedging_service.stats(),
+        "prescreen": prescreen_service.stats(),
+        "jobs": job_service.stats(),
+        "auth": auth_middleware.stats(),
+        "admission": admission_service.stats(),
+        "profiling": profiling_service.stats(),
+    }
+
+@router.get("/metrics", dependencies=[Depends(validate_access_token)], response_class=PlainTextResponse)
+async def get_metrics():
+    """
+    Métricas en formato de exposición de Prometheus, sumadas entre todos los
+    workers (no sólo el que atiende la petición).
+    """
+    return PlainTextResponse(await metrics_service.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
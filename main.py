@@ -1,14 +1,39 @@
 import os
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
 
-from controllers import info_controller, pdf_controller, financial_info_controller
+from controllers import info_controller, pdf_controller, financial_info_controller, jobs_controller, stats_controller
+from middlewares import auth_middleware
+from middlewares.metrics_middleware import MetricsMiddleware
+from middlewares.profiling_middleware import ProfilingMiddleware
+from services import download_service, job_service, metrics_service, upload_registry_service
 
 # Cargar .env
 load_dotenv()
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Certificados de Firebase listos antes de la primera petición
+    auth_middleware.warm_up_certs()
+    # GC de archivos subidos a Gemini
+    gc_task = asyncio.create_task(upload_registry_service.run_gc())
+    # Consumidores de la cola de trabajos asíncronos
+    job_tasks = job_service.start()
+    # Volcado periódico de métricas a la base compartida entre workers
+    metrics_task = asyncio.create_task(metrics_service.run_flush())
+    yield
+    await job_service.stop(job_tasks)
+    gc_task.cancel()
+    await upload_registry_service.collect(force=True)
+    metrics_task.cancel()
+    await metrics_service.flush()
+    # Cerrar conexiones HTTP compartidas
+    await download_service.close_client()
+
+app = FastAPI(lifespan=lifespan)
 
 # Configuración de CORS desde variables de entorno
 origins = os.getenv("CORS_ALLOW_ORIGINS", "").split(",")
@@ -27,7 +52,14 @@ if origins != [""]:
 else:
     print("Advertencia: CORS no está configurado. Define CORS_ALLOW_ORIGINS en .env.")
 
+# Al final para envolver también a CORS: mide la petición completa
+app.add_middleware(MetricsMiddleware)
+# Perfilado bajo demanda (cabecera X-Profile); el más externo, incluye métricas y auth
+app.add_middleware(ProfilingMiddleware)
+
 # Registrar routers
 app.include_router(info_controller.router)
 app.include_router(pdf_controller.router)
 app.include_router(financial_info_controller.router)
+app.include_router(jobs_controller.router)
+app.include_router(stats_controller.router)
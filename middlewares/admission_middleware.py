@@ -0,0 +1,29 @@
+"""
+Dependencia de FastAPI para el control de admisión por tenant
+(ver services/admission_service.py).
+
+    @router.post("/ruta", dependencies=[Depends(admission(validate_access_token, cost=3))])
+
+La dependencia de autenticación devuelve el id del tenant; el lugar se pide
+antes de ejecutar la ruta y se libera al terminar la petición.
+"""
+
+from typing import Callable
+from fastapi import Depends
+
+from middlewares.auth_middleware import validate_access_token
+from services import admission_service
+
+def admission(auth_dependency: Callable = validate_access_token, cost: float = 1):
+    """
+    Crea una dependencia que autentica con `auth_dependency` y espera un lugar
+    para el tenant con el costo dado (unidades de la cola justa).
+    """
+    async def _admitir(tenant: str = Depends(auth_dependency)):
+        ticket = await admission_service.acquire(tenant, cost)
+        try:
+            yield ticket
+        finally:
+            admission_service.release(ticket)
+
+    return _admitir
@@ -15,7 +15,10 @@ Este módulo provee la dependencia `validate_access_token` para proteger rutas e
    - Reclamos verificados: `exp`, `aud`, `iss`, `sub`.
 
 ### Caching de certificados X.509
-Los certificados públicos de Firebase se almacenan en memoria (`_certs`) junto con su tiempo de expiración (`_certs_expiry`) según `Cache-Control: max-age`. Se usan con un lock para seguridad ante múltiples hilos; al expirar se redescargan.
+Los certificados públicos de Firebase se parsean una sola vez y se guardan como claves públicas por `kid` (`_keys`) junto con su tiempo de expiración (`_certs_expiry`) según `Cache-Control: max-age`. Se precargan al arrancar (`warm_up_certs`) y, cerca de expirar, se refrescan en un hilo en segundo plano mientras las peticiones siguen usando las claves actuales (stale-while-revalidate).
+
+### Caching de tokens verificados
+Un token ya verificado se guarda por su SHA-256 hasta su `exp` (máximo `AUTH_TOKEN_CACHE_TTL` segundos) en un LRU de `AUTH_TOKEN_CACHE_SIZE` entradas, así que las peticiones repetidas del mismo usuario no repiten la verificación RSA.
 
 ### Comportamiento de errores
 - Falta o formato incorrecto de la cabecera → `HTTPException 401 Unauthorized`
@@ -24,21 +27,25 @@ Los certificados públicos de Firebase se almacenan en memoria (`_certs`) junto
 
 import os
 import time
+import hashlib
 import threading
 import requests
 import secrets
+from collections import OrderedDict
+from typing import Optional
 from fastapi import Header, HTTPException, status
 from dotenv import load_dotenv
 import jwt
 from jwt import ExpiredSignatureError, InvalidAudienceError, InvalidIssuerError, InvalidSignatureError
 from cryptography import x509
-from cryptography.hazmat.primitives import serialization
 
 # Cargar variables de entorno
 load_dotenv('.env')
 
 # TOKEN ESTÁTICO (compatibilidad, deprecated)
 ACCESS_TOKEN = os.getenv("ACCESS_TOKEN")
+# Tenant de las peticiones con el token estático
+STATIC_TENANT = "static"
 # ID de proyecto Firebase para aud/iss
 PROJECT_ID   = os.getenv("FIREBASE_PROJECT_ID")
 
@@ -54,51 +61,159 @@ _CERT_URL = (
     "securetoken@system.gserviceaccount.com"
 )
 
-# Caché de certificados
-_certs = None
+# Caché de certificados: kid -> clave pública ya parseada
+_keys: dict = {}
 _certs_expiry = 0
 _certs_lock = threading.Lock()
+_refresh_lock = threading.Lock()  # Un solo refresco en curso por proceso
+_last_unknown_kid_refresh = 0.0
+
+# Refrescar en segundo plano cuando falte menos que esto para expirar
+AUTH_CERTS_REFRESH_MARGIN = int(os.getenv("AUTH_CERTS_REFRESH_MARGIN", "300"))
+# Tiempo máximo que se siguen usando certificados expirados si el refresco falla
+AUTH_CERTS_MAX_STALE = int(os.getenv("AUTH_CERTS_MAX_STALE", "3600"))
+# Mínimo entre refrescos provocados por un kid desconocido
+AUTH_UNKNOWN_KID_REFRESH_INTERVAL = int(os.getenv("AUTH_UNKNOWN_KID_REFRESH_INTERVAL", "60"))
+
+# Caché de tokens ya verificados: sha256(token) -> (expira_en, payload)
+AUTH_TOKEN_CACHE_SIZE = int(os.getenv("AUTH_TOKEN_CACHE_SIZE", "1024"))
+AUTH_TOKEN_CACHE_TTL = int(os.getenv("AUTH_TOKEN_CACHE_TTL", "300"))
+_tokens: "OrderedDict[str, tuple[float, dict]]" = OrderedDict()
+_tokens_lock = threading.Lock()
+
+_contadores = {"tokens_cache_hits": 0, "tokens_verificados": 0, "tokens_rechazados": 0,
+               "refrescos_certs": 0, "errores_refresco": 0}
+
+def _parse_max_age(cache_control: str) -> int:
+    max_age = 0
+    for part in cache_control.split(','):
+        if part.strip().startswith('max-age'):
+            _, val = part.split('=', 1)
+            try:
+                max_age = int(val)
+            except ValueError:
+                pass
+    return max_age
 
-def _get_firebase_certs():
+def _refresh_firebase_certs() -> None:
     """
-    Descarga y cachea los certificados X.509 de Firebase.
-    Retorna dict { kid: cert_pem } protegido por lock.
-    Imprime si se usa caché o se realiza petición.
+    Descarga los certificados X.509 de Firebase y reemplaza el caché de claves
+    públicas (parseadas una sola vez por kid). Lanza excepción si falla.
     """
-    global _certs, _certs_expiry
+    global _keys, _certs_expiry
+    resp = requests.get(_CERT_URL, timeout=10)
+    resp.raise_for_status()
+    max_age = _parse_max_age(resp.headers.get("Cache-Control", ""))
+
+    keys = {
+        kid: x509.load_pem_x509_certificate(cert_pem.encode('utf-8')).public_key()
+        for kid, cert_pem in resp.json().items()
+    }
     with _certs_lock:
-        if _certs and time.time() < _certs_expiry:
-            print(f"🔄 Usando certificados cacheados hasta {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(_certs_expiry))}")
-            return _certs
-
-        print("🌐 Caché expirado o no existente; descargando certificados...")
-        resp = requests.get(_CERT_URL)
-        resp.raise_for_status()
-
-        cache_control = resp.headers.get("Cache-Control", "")
-        max_age = 0
-        for part in cache_control.split(','):
-            if part.strip().startswith('max-age'):
-                _, val = part.split('=', 1)
-                try:
-                    max_age = int(val)
-                except ValueError:
-                    pass
-
-        _certs = resp.json()
+        _keys = keys
         _certs_expiry = time.time() + max_age
-        print(f"✅ Certificados actualizados; expiran en {max_age}s hasta {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(_certs_expiry))}")
-        return _certs
+    _contadores["refrescos_certs"] += 1
+    print(f"✅ Certificados actualizados; expiran en {max_age}s hasta {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(_certs_expiry))}")
+
+def _refresh_in_background() -> None:
+    # Si ya hay un refresco en curso no se lanza otro
+    if not _refresh_lock.acquire(blocking=False):
+        return
+
+    def _run():
+        try:
+            _refresh_firebase_certs()
+        except Exception as e:
+            _contadores["errores_refresco"] += 1
+            print(f"⚠️ Error refrescando certificados de Firebase: {e}")
+        finally:
+            _refresh_lock.release()
+
+    threading.Thread(target=_run, name="firebase-certs", daemon=True).start()
+
+def warm_up_certs() -> None:
+    """
+    Inicia la descarga de certificados en segundo plano al arrancar (se llama
+    desde el lifespan), para que las peticiones no tengan que esperarla.
+    """
+    _refresh_in_background()
+
+def _get_firebase_keys() -> dict:
+    """
+    Retorna dict { kid: clave pública } con stale-while-revalidate: cerca de
+    expirar (o ya expirado, hasta AUTH_CERTS_MAX_STALE) se sirven las claves
+    actuales y se refresca en segundo plano. Sólo sin claves utilizables (la
+    precarga no ha terminado o falló) se espera o se hace la descarga en línea.
+    """
+    ahora = time.time()
+    with _certs_lock:
+        keys, expiry = _keys, _certs_expiry
+
+    if keys and ahora < expiry + AUTH_CERTS_MAX_STALE:
+        if ahora >= expiry - AUTH_CERTS_REFRESH_MARGIN:
+            _refresh_in_background()
+        return keys
+
+    # Si hay un refresco en curso (p. ej. la precarga) se espera a que termine
+    with _refresh_lock:
+        with _certs_lock:
+            if _keys and time.time() < _certs_expiry:
+                return _keys
+        print("🌐 Sin certificados vigentes; descargando certificados...")
+        _refresh_firebase_certs()
+    with _certs_lock:
+        return _keys
+
+def _refresh_for_unknown_kid() -> None:
+    # Google publica las claves nuevas antes de usarlas; un kid desconocido suele
+    # ser un token falso, así que se limita la frecuencia de refrescos que provoca
+    global _last_unknown_kid_refresh
+    ahora = time.time()
+    if ahora - _last_unknown_kid_refresh >= AUTH_UNKNOWN_KID_REFRESH_INTERVAL:
+        _last_unknown_kid_refresh = ahora
+        _refresh_in_background()
+
+def _token_key(id_token: str) -> str:
+    return hashlib.sha256(id_token.encode('utf-8')).hexdigest()
+
+def _cached_payload(key: str) -> Optional[dict]:
+    with _tokens_lock:
+        entry = _tokens.get(key)
+        if entry is None:
+            return None
+        expires_at, payload = entry
+        if expires_at <= time.time():
+            del _tokens[key]
+            return None
+        _tokens.move_to_end(key)
+        return payload
+
+def _cache_payload(key: str, payload: dict) -> None:
+    # Nunca más allá del exp del propio token
+    expires_at = min(float(payload.get('exp', 0)), time.time() + AUTH_TOKEN_CACHE_TTL)
+    if expires_at <= time.time():
+        return
+    with _tokens_lock:
+        _tokens[key] = (expires_at, payload)
+        _tokens.move_to_end(key)
+        while len(_tokens) > AUTH_TOKEN_CACHE_SIZE:
+            _tokens.popitem(last=False)
 
 def _verify_firebase_jwt(id_token: str) -> dict:
     """
     Verifica manualmente un Firebase ID Token:
+      - Si el mismo token ya se verificó y no ha expirado, usa el resultado cacheado.
       - Obtiene 'kid' del header JWT.
-      - Carga certificado del caché.
-      - Convierte X.509 a clave pública PEM.
+      - Toma la clave pública ya parseada del caché.
       - Decodifica y valida reclamos con PyJWT.
     Retorna payload o lanza ValueError.
     """
+    key = _token_key(id_token)
+    payload = _cached_payload(key)
+    if payload is not None:
+        _contadores["tokens_cache_hits"] += 1
+        return payload
+
     # Extraer header de manera segura
     try:
         header = jwt.get_unverified_header(id_token)
@@ -110,18 +225,11 @@ def _verify_firebase_jwt(id_token: str) -> dict:
     if alg != 'RS256' or not kid:
         raise ValueError('Encabezado JWT inválido')
 
-    certs = _get_firebase_certs()
-    cert_pem = certs.get(kid)
-    if not cert_pem:
+    public_key = _get_firebase_keys().get(kid)
+    if public_key is None:
+        _refresh_for_unknown_kid()
         raise ValueError(f'Clave pública desconocida: {kid}')
 
-    # Parsear certificado X.509 a clave pública PEM
-    cert_obj = x509.load_pem_x509_certificate(cert_pem.encode('utf-8'))
-    public_key = cert_obj.public_key().public_bytes(
-        encoding=serialization.Encoding.PEM,
-        format=serialization.PublicFormat.SubjectPublicKeyInfo,
-    )
-
     try:
         payload = jwt.decode(
             id_token,
@@ -143,14 +251,31 @@ def _verify_firebase_jwt(id_token: str) -> dict:
 
     if not payload.get('sub'):
         raise ValueError("Claim 'sub' inválido en JWT")
+
+    _contadores["tokens_verificados"] += 1
+    _cache_payload(key, payload)
     return payload
 
-def validate_access_token(authorization: str = Header(None)):
+def stats() -> dict:
+    """
+    Estado de los cachés de certificados y tokens de este worker.
+    """
+    with _tokens_lock:
+        tokens_en_cache = len(_tokens)
+    return {
+        "claves": len(_keys),
+        "certs_expiran_en": round(_certs_expiry - time.time()) if _certs_expiry else None,
+        "tokens_en_cache": tokens_en_cache,
+        **_contadores,
+    }
+
+def validate_access_token(authorization: str = Header(None)) -> str:
     """
     Dependencia de FastAPI:
     1) Si ACCESS_TOKEN está definido y coincide → OK.
     2) Verificar Firebase ID Token.
     Sino → HTTPException 401/403.
+    Retorna el id del tenant: "static" o "firebase:<sub>".
     """
     if not authorization:
         raise HTTPException(
@@ -171,16 +296,17 @@ def validate_access_token(authorization: str = Header(None)):
 
     # 1) Verificar token estático (deprecated)
     if ACCESS_TOKEN and secrets.compare_digest(token, ACCESS_TOKEN):
-        return
+        return STATIC_TENANT
 
     # 2) Verificar Firebase JWT
     try:
         payload = _verify_firebase_jwt(token)
     except ValueError:
+        _contadores["tokens_rechazados"] += 1
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Not authorized to access this resource",
             headers={"WWW-Authenticate": "Bearer"},
         )
 
-    return
+    return f"firebase:{payload['sub']}"
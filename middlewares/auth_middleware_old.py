@@ -8,7 +8,7 @@ ACCESS_TOKEN = os.getenv("ACCESS_TOKEN")
 if not ACCESS_TOKEN:
     raise ValueError("Define 'ACCESS_TOKEN' en .env")
 
-def validate_access_static_token(authorization: str = Header(None)):
+def validate_access_static_token(authorization: str = Header(None)) -> str:
     if not authorization:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -20,3 +20,5 @@ def validate_access_static_token(authorization: str = Header(None)):
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Token de acceso inválido.",
         )
+    # Mismo tenant que el token estático en auth_middleware
+    return "static"
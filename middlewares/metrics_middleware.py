@@ -0,0 +1,41 @@
+"""
+Middleware ASGI de métricas (ver services/metrics_service.py).
+
+    app.add_middleware(MetricsMiddleware)
+
+Asocia las observaciones de cada petición a su ruta y mide su duración hasta
+enviar el último byte de la respuesta (incluye el cuerpo de las respuestas en
+streaming).
+"""
+
+import time
+
+from services import metrics_service
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not metrics_service.METRICS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        inicio = time.perf_counter()
+        status_code = 500
+
+        async def _send(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        token = metrics_service.bind_scope(scope)
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            metrics_service.unbind(token)
+            # FastAPI deja la ruta encontrada en el scope al enrutar
+            metrics_service.observe_request(
+                metrics_service.route_label(scope), scope["method"], status_code, time.perf_counter() - inicio
+            )
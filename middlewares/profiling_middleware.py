@@ -0,0 +1,49 @@
+"""
+Middleware ASGI de perfilado bajo demanda (ver services/profiling_service.py).
+
+    app.add_middleware(ProfilingMiddleware)
+
+Una petición con `X-Profile: <PROFILE_TOKEN>` se perfila completa, desde antes
+de la autenticación hasta el último byte de la respuesta. La respuesta lleva
+`X-Profile-File` con el nombre del archivo generado, o `X-Profile-Status` con
+el motivo si no se perfiló. Un valor incorrecto se ignora en silencio.
+"""
+
+import time
+import threading
+
+from services import profiling_service
+
+CABECERA = b"x-profile"
+
+class ProfilingMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not profiling_service.PROFILE_TOKEN:
+            await self.app(scope, receive, send)
+            return
+
+        valor = next((v for k, v in scope["headers"] if k == CABECERA), None)
+        if valor is None or not profiling_service.authorized(valor):
+            await self.app(scope, receive, send)
+            return
+
+        muestreador, nombre = profiling_service.start(threading.get_ident(), scope["method"], scope["path"])
+        cabecera = (b"x-profile-file" if muestreador else b"x-profile-status", nombre.encode())
+
+        async def _send(message):
+            if message["type"] == "http.response.start":
+                message = {**message, "headers": [*message.get("headers", []), cabecera]}
+            await send(message)
+
+        if muestreador is None:
+            await self.app(scope, receive, _send)
+            return
+
+        inicio = time.perf_counter()
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            await profiling_service.finish(muestreador, nombre, time.perf_counter() - inicio)
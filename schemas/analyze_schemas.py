@@ -2,3 +2,7 @@ from pydantic import BaseModel, HttpUrl
 
 class AnalyzeUrlPdfInput(BaseModel):
     downloadUrl: HttpUrl
+
+class AnalyzeUrlPdfMultiInput(BaseModel):
+    downloadUrl: HttpUrl
+    tiposDoc: list[str]
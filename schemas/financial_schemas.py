@@ -0,0 +1,75 @@
+from pydantic import BaseModel, ConfigDict, Field, model_validator
+
+# Claves estándar del estado de situación financiera, en el orden del prompt
+CAMPOS_ESTADO_FINANCIERO = (
+    "Bancos",
+    "Clientes",
+    "Inventarios",
+    "Total Activo Circulante",
+    "Total Activo No Circulante",
+    "Total Activo",
+    "Proveedores",
+    "Total Pasivo a Corto Plazo",
+    "Total Pasivo a Largo Plazo",
+    "Total Pasivo",
+    "Capital Social",
+    "Utilidad o pérdida del ejercicio",
+    "Total Capital Contable",
+    "Total Pasivo y Capital Contable",
+    "Ingresos",
+    "Costos de venta y/o servicio",
+)
+
+class EstadoFinancieroAnio(BaseModel):
+    """
+    Los 16 conceptos de un año. Los valores son cadenas de dígitos ("" si el
+    concepto no aparece), igual que en la salida en prosa.
+    Sin defaults en los campos: el SDK de Gemini no acepta "default" en el
+    response_schema; los conceptos omitidos se completan al validar.
+    """
+    model_config = ConfigDict(populate_by_name=True)
+
+    anio: str = Field(description="Año del estado financiero, p. ej. 2023")
+    bancos: str = Field(alias="Bancos")
+    clientes: str = Field(alias="Clientes")
+    inventarios: str = Field(alias="Inventarios")
+    total_activo_circulante: str = Field(alias="Total Activo Circulante")
+    total_activo_no_circulante: str = Field(alias="Total Activo No Circulante")
+    total_activo: str = Field(alias="Total Activo")
+    proveedores: str = Field(alias="Proveedores")
+    total_pasivo_corto_plazo: str = Field(alias="Total Pasivo a Corto Plazo")
+    total_pasivo_largo_plazo: str = Field(alias="Total Pasivo a Largo Plazo")
+    total_pasivo: str = Field(alias="Total Pasivo")
+    capital_social: str = Field(alias="Capital Social")
+    utilidad_perdida_ejercicio: str = Field(alias="Utilidad o pérdida del ejercicio")
+    total_capital_contable: str = Field(alias="Total Capital Contable")
+    total_pasivo_capital_contable: str = Field(alias="Total Pasivo y Capital Contable")
+    ingresos: str = Field(alias="Ingresos")
+    costos_venta_servicio: str = Field(alias="Costos de venta y/o servicio")
+
+    @model_validator(mode="before")
+    @classmethod
+    def _completar_omitidos(cls, data):
+        if isinstance(data, dict):
+            data = {**{campo: "" for campo in CAMPOS_ESTADO_FINANCIERO}, **data}
+            data["anio"] = str(data.get("anio", "")).strip()
+            for campo in CAMPOS_ESTADO_FINANCIERO:
+                # El modelo a veces devuelve null o números aunque el esquema pida texto
+                valor = data[campo]
+                data[campo] = "" if valor is None else str(valor)
+        return data
+
+class EstadoSituacionFinanciera(BaseModel):
+    """
+    Respuesta estructurada de la extracción: una entrada por año. El esquema no
+    admite objetos con claves dinámicas, así que el año va dentro de cada entrada.
+    """
+    anios: list[EstadoFinancieroAnio]
+
+    def por_anio(self) -> dict[str, dict[str, str]]:
+        # Misma forma que la salida en prosa: {año: {concepto: valor}}
+        return {
+            entrada.anio: entrada.model_dump(by_alias=True, exclude={"anio"})
+            for entrada in self.anios
+            if entrada.anio
+        }
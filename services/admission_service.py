@@ -0,0 +1,303 @@
+"""
+Control de admisión por tenant con colas justas ponderadas (WFQ).
+
+Cada petición a una ruta costosa, y cada trabajo asíncrono de job_service, pide
+un lugar antes de ejecutarse:
+  - Cuota de tasa por tenant (token bucket de `ADMISSION_TENANT_RATE` peticiones
+    por segundo, ráfaga `ADMISSION_TENANT_BURST`): si se excede → 429.
+  - Cuota de concurrencia por tenant (`ADMISSION_TENANT_CONCURRENCY`) y global del
+    worker (`ADMISSION_MAX_CONCURRENCY`): si no hay lugar, la petición espera en la
+    cola de su tenant (máximo `ADMISSION_TENANT_MAX_QUEUE`; si no cabe → 429).
+  - Al liberarse un lugar se despacha la petición con menor etiqueta de fin
+    virtual (start-time fair queuing): cada tenant avanza costo / peso por
+    petición, así que uno con un lote grande no deja sin turno a los demás.
+  - Una petición que espera más de `ADMISSION_MAX_WAIT` segundos → 503.
+
+Deshabilitado por defecto (`ADMISSION_ENABLED`). El tenant es el `sub` del
+Firebase ID Token o el token estático. Los pesos se configuran con
+`ADMISSION_TENANT_WEIGHTS` ("static=2,firebase:uid=3"). El estado vive en
+memoria de cada worker de uvicorn: los límites son por worker.
+"""
+
+import os
+import time
+import asyncio
+import itertools
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Optional
+from fastapi import HTTPException, status
+
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "false").lower() == "true"
+ADMISSION_MAX_CONCURRENCY = int(os.getenv("ADMISSION_MAX_CONCURRENCY", "32"))
+ADMISSION_TENANT_CONCURRENCY = int(os.getenv("ADMISSION_TENANT_CONCURRENCY", "8"))
+ADMISSION_TENANT_RATE = float(os.getenv("ADMISSION_TENANT_RATE", "5"))
+ADMISSION_TENANT_BURST = float(os.getenv("ADMISSION_TENANT_BURST", "20"))
+ADMISSION_TENANT_MAX_QUEUE = int(os.getenv("ADMISSION_TENANT_MAX_QUEUE", "50"))
+ADMISSION_MAX_WAIT = float(os.getenv("ADMISSION_MAX_WAIT", "30"))
+# Tenants inactivos más de esto se olvidan (salvo que tengan peso configurado)
+ADMISSION_TENANT_IDLE_TTL = int(os.getenv("ADMISSION_TENANT_IDLE_TTL", "3600"))
+# Esperas recientes que se guardan por tenant para los percentiles
+_MUESTRAS_ESPERA = 200
+
+
+def _parse_weights(raw: str) -> dict[str, float]:
+    pesos = {}
+    for parte in raw.split(","):
+        if "=" not in parte:
+            continue
+        tenant, peso = parte.rsplit("=", 1)
+        try:
+            pesos[tenant.strip()] = max(0.01, float(peso))
+        except ValueError:
+            print(f"[ADMISSION] Peso inválido para '{tenant.strip()}': {peso}")
+    return pesos
+
+
+ADMISSION_TENANT_WEIGHTS = _parse_weights(os.getenv("ADMISSION_TENANT_WEIGHTS", ""))
+
+
+@dataclass
+class _Espera:
+    tenant: str
+    cost: float
+    start: float
+    finish: float
+    future: asyncio.Future
+    encolada_en: float = field(default_factory=time.perf_counter)
+
+
+@dataclass
+class _Tenant:
+    weight: float
+    tokens: float
+    tokens_at: float
+    last_finish: float = 0.0
+    running: int = 0
+    cola: deque = field(default_factory=deque)
+    esperas_ms: deque = field(default_factory=lambda: deque(maxlen=_MUESTRAS_ESPERA))
+    last_seen: float = field(default_factory=time.time)
+    admitidas: int = 0
+    encoladas: int = 0
+    rechazadas_tasa: int = 0
+    rechazadas_cola: int = 0
+    vencidas: int = 0
+
+
+@dataclass
+class Ticket:
+    tenant: str
+    espera_ms: float
+
+
+_tenants: dict[str, _Tenant] = {}
+_running = 0
+_virtual_time = 0.0
+_seq = itertools.count()
+
+
+def _tenant(tenant_id: str) -> _Tenant:
+    t = _tenants.get(tenant_id)
+    if t is None:
+        t = _Tenant(
+            weight=ADMISSION_TENANT_WEIGHTS.get(tenant_id, 1.0),
+            tokens=ADMISSION_TENANT_BURST,
+            tokens_at=time.monotonic(),
+        )
+        _tenants[tenant_id] = t
+        _olvidar_inactivos()
+    t.last_seen = time.time()
+    return t
+
+
+def _olvidar_inactivos() -> None:
+    limite = time.time() - ADMISSION_TENANT_IDLE_TTL
+    for tenant_id in [k for k, t in _tenants.items()
+                      if t.last_seen < limite and not t.running and not t.cola
+                      and k not in ADMISSION_TENANT_WEIGHTS]:
+        del _tenants[tenant_id]
+
+
+def _take_token(t: _Tenant) -> bool:
+    ahora = time.monotonic()
+    t.tokens = min(ADMISSION_TENANT_BURST, t.tokens + (ahora - t.tokens_at) * ADMISSION_TENANT_RATE)
+    t.tokens_at = ahora
+    if t.tokens >= 1:
+        t.tokens -= 1
+        return True
+    return False
+
+
+def _hay_espera_elegible() -> bool:
+    return any(t.cola and t.running < ADMISSION_TENANT_CONCURRENCY for t in _tenants.values())
+
+
+def _admitir(t: _Tenant) -> None:
+    global _running
+    _running += 1
+    t.running += 1
+    t.admitidas += 1
+
+
+def _dispatch() -> None:
+    """
+    Mientras haya lugar global, despacha la espera con menor etiqueta de fin entre
+    los tenants que no han llegado a su cuota de concurrencia.
+    """
+    global _virtual_time
+    while _running < ADMISSION_MAX_CONCURRENCY:
+        elegida: Optional[_Espera] = None
+        for t in _tenants.values():
+            if not t.cola or t.running >= ADMISSION_TENANT_CONCURRENCY:
+                continue
+            cabeza = t.cola[0]
+            if elegida is None or cabeza.finish < elegida.finish:
+                elegida = cabeza
+        if elegida is None:
+            return
+        t = _tenants[elegida.tenant]
+        t.cola.popleft()
+        _virtual_time = max(_virtual_time, elegida.start)
+        _admitir(t)
+        elegida.future.set_result(None)
+
+
+def _retirar_de_cola(t: _Tenant, espera: _Espera) -> None:
+    """
+    Quita una espera vencida o cancelada y devuelve su avance en la cola justa:
+    las esperas posteriores del tenant y su última etiqueta retroceden en lo que
+    ésta había avanzado.
+    """
+    posicion = t.cola.index(espera)
+    del t.cola[posicion]
+    avance = espera.finish - espera.start
+    for siguiente in itertools.islice(t.cola, posicion, None):
+        siguiente.start -= avance
+        siguiente.finish -= avance
+    t.last_finish -= avance
+
+
+def _retry_after_rate() -> str:
+    return str(max(1, round(1 / ADMISSION_TENANT_RATE))) if ADMISSION_TENANT_RATE > 0 else "60"
+
+
+async def acquire(tenant_id: str, cost: float = 1) -> Optional[Ticket]:
+    """
+    Espera un lugar para una petición de `tenant_id` con el costo dado (unidades
+    de la cola justa). Devuelve el Ticket que se entrega a release().
+    Lanza HTTPException 429 (cuota del tenant) o 503 (espera excedida).
+    """
+    global _virtual_time
+    if not ADMISSION_ENABLED:
+        return None
+
+    t = _tenant(tenant_id)
+    if not _take_token(t):
+        t.rechazadas_tasa += 1
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Límite de peticiones por segundo excedido.",
+            headers={"Retry-After": _retry_after_rate()},
+        )
+
+    # Etiquetas de la cola justa: el tenant avanza cost / peso por petición
+    # admitida o encolada (las rechazadas no cuentan en su turno)
+    start = max(_virtual_time, t.last_finish)
+    finish = start + cost / t.weight
+
+    # Atajo: hay lugar y nadie elegible esperando
+    if (_running < ADMISSION_MAX_CONCURRENCY and t.running < ADMISSION_TENANT_CONCURRENCY
+            and not _hay_espera_elegible()):
+        t.last_finish = finish
+        _virtual_time = max(_virtual_time, start)
+        _admitir(t)
+        t.esperas_ms.append(0.0)
+        return Ticket(tenant_id, 0.0)
+
+    if len(t.cola) >= ADMISSION_TENANT_MAX_QUEUE:
+        t.rechazadas_cola += 1
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Demasiadas peticiones en espera para este cliente.",
+            headers={"Retry-After": "5"},
+        )
+
+    espera = _Espera(tenant_id, cost, start, finish, asyncio.get_running_loop().create_future())
+    t.cola.append(espera)
+    t.last_finish = finish
+    t.encoladas += 1
+    _dispatch()
+
+    try:
+        await asyncio.wait_for(asyncio.shield(espera.future), ADMISSION_MAX_WAIT)
+    except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+        if espera.future.done():
+            # Se despachó justo al vencer: devolver el lugar
+            release(Ticket(tenant_id, 0.0))
+        else:
+            espera.future.cancel()
+            _retirar_de_cola(t, espera)
+        if isinstance(e, asyncio.CancelledError):
+            raise
+        t.vencidas += 1
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Servicio saturado, intenta de nuevo en unos segundos.",
+            headers={"Retry-After": "5"},
+        )
+
+    espera_ms = (time.perf_counter() - espera.encolada_en) * 1000
+    t.esperas_ms.append(espera_ms)
+    return Ticket(tenant_id, espera_ms)
+
+
+def release(ticket: Optional[Ticket]) -> None:
+    """
+    Devuelve el lugar de una petición admitida y despacha a la siguiente.
+    """
+    global _running
+    if ticket is None:
+        return
+    t = _tenants.get(ticket.tenant)
+    _running -= 1
+    if t is not None:
+        t.running -= 1
+    _dispatch()
+
+
+def _percentil(valores: list[float], p: float) -> Optional[float]:
+    if not valores:
+        return None
+    ordenados = sorted(valores)
+    return round(ordenados[min(len(ordenados) - 1, int(p * len(ordenados)))], 1)
+
+
+def stats() -> dict:
+    """
+    Ocupación global y por tenant de este worker, con tiempos de espera en cola.
+    """
+    tenants = {}
+    for tenant_id, t in _tenants.items():
+        esperas = list(t.esperas_ms)
+        tenants[tenant_id] = {
+            "peso": t.weight,
+            "en_ejecucion": t.running,
+            "en_cola": len(t.cola),
+            "tokens": round(min(ADMISSION_TENANT_BURST,
+                                t.tokens + (time.monotonic() - t.tokens_at) * ADMISSION_TENANT_RATE), 2),
+            "admitidas": t.admitidas,
+            "encoladas": t.encoladas,
+            "rechazadas_tasa": t.rechazadas_tasa,
+            "rechazadas_cola": t.rechazadas_cola,
+            "vencidas": t.vencidas,
+            "espera_p50_ms": _percentil(esperas, 0.5),
+            "espera_p95_ms": _percentil(esperas, 0.95),
+            "espera_max_ms": round(max(esperas), 1) if esperas else None,
+        }
+    return {
+        "habilitado": ADMISSION_ENABLED,
+        "max_concurrency": ADMISSION_MAX_CONCURRENCY,
+        "en_ejecucion": _running,
+        "en_cola": sum(len(t.cola) for t in _tenants.values()),
+        "tenants": tenants,
+    }
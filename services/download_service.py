@@ -1,22 +1,138 @@
+import os
+import hashlib
 import tempfile
+from dataclasses import dataclass
+from typing import Optional
 import httpx
-from fastapi import HTTPException
+from fastapi import HTTPException, status
 
-def download_pdf_from_url(source_url: str) -> str:
+from services import metrics_service
+from services.executor_service import run_blocking
+
+# Límites de descarga
+DOWNLOAD_MAX_BYTES = int(os.getenv("DOWNLOAD_MAX_BYTES", str(50 * 1024 * 1024)))
+DOWNLOAD_CHUNK_SIZE = int(os.getenv("DOWNLOAD_CHUNK_SIZE", str(256 * 1024)))
+DOWNLOAD_TIMEOUT = float(os.getenv("DOWNLOAD_TIMEOUT", "30"))
+# Pool de conexiones compartido por todas las descargas del worker
+DOWNLOAD_MAX_CONNECTIONS = int(os.getenv("DOWNLOAD_MAX_CONNECTIONS", "100"))
+DOWNLOAD_MAX_KEEPALIVE = int(os.getenv("DOWNLOAD_MAX_KEEPALIVE", "20"))
+
+# Tipos aceptados; algunos storages sirven PDFs como binario genérico
+_PDF_CONTENT_TYPES = {"application/pdf", "application/octet-stream", "binary/octet-stream"}
+_PDF_MAGIC = b"%PDF"
+
+_client: Optional[httpx.AsyncClient] = None
+
+
+@dataclass
+class DownloadedPdf:
+    path: str
+    sha256: str
+    size: int
+
+
+def get_client() -> httpx.AsyncClient:
     """
-    Descarga el contenido de source_url y lo guarda en un archivo .pdf temporal.
-    Devuelve la ruta al archivo.
+    Cliente HTTP async compartido (pool de conexiones + keep-alive). No sigue
+    redirecciones: un downloadUrl que responde 3xx se rechaza con 400.
     """
-    # Asegurarse de trabajar con str
-    url_str = str(source_url)
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            timeout=DOWNLOAD_TIMEOUT,
+            limits=httpx.Limits(
+                max_connections=DOWNLOAD_MAX_CONNECTIONS,
+                max_keepalive_connections=DOWNLOAD_MAX_KEEPALIVE,
+            ),
+        )
+    return _client
+
+
+async def close_client() -> None:
+    """
+    Cierra el cliente compartido; se llama al apagar la aplicación.
+    """
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def _open_temp_pdf():
+    return tempfile.NamedTemporaryFile(delete=False, suffix=".pdf")
+
+
+def _discard(tmp) -> None:
+    tmp.close()
+    if os.path.exists(tmp.name):
+        os.remove(tmp.name)
+
 
-    http_response = httpx.get(url_str, timeout=30)
+def _check_headers(http_response: httpx.Response) -> None:
     if http_response.status_code != 200:
         raise HTTPException(
             status_code=400,
             detail=f"No se pudo descargar el PDF (status {http_response.status_code})."
         )
 
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp:
-        tmp.write(http_response.content)
-        return tmp.name
+    content_type = http_response.headers.get("Content-Type", "").split(";")[0].strip().lower()
+    if content_type and content_type not in _PDF_CONTENT_TYPES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"El recurso no es un PDF (Content-Type {content_type})."
+        )
+
+    content_length = http_response.headers.get("Content-Length")
+    if content_length and content_length.isdigit() and int(content_length) > DOWNLOAD_MAX_BYTES:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"El PDF excede el tamaño máximo de {DOWNLOAD_MAX_BYTES} bytes."
+        )
+
+
+async def download_pdf(source_url: str) -> DownloadedPdf:
+    """
+    Descarga source_url en streaming a un archivo .pdf temporal, calculando su SHA-256
+    por bloques. Aborta antes de leer todo el cuerpo si el recurso no es un PDF o
+    excede DOWNLOAD_MAX_BYTES.
+    """
+    # Asegurarse de trabajar con str
+    url_str = str(source_url)
+
+    with metrics_service.phase(metrics_service.DESCARGA):
+        client = get_client()
+        async with client.stream("GET", url_str) as http_response:
+            _check_headers(http_response)
+
+            tmp = await run_blocking(_open_temp_pdf)
+            try:
+                sha256 = hashlib.sha256()
+                size = 0
+                async for chunk in http_response.aiter_bytes(DOWNLOAD_CHUNK_SIZE):
+                    if size == 0 and not chunk.startswith(_PDF_MAGIC):
+                        raise HTTPException(status_code=400, detail="El recurso descargado no es un PDF.")
+                    size += len(chunk)
+                    if size > DOWNLOAD_MAX_BYTES:
+                        raise HTTPException(
+                            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                            detail=f"El PDF excede el tamaño máximo de {DOWNLOAD_MAX_BYTES} bytes."
+                        )
+                    sha256.update(chunk)
+                    await run_blocking(tmp.write, chunk)
+                if size == 0:
+                    raise HTTPException(status_code=400, detail="El PDF descargado está vacío.")
+                await run_blocking(tmp.close)
+            except BaseException:
+                await run_blocking(_discard, tmp)
+                raise
+
+    return DownloadedPdf(path=tmp.name, sha256=sha256.hexdigest(), size=size)
+
+
+async def download_pdf_from_url(source_url: str) -> str:
+    """
+    Descarga el contenido de source_url y lo guarda en un archivo .pdf temporal.
+    Devuelve la ruta al archivo.
+    """
+    downloaded = await download_pdf(source_url)
+    return downloaded.path
@@ -0,0 +1,73 @@
+import os
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import HTTPException, status
+
+# Hilos dedicados a llamadas bloqueantes (SDK sin versión async, disco)
+BLOCKING_MAX_WORKERS = int(os.getenv("BLOCKING_MAX_WORKERS", "32"))
+# Máximo de tareas esperando hilo libre antes de rechazar con 503
+BLOCKING_MAX_QUEUE = int(os.getenv("BLOCKING_MAX_QUEUE", "256"))
+
+_executor = ThreadPoolExecutor(
+    max_workers=BLOCKING_MAX_WORKERS,
+    thread_name_prefix="blocking",
+)
+
+# Gauges del pool; se modifican desde el loop y desde los hilos
+_lock = threading.Lock()
+_en_cola = 0
+_en_ejecucion = 0
+
+
+def _ejecutar(func, args, kwargs):
+    global _en_cola, _en_ejecucion
+    with _lock:
+        _en_cola -= 1
+        _en_ejecucion += 1
+    try:
+        return func(*args, **kwargs)
+    finally:
+        with _lock:
+            _en_ejecucion -= 1
+
+
+def _al_terminar(future) -> None:
+    # Si la tarea se canceló antes de arrancar, nunca salió de la cola
+    global _en_cola
+    if future.cancelled():
+        with _lock:
+            _en_cola -= 1
+
+
+async def run_blocking(func, *args, **kwargs):
+    """
+    Ejecuta func(*args, **kwargs) en el pool acotado sin bloquear el event loop.
+    Lanza HTTPException 503 si la cola de espera está llena.
+    """
+    global _en_cola
+    with _lock:
+        if _en_cola >= BLOCKING_MAX_QUEUE:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Servicio saturado, intenta de nuevo en unos segundos.",
+                headers={"Retry-After": "1"},
+            )
+        _en_cola += 1
+
+    future = _executor.submit(_ejecutar, func, args, kwargs)
+    future.add_done_callback(_al_terminar)
+    return await asyncio.wrap_future(future)
+
+
+def stats() -> dict:
+    """
+    Estado actual del pool: tareas en cola (queue depth) y en ejecución.
+    """
+    with _lock:
+        return {
+            "max_workers": BLOCKING_MAX_WORKERS,
+            "max_queue": BLOCKING_MAX_QUEUE,
+            "en_cola": _en_cola,
+            "en_ejecucion": _en_ejecucion,
+        }
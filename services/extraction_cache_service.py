@@ -0,0 +1,203 @@
+"""
+Caché de extracciones de estados financieros, direccionada por contenido.
+
+La llave combina:
+  - SHA-256 de los bytes del PDF.
+  - SHA-256 del template de prompt usado.
+  - Nombre del modelo.
+
+Dos niveles:
+  1. LRU en memoria por worker (`EXTRACTION_CACHE_MEMORY_ENTRIES`).
+  2. SQLite en disco compartido por todos los workers de uvicorn
+     (`EXTRACTION_CACHE_PATH`, `EXTRACTION_CACHE_DISK_ENTRIES`).
+
+Ambos niveles expiran entradas después de `EXTRACTION_CACHE_TTL` segundos.
+Un hit en disco promueve la entrada al nivel en memoria.
+"""
+
+import os
+import json
+import time
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Any, Optional
+
+from services import metrics_service, sqlite_service
+from services.executor_service import run_blocking
+
+EXTRACTION_CACHE_ENABLED = os.getenv("EXTRACTION_CACHE_ENABLED", "true").lower() == "true"
+EXTRACTION_CACHE_TTL = int(os.getenv("EXTRACTION_CACHE_TTL", str(7 * 24 * 3600)))
+EXTRACTION_CACHE_MEMORY_ENTRIES = int(os.getenv("EXTRACTION_CACHE_MEMORY_ENTRIES", "256"))
+EXTRACTION_CACHE_DISK_ENTRIES = int(os.getenv("EXTRACTION_CACHE_DISK_ENTRIES", "10000"))
+EXTRACTION_CACHE_PATH = os.getenv(
+    "EXTRACTION_CACHE_PATH",
+    os.path.join(tempfile.gettempdir(), "documentai_extraction_cache.sqlite3"),
+)
+
+# Nivel en memoria: key -> (expira_en, valor)
+_memoria: "OrderedDict[str, tuple[float, Any]]" = OrderedDict()
+_memoria_lock = threading.Lock()
+
+_contadores = {"hits_memoria": 0, "hits_disco": 0, "misses": 0, "escrituras": 0, "errores_disco": 0}
+
+
+def _sha256(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def cache_key(pdf_sha256: str, prompt_template: str, model_name: str) -> str:
+    """
+    Llave de caché para una extracción: contenido del PDF + prompt + modelo.
+    """
+    prompt_sha256 = _sha256(prompt_template.encode("utf-8"))
+    return _sha256(f"{pdf_sha256}:{prompt_sha256}:{model_name}".encode("utf-8"))
+
+
+# --- Nivel en disco (SQLite) ---
+
+_SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS extraction_cache ("
+    " key TEXT PRIMARY KEY,"
+    " value TEXT NOT NULL,"
+    " expires_at REAL NOT NULL,"
+    " accessed_at REAL NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS idx_extraction_cache_accessed"
+    " ON extraction_cache (accessed_at)",
+]
+
+
+def _connect():
+    return sqlite_service.connect(EXTRACTION_CACHE_PATH, _SCHEMA)
+
+
+def _disk_get(key: str) -> Optional[tuple[float, Any]]:
+    conn = _connect()
+    try:
+        row = conn.execute(
+            "SELECT value, expires_at FROM extraction_cache WHERE key = ?", (key,)
+        ).fetchone()
+        if not row:
+            return None
+        value, expires_at = row
+        ahora = time.time()
+        if expires_at <= ahora:
+            conn.execute("DELETE FROM extraction_cache WHERE key = ?", (key,))
+            conn.commit()
+            return None
+        conn.execute(
+            "UPDATE extraction_cache SET accessed_at = ? WHERE key = ?", (ahora, key)
+        )
+        conn.commit()
+        return expires_at, json.loads(value)
+    finally:
+        conn.close()
+
+
+def _disk_set(key: str, value: Any, expires_at: float) -> None:
+    conn = _connect()
+    try:
+        ahora = time.time()
+        conn.execute(
+            "INSERT OR REPLACE INTO extraction_cache (key, value, expires_at, accessed_at)"
+            " VALUES (?, ?, ?, ?)",
+            (key, json.dumps(value, ensure_ascii=False), expires_at, ahora),
+        )
+        # Eviction: expiradas y, si sobra, las menos usadas recientemente
+        conn.execute("DELETE FROM extraction_cache WHERE expires_at <= ?", (ahora,))
+        conn.execute(
+            "DELETE FROM extraction_cache WHERE key IN ("
+            " SELECT key FROM extraction_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+            (EXTRACTION_CACHE_DISK_ENTRIES,),
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+# --- Nivel en memoria (LRU) ---
+
+def _memory_get(key: str) -> Optional[Any]:
+    with _memoria_lock:
+        entry = _memoria.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.time():
+            del _memoria[key]
+            return None
+        _memoria.move_to_end(key)
+        return value
+
+
+def _memory_set(key: str, value: Any, expires_at: float) -> None:
+    with _memoria_lock:
+        _memoria[key] = (expires_at, value)
+        _memoria.move_to_end(key)
+        while len(_memoria) > EXTRACTION_CACHE_MEMORY_ENTRIES:
+            _memoria.popitem(last=False)
+
+
+# --- API pública ---
+
+async def get(key: str) -> Optional[Any]:
+    """
+    Busca una extracción en memoria y luego en disco. Devuelve None si no existe.
+    """
+    if not EXTRACTION_CACHE_ENABLED:
+        return None
+
+    value = _memory_get(key)
+    if value is not None:
+        _contadores["hits_memoria"] += 1
+        metrics_service.cache("extraccion", True)
+        return value
+
+    try:
+        entry = await run_blocking(_disk_get, key)
+    except Exception as e:
+        _contadores["errores_disco"] += 1
+        print(f"[EXTRACTION_CACHE] Error leyendo caché en disco: {e}")
+        entry = None
+
+    if entry is None:
+        _contadores["misses"] += 1
+        metrics_service.cache("extraccion", False)
+        return None
+
+    expires_at, value = entry
+    _memory_set(key, value, expires_at)
+    _contadores["hits_disco"] += 1
+    metrics_service.cache("extraccion", True)
+    return value
+
+
+async def put(key: str, value: Any) -> None:
+    """
+    Guarda una extracción en ambos niveles. Un fallo en disco no interrumpe la petición.
+    """
+    if not EXTRACTION_CACHE_ENABLED:
+        return
+
+    expires_at = time.time() + EXTRACTION_CACHE_TTL
+    _memory_set(key, value, expires_at)
+    _contadores["escrituras"] += 1
+    try:
+        await run_blocking(_disk_set, key, value, expires_at)
+    except Exception as e:
+        _contadores["errores_disco"] += 1
+        print(f"[EXTRACTION_CACHE] Error escribiendo caché en disco: {e}")
+
+
+def stats() -> dict:
+    """
+    Contadores de hits/misses de este worker y tamaño del nivel en memoria.
+    """
+    with _memoria_lock:
+        entradas_memoria = len(_memoria)
+    return {
+        "habilitada": EXTRACTION_CACHE_ENABLED,
+        "entradas_memoria": entradas_memoria,
+        **_contadores,
+    }
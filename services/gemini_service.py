@@ -0,0 +1,97 @@
+import time
+import asyncio
+from contextlib import aclosing
+from typing import AsyncIterator, Optional
+import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
+
+from services import metrics_service, model_router_service, quota_service
+from services.executor_service import run_blocking
+
+async def upload_file(source, mime_type: Optional[str] = None):
+    """
+    Sube a Gemini un archivo local (ruta) o un objeto tipo archivo; para estos
+    últimos mime_type es obligatorio. El SDK no ofrece versión async,
+    así que se ejecuta en el pool de bloqueantes.
+    """
+    with metrics_service.phase(metrics_service.SUBIDA_GEMINI):
+        return await run_blocking(genai.upload_file, source, mime_type=mime_type)
+
+async def delete_file(uploaded_file) -> None:
+    """
+    Elimina un archivo previamente subido a Gemini.
+    """
+    with metrics_service.phase(metrics_service.BORRADO_REMOTO):
+        await run_blocking(uploaded_file.delete)
+
+def _registrar_metricas(model_name: str, inicio: float, ok: bool, usage_metadata=None) -> None:
+    metrics_service.observe_phase(metrics_service.GENERACION, time.perf_counter() - inicio, model_name)
+    metrics_service.gemini_call(model_name, ok, usage_metadata)
+
+async def generate_content(model_name: str, contents: list, **kwargs):
+    """
+    Llama a generate_content usando el cliente async nativo del SDK y registra
+    el resultado en el circuit breaker del modelo. Antes espera la cuota del
+    modelo (quota_service); si no alcanza lanza QuotaExhausted sin llamar.
+    """
+    reserva = await quota_service.acquire(model_name, contents)
+    model = genai.GenerativeModel(model_name)
+    inicio = time.perf_counter()
+    try:
+        response = await model.generate_content_async(contents, **kwargs)
+    except Exception as e:
+        _registrar_metricas(model_name, inicio, False)
+        if isinstance(e, google_exceptions.TooManyRequests):
+            await quota_service.penalize(model_name)
+        if model_router_service.is_model_failure(e):
+            await model_router_service.record(model_name, False, (time.perf_counter() - inicio) * 1000)
+        raise
+    uso = getattr(response, "usage_metadata", None)
+    _registrar_metricas(model_name, inicio, True, uso)
+    await model_router_service.record(model_name, True, (time.perf_counter() - inicio) * 1000)
+    await quota_service.settle(reserva, uso)
+    return response
+
+async def generate_content_stream(model_name: str, contents: list, **kwargs) -> AsyncIterator[str]:
+    """
+    Versión en streaming de generate_content: produce el texto de cada fragmento
+    conforme llega. La llamada se registra en el circuit breaker al terminar o
+    fallar; si el consumidor la cancela (cliente desconectado) no cuenta como fallo,
+    y si la cierra antes de tiempo porque ya tiene lo que necesita cuenta como éxito.
+    La cuota se reserva igual que en generate_content.
+    """
+    reserva = await quota_service.acquire(model_name, contents)
+    model = genai.GenerativeModel(model_name)
+    inicio = time.perf_counter()
+    uso = None  # usage_metadata del último fragmento recibido
+    try:
+        response = await model.generate_content_async(contents, stream=True, **kwargs)
+        # aclosing cierra el stream del SDK también al cancelar
+        async with aclosing(aiter(response)) as chunks:
+            async for chunk in chunks:
+                uso = getattr(chunk, "usage_metadata", None) or uso
+                try:
+                    texto = chunk.text
+                except ValueError:
+                    # Fragmento sin partes de texto (p. ej. sólo finish_reason)
+                    continue
+                if texto:
+                    yield texto
+    except asyncio.CancelledError:
+        raise
+    except GeneratorExit:
+        # aclose() del consumidor tras recibir texto: el modelo respondió bien
+        _registrar_metricas(model_name, inicio, True, uso)
+        await model_router_service.record(model_name, True, (time.perf_counter() - inicio) * 1000)
+        await quota_service.settle(reserva, uso)
+        raise
+    except Exception as e:
+        _registrar_metricas(model_name, inicio, False)
+        if isinstance(e, google_exceptions.TooManyRequests):
+            await quota_service.penalize(model_name)
+        if model_router_service.is_model_failure(e):
+            await model_router_service.record(model_name, False, (time.perf_counter() - inicio) * 1000)
+        raise
+    _registrar_metricas(model_name, inicio, True, uso)
+    await model_router_service.record(model_name, True, (time.perf_counter() - inicio) * 1000)
+    await quota_service.settle(reserva, uso)
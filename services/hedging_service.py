@@ -0,0 +1,102 @@
+"""
+Peticiones cubiertas (hedged requests) para recortar la latencia de cola.
+
+Se lanza la llamada al modelo primario; si no responde dentro del percentil
+`HEDGING_PERCENTILE` de su latencia reciente, se lanza la misma llamada al
+siguiente modelo. Gana la primera respuesta exitosa y la otra se cancela.
+
+Para no duplicar el gasto de cuota, cada petición acumula `HEDGING_MAX_RATE`
+créditos (hasta `HEDGING_BURST`) y cada cobertura consume uno: a la larga como
+máximo esa fracción de peticiones genera una segunda llamada.
+"""
+
+import os
+import asyncio
+from typing import Awaitable, Callable
+
+from services import model_router_service
+
+HEDGING_ENABLED = os.getenv("HEDGING_ENABLED", "false").lower() == "true"
+HEDGING_PERCENTILE = float(os.getenv("HEDGING_PERCENTILE", "0.95"))
+# Espera antes de cubrir cuando aún no hay latencias suficientes del primario
+HEDGING_DEFAULT_DELAY_MS = float(os.getenv("HEDGING_DEFAULT_DELAY_MS", "5000"))
+HEDGING_MAX_RATE = float(os.getenv("HEDGING_MAX_RATE", "0.1"))
+HEDGING_BURST = float(os.getenv("HEDGING_BURST", "5"))
+
+_creditos = 0.0
+_contadores = {"peticiones": 0, "coberturas": 0, "coberturas_ganadoras": 0, "sin_credito": 0}
+
+
+def _tomar_credito() -> bool:
+    global _creditos
+    if _creditos >= 1:
+        _creditos -= 1
+        return True
+    _contadores["sin_credito"] += 1
+    return False
+
+
+async def hedged_call(
+    call: Callable[[str], Awaitable],
+    primary: str,
+    secondary: str,
+):
+    """
+    Ejecuta call(primary) y, si tarda más del percentil configurado y hay crédito,
+    también call(secondary). Si el primario falla antes de cubrirse, se llama al
+    secundario de todos modos. Devuelve la primera respuesta exitosa; si ambas
+    fallan propaga el último error.
+    """
+    global _creditos
+    _contadores["peticiones"] += 1
+    _creditos = min(HEDGING_BURST, _creditos + HEDGING_MAX_RATE)
+
+    delay_ms = await model_router_service.latency_percentile(primary, HEDGING_PERCENTILE)
+    if delay_ms is None:
+        delay_ms = HEDGING_DEFAULT_DELAY_MS
+
+    tareas = {asyncio.create_task(call(primary)): primary}
+    cobertura = None
+    try:
+        done, _ = await asyncio.wait(tareas, timeout=delay_ms / 1000)
+        if not done and _tomar_credito():
+            _contadores["coberturas"] += 1
+            cobertura = asyncio.create_task(call(secondary))
+            tareas[cobertura] = secondary
+
+        last_error = None
+        pendientes = set(tareas)
+        while pendientes:
+            done, pendientes = await asyncio.wait(pendientes, return_when=asyncio.FIRST_COMPLETED)
+            for tarea in done:
+                if tarea.exception() is None:
+                    if tarea is cobertura:
+                        _contadores["coberturas_ganadoras"] += 1
+                    return tarea.result()
+                last_error = tarea.exception()
+                if secondary not in tareas.values():
+                    # El primario falló sin cobertura: el secundario entra como
+                    # fallback (sin consumir crédito), igual que sin hedging
+                    fallback = asyncio.create_task(call(secondary))
+                    tareas[fallback] = secondary
+                    pendientes.add(fallback)
+        raise last_error
+    finally:
+        for tarea in tareas:
+            if tarea.done():
+                # Marca como leída la excepción de la tarea perdedora
+                if not tarea.cancelled():
+                    tarea.exception()
+            else:
+                tarea.cancel()
+
+
+def stats() -> dict:
+    """
+    Contadores de coberturas de este worker.
+    """
+    return {
+        "habilitado": HEDGING_ENABLED,
+        "creditos": round(_creditos, 2),
+        **_contadores,
+    }
@@ -0,0 +1,401 @@
+"""
+Trabajos asíncronos (submit / poll / result) para análisis de larga duración.
+
+  - `submit(kind, payload, tenant, idempotency_key)` guarda el trabajo en una base
+    SQLite compartida por todos los workers (`JOBS_PATH`) y lo encola en el worker
+    que recibió la petición. Si la cola local ya tiene `JOBS_MAX_QUEUE` trabajos
+    pendientes responde 503 con Retry-After en lugar de acumularlos.
+  - `JOBS_MAX_CONCURRENCY` tareas por worker consumen la cola y ejecutan el
+    handler registrado para cada `kind` con `register(kind, handler, cost)`.
+    Antes de ejecutarlo, el trabajo pide lugar en el control de admisión del
+    tenant con ese costo, igual que la ruta síncrona equivalente (ver
+    services/admission_service.py); un 429/503 de la admisión deja el trabajo
+    fallido con ese código y puede reenviarse con su llave.
+  - Con `Idempotency-Key`, repetir el mismo envío devuelve el trabajo existente
+    (no se vuelve a extraer); la misma llave con otro cuerpo responde 409. Un
+    trabajo fallido se reencola al reenviarlo con su llave. Las llaves son por
+    tenant: dos clientes pueden usar la misma sin chocar.
+  - `get(job_id, tenant)` funciona desde cualquier worker y sólo devuelve los
+    trabajos del tenant que los creó. Los trabajos terminados se
+    borran después de `JOBS_TTL` segundos. Cada worker renueva periódicamente
+    `updated_at` de los trabajos que tiene en cola o en ejecución; los que pasan
+    `JOBS_STALE_AFTER` sin renovarse (su worker murió) se marcan como fallidos.
+"""
+
+import os
+import json
+import time
+import uuid
+import asyncio
+import hashlib
+import sqlite3
+import tempfile
+from typing import Any, Awaitable, Callable, Optional
+from fastapi import HTTPException, status
+
+from services import admission_service, metrics_service, sqlite_service
+from services.executor_service import run_blocking
+
+# Trabajos ejecutándose a la vez por worker de uvicorn
+JOBS_MAX_CONCURRENCY = int(os.getenv("JOBS_MAX_CONCURRENCY", "2"))
+# Trabajos pendientes (en cola + en ejecución) por worker antes de responder 503
+JOBS_MAX_QUEUE = int(os.getenv("JOBS_MAX_QUEUE", "20"))
+JOBS_RETRY_AFTER = int(os.getenv("JOBS_RETRY_AFTER", "10"))
+# Vida de un trabajo terminado (y de su llave de idempotencia)
+JOBS_TTL = int(os.getenv("JOBS_TTL", str(24 * 3600)))
+# Un trabajo que su worker no renueva en este tiempo se considera perdido
+JOBS_STALE_AFTER = int(os.getenv("JOBS_STALE_AFTER", "900"))
+JOBS_CLEANUP_INTERVAL = int(os.getenv("JOBS_CLEANUP_INTERVAL", "300"))
+# Renovación de los trabajos vivos: varias veces dentro de JOBS_STALE_AFTER
+_INTERVALO_LATIDO = min(JOBS_CLEANUP_INTERVAL, JOBS_STALE_AFTER / 3)
+JOBS_PATH = os.getenv(
+    "JOBS_PATH",
+    os.path.join(tempfile.gettempdir(), "documentai_jobs.sqlite3"),
+)
+
+QUEUED = "en_cola"
+RUNNING = "en_proceso"
+DONE = "completado"
+FAILED = "fallido"
+
+# Tabla "tenant_jobs": la anterior ("jobs") tenía la llave de idempotencia única
+# global y sin tenant; se deja de usar y sus filas se ignoran
+_SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS tenant_jobs ("
+    " id TEXT PRIMARY KEY,"
+    " tenant TEXT NOT NULL,"
+    " kind TEXT NOT NULL,"
+    " idempotency_key TEXT,"
+    " request_hash TEXT NOT NULL,"
+    " payload TEXT NOT NULL,"
+    " status TEXT NOT NULL,"
+    " result TEXT,"
+    " error TEXT,"
+    " error_code INTEGER,"
+    " created_at REAL NOT NULL,"
+    " updated_at REAL NOT NULL,"
+    " UNIQUE (tenant, idempotency_key))",
+    "CREATE INDEX IF NOT EXISTS idx_tenant_jobs_status_updated ON tenant_jobs (status, updated_at)",
+]
+
+Handler = Callable[[Any], Awaitable[Any]]
+
+_handlers: dict[str, Handler] = {}
+_costos: dict[str, float] = {}
+_cola: Optional[asyncio.Queue] = None
+_pendientes = 0
+# Trabajos de este worker en cola y en ejecución (para renovarlos y para
+# marcarlos si se apaga)
+_en_cola: set[str] = set()
+_en_ejecucion: set[str] = set()
+_contadores = {"aceptados": 0, "reutilizados": 0, "rechazados": 0, "completados": 0, "fallidos": 0}
+
+
+def _connect():
+    return sqlite_service.connect(JOBS_PATH, _SCHEMA)
+
+
+def register(kind: str, handler: Handler, cost: float = 1) -> None:
+    """
+    Registra la corrutina que ejecuta los trabajos de tipo `kind`. Recibe el
+    payload (JSON) y devuelve el resultado (JSON); un HTTPException conserva su
+    status_code y detail en el trabajo fallido. `cost` es el costo en la cola
+    justa de admisión, el mismo que usa la ruta síncrona.
+    """
+    _handlers[kind] = handler
+    _costos[kind] = cost
+
+
+def _request_hash(kind: str, payload: Any) -> str:
+    cuerpo = json.dumps(payload, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(f"{kind}:{cuerpo}".encode("utf-8")).hexdigest()
+
+
+def _row_to_job(row) -> dict:
+    job_id, kind, estado, result, error, error_code, created_at, updated_at = row
+    return {
+        "job_id": job_id,
+        "kind": kind,
+        "estado": estado,
+        "resultado": json.loads(result) if result is not None else None,
+        "error": error,
+        "error_code": error_code,
+        "creado": created_at,
+        "actualizado": updated_at,
+    }
+
+
+_COLUMNAS = "id, kind, status, result, error, error_code, created_at, updated_at"
+
+
+def _insert(kind: str, payload: Any, tenant: str, idempotency_key: Optional[str]) -> tuple[dict, bool]:
+    """
+    Crea el trabajo o devuelve el existente para la llave. El segundo valor indica
+    si hay que encolarlo (nuevo o fallido reintentado).
+    """
+    request_hash = _request_hash(kind, payload)
+    conn = _connect()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        if idempotency_key:
+            row = conn.execute(
+                f"SELECT {_COLUMNAS}, request_hash FROM tenant_jobs WHERE tenant = ? AND idempotency_key = ?",
+                (tenant, idempotency_key),
+            ).fetchone()
+            if row:
+                if row[-1] != request_hash:
+                    raise HTTPException(
+                        status_code=status.HTTP_409_CONFLICT,
+                        detail="La Idempotency-Key ya se usó con otra petición.",
+                    )
+                job = _row_to_job(row[:-1])
+                if job["estado"] != FAILED:
+                    conn.commit()
+                    return job, False
+                # Reintento de un trabajo fallido: se reencola con el mismo id
+                ahora = time.time()
+                conn.execute(
+                    "UPDATE tenant_jobs SET status = ?, result = NULL, error = NULL, error_code = NULL,"
+                    " updated_at = ? WHERE id = ?",
+                    (QUEUED, ahora, job["job_id"]),
+                )
+                conn.commit()
+                job.update(estado=QUEUED, error=None, error_code=None, actualizado=ahora)
+                return job, True
+
+        ahora = time.time()
+        job_id = uuid.uuid4().hex
+        conn.execute(
+            "INSERT INTO tenant_jobs (id, tenant, kind, idempotency_key, request_hash, payload, status,"
+            " created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (job_id, tenant, kind, idempotency_key, request_hash,
+             json.dumps(payload, ensure_ascii=False), QUEUED, ahora, ahora),
+        )
+        conn.commit()
+        return _row_to_job((job_id, kind, QUEUED, None, None, None, ahora, ahora)), True
+    except sqlite3.IntegrityError:
+        # Otro worker insertó la misma llave entre el SELECT y el INSERT
+        conn.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Petición con la misma Idempotency-Key en curso, reintenta.",
+            headers={"Retry-After": "1"},
+        )
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+def _select(job_id: str, tenant: str) -> Optional[dict]:
+    conn = _connect()
+    try:
+        row = conn.execute(
+            f"SELECT {_COLUMNAS} FROM tenant_jobs WHERE id = ? AND tenant = ?", (job_id, tenant)
+        ).fetchone()
+        return _row_to_job(row) if row else None
+    finally:
+        conn.close()
+
+
+def _load_payload(job_id: str) -> Any:
+    conn = _connect()
+    try:
+        row = conn.execute("SELECT payload FROM tenant_jobs WHERE id = ?", (job_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+    finally:
+        conn.close()
+
+
+def _update(job_id: str, estado: str, result: Any = None, error: Optional[str] = None,
+            error_code: Optional[int] = None) -> None:
+    conn = _connect()
+    try:
+        conn.execute(
+            "UPDATE tenant_jobs SET status = ?, result = ?, error = ?, error_code = ?, updated_at = ?"
+            " WHERE id = ?",
+            (estado, json.dumps(result, ensure_ascii=False) if result is not None else None,
+             error, error_code, time.time(), job_id),
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def _latido(job_ids: list[str]) -> None:
+    conn = _connect()
+    try:
+        marcas = ", ".join("?" * len(job_ids))
+        conn.execute(
+            f"UPDATE tenant_jobs SET updated_at = ? WHERE id IN ({marcas}) AND status IN (?, ?)",
+            (time.time(), *job_ids, QUEUED, RUNNING),
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def _cleanup() -> None:
+    conn = _connect()
+    try:
+        ahora = time.time()
+        conn.execute(
+            "DELETE FROM tenant_jobs WHERE status IN (?, ?) AND updated_at < ?",
+            (DONE, FAILED, ahora - JOBS_TTL),
+        )
+        conn.execute(
+            "UPDATE tenant_jobs SET status = ?, error = ?, error_code = ?, updated_at = ?"
+            " WHERE status IN (?, ?) AND updated_at < ?",
+            (FAILED, "Trabajo interrumpido.", 500, ahora, QUEUED, RUNNING, ahora - JOBS_STALE_AFTER),
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+async def submit(kind: str, payload: Any, tenant: str, idempotency_key: Optional[str] = None) -> dict:
+    """
+    Registra y encola un trabajo de `tenant`. Devuelve su estado actual (el del
+    trabajo previo si el tenant ya había usado la llave de idempotencia).
+    """
+    global _pendientes
+    if kind not in _handlers:
+        raise ValueError(f"Tipo de trabajo desconocido: {kind}")
+    if _cola is None:
+        raise RuntimeError("job_service no está iniciado")
+
+    # Se reserva el lugar antes de escribir para no crear trabajos que no caben
+    if _pendientes >= JOBS_MAX_QUEUE:
+        _contadores["rechazados"] += 1
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Cola de trabajos llena, intenta de nuevo más tarde.",
+            headers={"Retry-After": str(JOBS_RETRY_AFTER)},
+        )
+    _pendientes += 1
+    try:
+        job, encolar = await run_blocking(_insert, kind, payload, tenant, idempotency_key)
+    except BaseException:
+        _pendientes -= 1
+        raise
+
+    if not encolar:
+        _pendientes -= 1
+        _contadores["reutilizados"] += 1
+        return job
+
+    _contadores["aceptados"] += 1
+    _en_cola.add(job["job_id"])
+    _cola.put_nowait((job["job_id"], kind, tenant))
+    return job
+
+
+async def get(job_id: str, tenant: str) -> Optional[dict]:
+    """
+    Estado (y resultado, si terminó) de un trabajo, o None si no existe o es de
+    otro tenant.
+    """
+    return await run_blocking(_select, job_id, tenant)
+
+
+async def _ejecutar(job_id: str, kind: str, tenant: str) -> None:
+    ticket = None
+    try:
+        ticket = await admission_service.acquire(tenant, _costos[kind])
+        await run_blocking(_update, job_id, RUNNING)
+        payload = await run_blocking(_load_payload, job_id)
+        with metrics_service.route(f"job:{kind}"):
+            resultado = await _handlers[kind](payload)
+    except HTTPException as e:
+        _contadores["fallidos"] += 1
+        await run_blocking(_update, job_id, FAILED, None, str(e.detail), e.status_code)
+    except Exception as e:
+        _contadores["fallidos"] += 1
+        print(f"[JOBS] Error en trabajo {job_id}: {e}")
+        await run_blocking(_update, job_id, FAILED, None, str(e), 500)
+    else:
+        _contadores["completados"] += 1
+        await run_blocking(_update, job_id, DONE, resultado)
+    finally:
+        admission_service.release(ticket)
+
+
+async def _runner() -> None:
+    global _pendientes
+    while True:
+        job_id, kind, tenant = await _cola.get()
+        _en_cola.discard(job_id)
+        _en_ejecucion.add(job_id)
+        try:
+            await _ejecutar(job_id, kind, tenant)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"[JOBS] Error actualizando trabajo {job_id}: {e}")
+        finally:
+            _en_ejecucion.discard(job_id)
+            _pendientes -= 1
+            _cola.task_done()
+
+
+async def _run_cleanup() -> None:
+    ultima_limpieza = 0.0
+    while True:
+        vivos = list(_en_cola | _en_ejecucion)
+        try:
+            if vivos:
+                await run_blocking(_latido, vivos)
+            if time.monotonic() - ultima_limpieza >= JOBS_CLEANUP_INTERVAL:
+                await run_blocking(_cleanup)
+                ultima_limpieza = time.monotonic()
+        except Exception as e:
+            print(f"[JOBS] Error limpiando trabajos: {e}")
+        await asyncio.sleep(_INTERVALO_LATIDO)
+
+
+def start() -> list[asyncio.Task]:
+    """
+    Crea la cola y arranca las tareas que la consumen; se llama desde el lifespan.
+    Devuelve las tareas para cancelarlas al apagar.
+    """
+    global _cola, _pendientes
+    _cola = asyncio.Queue()
+    _pendientes = 0
+    _en_cola.clear()
+    tareas = [asyncio.create_task(_runner()) for _ in range(JOBS_MAX_CONCURRENCY)]
+    tareas.append(asyncio.create_task(_run_cleanup()))
+    return tareas
+
+
+async def stop(tareas: list[asyncio.Task]) -> None:
+    """
+    Cancela las tareas de start() y marca como fallidos los trabajos de este
+    worker que quedaron sin terminar.
+    """
+    sin_terminar = list(_en_ejecucion)
+    for tarea in tareas:
+        tarea.cancel()
+    await asyncio.gather(*tareas, return_exceptions=True)
+
+    while _cola is not None and not _cola.empty():
+        sin_terminar.append(_cola.get_nowait()[0])
+    for job_id in sin_terminar:
+        try:
+            await run_blocking(_update, job_id, FAILED, None, "Servicio reiniciado.", 503)
+        except Exception as e:
+            print(f"[JOBS] Error marcando trabajo {job_id}: {e}")
+
+
+def stats() -> dict:
+    """
+    Ocupación de la cola de trabajos de este worker.
+    """
+    return {
+        "max_concurrency": JOBS_MAX_CONCURRENCY,
+        "max_queue": JOBS_MAX_QUEUE,
+        "pendientes": _pendientes,
+        "en_cola": _cola.qsize() if _cola is not None else 0,
+        "en_ejecucion": len(_en_ejecucion),
+        **_contadores,
+    }
@@ -0,0 +1,352 @@
+"""
+Métricas en formato Prometheus (latencia por fase, tokens, costo, fallbacks y
+cachés), agregadas entre los workers de uvicorn.
+
+Cada worker acumula en memoria: registrar una observación es sólo aritmética
+sobre un dict, sin I/O en el camino de la petición. Cada
+`METRICS_FLUSH_INTERVAL` segundos (y antes de responder /metrics) el worker
+escribe sus totales acumulados en SQLite compartido, una fila por
+(worker, métrica, etiquetas). /metrics suma las filas de todos los workers.
+Las filas de workers que ya terminaron se conservan: sus contadores siguen
+sumando y el total nunca retrocede (igual que el modo multiproceso de
+prometheus_client).
+
+La ruta de cada observación sale del contexto de la petición (plantilla de la
+ruta de FastAPI, p. ej. "/analyze_pdf/{tipo_doc}", o "job:<tipo>" en los
+trabajos asíncronos); ver middlewares/metrics_middleware.py.
+"""
+
+import os
+import json
+import time
+import socket
+import asyncio
+import tempfile
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from services import sqlite_service
+from services.executor_service import run_blocking
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+METRICS_FLUSH_INTERVAL = float(os.getenv("METRICS_FLUSH_INTERVAL", "15"))
+# Límites superiores (segundos) de los buckets de los histogramas de latencia
+METRICS_BUCKETS = tuple(
+    float(b) for b in os.getenv("METRICS_BUCKETS", "0.05,0.1,0.25,0.5,1,2.5,5,10,30,60,120").split(",")
+)
+# Precio en USD por millón de tokens: "modelo=entrada:salida,..."
+METRICS_PRICES = os.getenv(
+    "METRICS_PRICES",
+    "gemini-2.5-flash-lite=0.10:0.40,gemini-2.5-flash=0.30:2.50,gemini-2.5-pro=1.25:10.00",
+)
+METRICS_PATH = os.getenv(
+    "METRICS_PATH",
+    os.path.join(tempfile.gettempdir(), "documentai_metrics.sqlite3"),
+)
+
+# Fases medidas
+DESCARGA = "descarga"
+GUARDADO_LOCAL = "guardado_local"
+SUBIDA_GEMINI = "subida_gemini"
+GENERACION = "generacion"
+PARSEO_JSON = "parseo_json"
+CALCULO_RAZONES = "calculo_razones"
+BORRADO_REMOTO = "borrado_remoto"
+
+COUNTER = "counter"
+HISTOGRAM = "histogram"
+
+# nombre -> (tipo, ayuda)
+_METRICAS = {
+    "documentai_request_duration_seconds": (HISTOGRAM, "Duración de las peticiones HTTP por ruta y status."),
+    "documentai_phase_duration_seconds": (HISTOGRAM, "Duración de cada fase del procesamiento por ruta y modelo."),
+    "documentai_gemini_calls_total": (COUNTER, "Llamadas a Gemini por ruta, modelo y resultado."),
+    "documentai_gemini_tokens_total": (COUNTER, "Tokens reportados en usage_metadata por ruta, modelo y dirección."),
+    "documentai_gemini_cost_usd_total": (COUNTER, "Costo estimado en USD según METRICS_PRICES."),
+    "documentai_fallbacks_total": (COUNTER, "Fallos de un modelo que pasaron la petición al siguiente."),
+    "documentai_cache_total": (COUNTER, "Consultas a cachés por caché y resultado (hit/miss)."),
+}
+
+_SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS metrics ("
+    " worker TEXT NOT NULL,"
+    " name TEXT NOT NULL,"
+    " labels TEXT NOT NULL,"
+    " value TEXT NOT NULL,"
+    " updated_at REAL NOT NULL,"
+    " PRIMARY KEY (worker, name, labels))",
+]
+
+# Identifica a este proceso; incluye el arranque porque los pid se reutilizan
+_WORKER = f"{socket.gethostname()}:{os.getpid()}:{int(time.time())}"
+
+# (nombre, etiquetas) -> float (contador) o [conteo por bucket..., +Inf, suma] (histograma)
+_series: dict[tuple[str, tuple], object] = {}
+_sucias: set[tuple[str, tuple]] = set()
+
+# Scope ASGI de la petición en curso o {"metrics_route": ...} en trabajos
+_contexto: ContextVar[Optional[dict]] = ContextVar("metrics_contexto", default=None)
+
+
+def _parse_prices(raw: str) -> dict[str, tuple[float, float]]:
+    precios = {}
+    for parte in raw.split(","):
+        if "=" not in parte:
+            continue
+        model, valores = parte.rsplit("=", 1)
+        try:
+            entrada, salida = (float(v) for v in valores.split(":"))
+        except ValueError:
+            print(f"[METRICS] Precio inválido para '{model.strip()}': {valores}")
+            continue
+        precios[model.strip()] = (entrada, salida)
+    return precios
+
+
+_PRECIOS = _parse_prices(METRICS_PRICES)
+
+
+def _connect():
+    return sqlite_service.connect(METRICS_PATH, _SCHEMA)
+
+
+# --- Contexto de la petición ---
+
+def bind_scope(scope: dict):
+    """
+    Asocia las observaciones de la tarea actual (y de las que cree) al scope
+    ASGI de la petición; devuelve el token para `unbind`.
+    """
+    return _contexto.set(scope)
+
+
+def unbind(token) -> None:
+    _contexto.reset(token)
+
+
+@contextmanager
+def route(nombre: str):
+    """
+    Etiqueta de ruta fija para trabajo fuera de una petición HTTP (p. ej. "job:financial_analytics").
+    """
+    token = _contexto.set({"metrics_route": nombre})
+    try:
+        yield
+    finally:
+        _contexto.reset(token)
+
+
+def route_label(scope: Optional[dict] = None) -> str:
+    """
+    Plantilla de la ruta (FastAPI la deja en scope["route"] al enrutar) para no
+    crear una serie por cada valor de los parámetros de la ruta.
+    """
+    scope = scope if scope is not None else _contexto.get()
+    if scope is None:
+        return ""
+    if "metrics_route" in scope:
+        return scope["metrics_route"]
+    return getattr(scope.get("route"), "path", None) or "sin_ruta"
+
+
+# --- Registro (sólo memoria) ---
+
+def _inc(nombre: str, etiquetas: tuple, valor: float = 1) -> None:
+    clave = (nombre, etiquetas)
+    _series[clave] = _series.get(clave, 0.0) + valor
+    _sucias.add(clave)
+
+
+def _observe(nombre: str, etiquetas: tuple, segundos: float) -> None:
+    clave = (nombre, etiquetas)
+    valores = _series.get(clave)
+    if valores is None:
+        valores = _series[clave] = [0] * (len(METRICS_BUCKETS) + 1) + [0.0]
+    for i, limite in enumerate(METRICS_BUCKETS):
+        if segundos <= limite:
+            valores[i] += 1
+            break
+    else:
+        valores[len(METRICS_BUCKETS)] += 1
+    valores[-1] += segundos
+    _sucias.add(clave)
+
+
+def observe_request(route_path: str, method: str, status_code: int, segundos: float) -> None:
+    if METRICS_ENABLED:
+        _observe(
+            "documentai_request_duration_seconds",
+            (("route", route_path), ("method", method), ("status", str(status_code))),
+            segundos,
+        )
+
+
+def observe_phase(fase: str, segundos: float, model: str = "") -> None:
+    if METRICS_ENABLED:
+        _observe(
+            "documentai_phase_duration_seconds",
+            (("route", route_label()), ("phase", fase), ("model", model)),
+            segundos,
+        )
+
+
+@contextmanager
+def phase(fase: str, model: str = ""):
+    """
+    Mide el bloque como una fase (también si termina con error).
+    """
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_phase(fase, time.perf_counter() - inicio, model)
+
+
+def gemini_call(model: str, ok: bool, usage_metadata=None) -> None:
+    """
+    Cuenta una llamada a `model` y, con usage_metadata, sus tokens y su costo.
+    """
+    if not METRICS_ENABLED:
+        return
+    ruta = ("route", route_label())
+    _inc("documentai_gemini_calls_total", (ruta, ("model", model), ("result", "ok" if ok else "error")))
+    if usage_metadata is None:
+        return
+    entrada = getattr(usage_metadata, "prompt_token_count", 0) or 0
+    salida = getattr(usage_metadata, "candidates_token_count", 0) or 0
+    _inc("documentai_gemini_tokens_total", (ruta, ("model", model), ("direction", "input")), entrada)
+    _inc("documentai_gemini_tokens_total", (ruta, ("model", model), ("direction", "output")), salida)
+    precio = _PRECIOS.get(model)
+    if precio is not None:
+        costo = (entrada * precio[0] + salida * precio[1]) / 1_000_000
+        _inc("documentai_gemini_cost_usd_total", (ruta, ("model", model)), costo)
+
+
+def fallback(model: str) -> None:
+    """
+    `model` falló y la petición pasa al siguiente modelo.
+    """
+    if METRICS_ENABLED:
+        _inc("documentai_fallbacks_total", (("route", route_label()), ("model", model)))
+
+
+def cache(nombre: str, hit: bool) -> None:
+    if METRICS_ENABLED:
+        _inc("documentai_cache_total", (("cache", nombre), ("result", "hit" if hit else "miss")))
+
+
+# --- Volcado y agregación entre workers ---
+
+def _write(filas: list[tuple]) -> None:
+    conn = _connect()
+    try:
+        conn.executemany(
+            "INSERT INTO metrics (worker, name, labels, value, updated_at) VALUES (?, ?, ?, ?, ?)"
+            " ON CONFLICT(worker, name, labels) DO UPDATE SET value = excluded.value, updated_at = excluded.updated_at",
+            filas,
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+async def flush() -> None:
+    """
+    Escribe en SQLite los totales de las series que cambiaron desde el último volcado.
+    """
+    if not _sucias:
+        return
+    ahora = time.time()
+    claves = list(_sucias)
+    _sucias.clear()
+    # Copia en el loop: las observaciones siguen mientras escribe el pool
+    filas = [
+        (_WORKER, nombre, json.dumps(etiquetas), json.dumps(_series[(nombre, etiquetas)]), ahora)
+        for nombre, etiquetas in claves
+    ]
+    try:
+        await run_blocking(_write, filas)
+    except Exception:
+        _sucias.update(claves)
+        raise
+
+
+async def run_flush() -> None:
+    """
+    Bucle de volcado en segundo plano; se arranca desde el lifespan de la app.
+    """
+    while True:
+        await asyncio.sleep(METRICS_FLUSH_INTERVAL)
+        try:
+            await flush()
+        except Exception as e:
+            print(f"[METRICS] Error volcando métricas: {e}")
+
+
+def _read() -> list[tuple[str, str, str]]:
+    conn = _connect()
+    try:
+        return conn.execute("SELECT name, labels, value FROM metrics").fetchall()
+    finally:
+        conn.close()
+
+
+def _escapar(valor) -> str:
+    return str(valor).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(etiquetas, extra: tuple = ()) -> str:
+    # Las etiquetas vacías (p. ej. fases sin modelo) se omiten
+    pares = [(k, v) for k, v in (*etiquetas, *extra) if v != ""]
+    if not pares:
+        return ""
+    return "{" + ",".join(f'{k}="{_escapar(v)}"' for k, v in pares) + "}"
+
+
+def _numero(valor: float) -> str:
+    return repr(float(valor)) if isinstance(valor, float) and not valor.is_integer() else str(int(valor))
+
+
+def _render(filas: list[tuple[str, str, str]]) -> str:
+    # Suma por (nombre, etiquetas) de todos los workers
+    totales: dict[str, dict[tuple, object]] = {}
+    for nombre, etiquetas, valor in filas:
+        if nombre not in _METRICAS:
+            continue
+        etiquetas = tuple(tuple(par) for par in json.loads(etiquetas))
+        valor = json.loads(valor)
+        series = totales.setdefault(nombre, {})
+        actual = series.get(etiquetas)
+        if isinstance(valor, list):
+            if len(valor) != len(METRICS_BUCKETS) + 2:
+                continue  # Buckets de una configuración anterior
+            series[etiquetas] = valor if actual is None else [a + b for a, b in zip(actual, valor)]
+        else:
+            series[etiquetas] = valor + (actual or 0)
+
+    lineas = []
+    for nombre, (tipo, ayuda) in _METRICAS.items():
+        lineas.append(f"# HELP {nombre} {ayuda}")
+        lineas.append(f"# TYPE {nombre} {tipo}")
+        for etiquetas, valor in sorted(totales.get(nombre, {}).items()):
+            if tipo == COUNTER:
+                lineas.append(f"{nombre}{_labels(etiquetas)} {_numero(valor)}")
+                continue
+            acumulado = 0
+            for limite, conteo in zip((*METRICS_BUCKETS, float("inf")), valor):
+                acumulado += conteo
+                le = "+Inf" if limite == float("inf") else _numero(limite)
+                lineas.append(f"{nombre}_bucket{_labels(etiquetas, (('le', le),))} {acumulado}")
+            lineas.append(f"{nombre}_sum{_labels(etiquetas)} {_numero(valor[-1])}")
+            lineas.append(f"{nombre}_count{_labels(etiquetas)} {acumulado}")
+    return "\n".join(lineas) + "\n"
+
+
+async def render() -> str:
+    """
+    Texto de exposición de Prometheus con las métricas de todos los workers.
+    """
+    await flush()
+    filas = await run_blocking(_read)
+    return _render(filas)
@@ -0,0 +1,257 @@
+"""
+Ruteo adaptativo entre modelos Gemini con circuit breaker por modelo.
+
+Cada llamada a `generate_content` registra su resultado (éxito/error y latencia)
+en una base SQLite compartida por todos los workers de uvicorn. Sobre una ventana
+deslizante de `MODEL_ROUTER_WINDOW` segundos:
+  - Si hay al menos `MODEL_ROUTER_MIN_CALLS` llamadas y la proporción de fallos
+    (errores + llamadas más lentas que `MODEL_ROUTER_SLOW_MS`) alcanza
+    `MODEL_ROUTER_FAILURE_RATE`, el breaker del modelo se abre.
+  - Un modelo abierto se omite en `route()` durante `MODEL_ROUTER_COOLDOWN` segundos.
+  - Pasado el cooldown, un único worker obtiene la llamada de prueba (half-open):
+    si tiene éxito el breaker se cierra; si falla se vuelve a abrir.
+
+Si todos los modelos están abiertos, `route()` devuelve la lista original para no
+rechazar la petición sin intentarlo.
+"""
+
+import os
+import time
+import tempfile
+from typing import Optional
+from google.api_core import exceptions as google_exceptions
+
+from services import sqlite_service
+from services.executor_service import run_blocking
+
+MODEL_ROUTER_ENABLED = os.getenv("MODEL_ROUTER_ENABLED", "true").lower() == "true"
+MODEL_ROUTER_WINDOW = int(os.getenv("MODEL_ROUTER_WINDOW", "60"))
+MODEL_ROUTER_MIN_CALLS = int(os.getenv("MODEL_ROUTER_MIN_CALLS", "5"))
+MODEL_ROUTER_FAILURE_RATE = float(os.getenv("MODEL_ROUTER_FAILURE_RATE", "0.5"))
+MODEL_ROUTER_SLOW_MS = int(os.getenv("MODEL_ROUTER_SLOW_MS", "30000"))
+MODEL_ROUTER_COOLDOWN = int(os.getenv("MODEL_ROUTER_COOLDOWN", "30"))
+# Cada cuánto se relee el estado de los breakers desde SQLite
+MODEL_ROUTER_STATE_TTL = float(os.getenv("MODEL_ROUTER_STATE_TTL", "1"))
+MODEL_ROUTER_PATH = os.getenv(
+    "MODEL_ROUTER_PATH",
+    os.path.join(tempfile.gettempdir(), "documentai_model_router.sqlite3"),
+)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+_SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS model_calls ("
+    " model TEXT NOT NULL,"
+    " ts REAL NOT NULL,"
+    " ok INTEGER NOT NULL,"
+    " latency_ms REAL NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS idx_model_calls_model_ts ON model_calls (model, ts)",
+    "CREATE TABLE IF NOT EXISTS model_breakers ("
+    " model TEXT PRIMARY KEY,"
+    " state TEXT NOT NULL,"
+    " open_until REAL NOT NULL DEFAULT 0)",
+]
+
+# Copia local del estado: model -> (state, open_until)
+_estado: dict[str, tuple[str, float]] = {}
+_estado_leido_en = 0.0
+
+
+def _connect():
+    return sqlite_service.connect(MODEL_ROUTER_PATH, _SCHEMA)
+
+
+def is_model_failure(exc: BaseException) -> bool:
+    """
+    Indica si un error cuenta contra el modelo. Errores del cliente (4xx),
+    salvo 429, se deben a la petición y no a la salud del modelo.
+    """
+    if isinstance(exc, google_exceptions.TooManyRequests):
+        return True
+    return not isinstance(exc, google_exceptions.ClientError)
+
+
+def _read_states() -> dict[str, tuple[str, float]]:
+    conn = _connect()
+    try:
+        rows = conn.execute("SELECT model, state, open_until FROM model_breakers").fetchall()
+        return {model: (state, open_until) for model, state, open_until in rows}
+    finally:
+        conn.close()
+
+
+def _claim_probe(model: str) -> bool:
+    # Sólo un worker pasa de open a half_open; los demás siguen omitiendo el modelo
+    conn = _connect()
+    try:
+        ahora = time.time()
+        cur = conn.execute(
+            "UPDATE model_breakers SET state = ?, open_until = ?"
+            " WHERE model = ? AND state IN (?, ?) AND open_until <= ?",
+            (HALF_OPEN, ahora + MODEL_ROUTER_COOLDOWN, model, OPEN, HALF_OPEN, ahora),
+        )
+        conn.commit()
+        return cur.rowcount == 1
+    finally:
+        conn.close()
+
+
+def _record(model: str, ok: bool, latency_ms: float) -> None:
+    conn = _connect()
+    try:
+        ahora = time.time()
+        desde = ahora - MODEL_ROUTER_WINDOW
+        fallo = (not ok) or latency_ms > MODEL_ROUTER_SLOW_MS
+
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute(
+            "INSERT INTO model_calls (model, ts, ok, latency_ms) VALUES (?, ?, ?, ?)",
+            (model, ahora, 0 if fallo else 1, latency_ms),
+        )
+        conn.execute("DELETE FROM model_calls WHERE ts < ?", (desde,))
+
+        row = conn.execute("SELECT state FROM model_breakers WHERE model = ?", (model,)).fetchone()
+        state = row[0] if row else CLOSED
+
+        if state == HALF_OPEN:
+            # Resultado de la llamada de prueba
+            nuevo = (CLOSED, 0.0) if not fallo else (OPEN, ahora + MODEL_ROUTER_COOLDOWN)
+            if not fallo:
+                conn.execute("DELETE FROM model_calls WHERE model = ?", (model,))
+        elif state == CLOSED:
+            total, fallos = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(1 - ok), 0) FROM model_calls"
+                " WHERE model = ? AND ts >= ?",
+                (model, desde),
+            ).fetchone()
+            if total >= MODEL_ROUTER_MIN_CALLS and fallos / total >= MODEL_ROUTER_FAILURE_RATE:
+                nuevo = (OPEN, ahora + MODEL_ROUTER_COOLDOWN)
+                print(f"[MODEL_ROUTER] Breaker abierto para {model} ({fallos}/{total} fallos)")
+            else:
+                nuevo = (CLOSED, 0.0)
+        else:
+            nuevo = None
+
+        if nuevo is not None:
+            conn.execute(
+                "INSERT INTO model_breakers (model, state, open_until) VALUES (?, ?, ?)"
+                " ON CONFLICT(model) DO UPDATE SET state = excluded.state,"
+                " open_until = excluded.open_until",
+                (model, *nuevo),
+            )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+async def _states() -> dict[str, tuple[str, float]]:
+    global _estado, _estado_leido_en
+    if time.time() - _estado_leido_en > MODEL_ROUTER_STATE_TTL:
+        try:
+            _estado = await run_blocking(_read_states)
+        except Exception as e:
+            print(f"[MODEL_ROUTER] Error leyendo estado: {e}")
+        _estado_leido_en = time.time()
+    return _estado
+
+
+async def route(models: list[str]) -> list[str]:
+    """
+    Devuelve los modelos de `models` que se pueden intentar, en el mismo orden de
+    prioridad, omitiendo los que tienen el breaker abierto.
+    """
+    if not MODEL_ROUTER_ENABLED:
+        return list(models)
+
+    estados = await _states()
+    ahora = time.time()
+    disponibles = []
+    for model in models:
+        state, open_until = estados.get(model, (CLOSED, 0.0))
+        if state == CLOSED:
+            disponibles.append(model)
+        elif open_until <= ahora:
+            try:
+                if await run_blocking(_claim_probe, model):
+                    disponibles.append(model)
+            except Exception as e:
+                print(f"[MODEL_ROUTER] Error reclamando prueba de {model}: {e}")
+
+    return disponibles or list(models)
+
+
+async def record(model: str, ok: bool, latency_ms: float) -> None:
+    """
+    Registra el resultado de una llamada al modelo y actualiza su breaker.
+    Un fallo al escribir el estado no interrumpe la petición.
+    """
+    if not MODEL_ROUTER_ENABLED:
+        return
+    try:
+        await run_blocking(_record, model, ok, latency_ms)
+    except Exception as e:
+        print(f"[MODEL_ROUTER] Error registrando llamada a {model}: {e}")
+
+
+def _latency_percentile(model: str, percentile: float) -> Optional[float]:
+    conn = _connect()
+    try:
+        rows = conn.execute(
+            "SELECT latency_ms FROM model_calls WHERE model = ? AND ts >= ? AND ok = 1"
+            " ORDER BY latency_ms",
+            (model, time.time() - MODEL_ROUTER_WINDOW),
+        ).fetchall()
+    finally:
+        conn.close()
+    if len(rows) < MODEL_ROUTER_MIN_CALLS:
+        return None
+    indice = min(len(rows) - 1, int(percentile * len(rows)))
+    return rows[indice][0]
+
+
+async def latency_percentile(model: str, percentile: float) -> Optional[float]:
+    """
+    Percentil (0-1) de la latencia en ms de las llamadas exitosas de `model` en la
+    ventana actual. None si no hay suficientes muestras.
+    """
+    try:
+        return await run_blocking(_latency_percentile, model, percentile)
+    except Exception as e:
+        print(f"[MODEL_ROUTER] Error leyendo latencias de {model}: {e}")
+        return None
+
+
+def _window_stats() -> dict:
+    conn = _connect()
+    try:
+        desde = time.time() - MODEL_ROUTER_WINDOW
+        rows = conn.execute(
+            "SELECT model, COUNT(*), COALESCE(SUM(1 - ok), 0), AVG(latency_ms)"
+            " FROM model_calls WHERE ts >= ? GROUP BY model",
+            (desde,),
+        ).fetchall()
+        breakers = conn.execute("SELECT model, state, open_until FROM model_breakers").fetchall()
+    finally:
+        conn.close()
+
+    salida: dict[str, dict] = {}
+    for model, state, open_until in breakers:
+        salida[model] = {"estado": state, "abierto_hasta": open_until or None}
+    for model, total, fallos, latencia in rows:
+        salida.setdefault(model, {"estado": CLOSED, "abierto_hasta": None}).update({
+            "llamadas": total,
+            "fallos": fallos,
+            "latencia_media_ms": round(latencia, 1) if latencia is not None else None,
+        })
+    return salida
+
+
+async def stats() -> Optional[dict]:
+    """
+    Estado de los breakers y estadísticas de la ventana actual (compartidos entre workers).
+    """
+    if not MODEL_ROUTER_ENABLED:
+        return None
+    return await run_blocking(_window_stats)
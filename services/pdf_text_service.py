@@ -0,0 +1,183 @@
+"""
+Análisis local de un PDF financiero por páginas, antes de llamar a Gemini.
+
+Los estados financieros suelen generarse digitalmente y traen capa de texto; los
+reportes auditados pueden tener 80+ páginas de las que sólo unas pocas son el
+balance y el estado de resultados. `plan_extraction` lee el texto de cada página
+(hasta `PDF_TEXT_MAX_PAGES`) y:
+  - marca como relevantes las páginas con varios conceptos de un mismo estado
+    (balance o resultados) y cifras; una nota que sólo menciona "activo" no cuenta,
+  - agrupa las páginas relevantes, en orden, en fragmentos de hasta
+    `PDF_CHUNK_PAGES` páginas que se extraen en paralelo,
+  - por fragmento decide si su texto es utilizable: en promedio al menos
+    `PDF_TEXT_MIN_CHARS_PER_PAGE` caracteres por página, al menos
+    `PDF_TEXT_MIN_QUALITY` de caracteres legibles (fuentes sin mapa Unicode
+    producen basura o U+FFFD) y como máximo `PDF_TEXT_MAX_CHARS` caracteres.
+    Si lo es va en el prompt; si no, se sube un PDF con sólo esas páginas
+    (`write_pages`).
+Si el PDF está cifrado, es demasiado largo, no tiene capa de texto (escaneo) o no
+se encuentra ninguna página relevante, el plan es None y se sube el archivo completo.
+"""
+
+import os
+import re
+import tempfile
+from dataclasses import dataclass
+from typing import Optional
+from pypdf import PdfReader, PdfWriter
+
+from services.executor_service import run_blocking
+from utils.financial_merge import BALANCE, RESULTADOS
+
+PDF_TEXT_ENABLED = os.getenv("PDF_TEXT_ENABLED", "true").lower() == "true"
+PDF_TEXT_MAX_PAGES = int(os.getenv("PDF_TEXT_MAX_PAGES", "200"))
+PDF_TEXT_MIN_CHARS_PER_PAGE = int(os.getenv("PDF_TEXT_MIN_CHARS_PER_PAGE", "200"))
+PDF_TEXT_MIN_QUALITY = float(os.getenv("PDF_TEXT_MIN_QUALITY", "0.9"))
+PDF_TEXT_MAX_CHARS = int(os.getenv("PDF_TEXT_MAX_CHARS", "60000"))
+PDF_CHUNK_PAGES = int(os.getenv("PDF_CHUNK_PAGES", "4"))
+
+# Conceptos de cada estado; una página es relevante si menciona varios distintos
+_CONCEPTOS = {
+    BALANCE: [re.compile(p, re.IGNORECASE) for p in (
+        r"bancos|efectivo|disponibilidades",
+        r"clientes|cuentas por cobrar|deudores",
+        r"inventarios?|existencias",
+        r"activo (?:circulante|corriente)",
+        r"activo no (?:circulante|corriente)",
+        r"total (?:del )?activo",
+        r"proveedores|cuentas por pagar|acreedores",
+        r"pasivo (?:a corto plazo|circulante|corriente)",
+        r"pasivo (?:a largo plazo|no circulante|no corriente)",
+        r"total (?:del )?pasivo",
+        r"capital social|capital (?:pagado|suscrito)",
+        r"capital contable|patrimonio",
+    )],
+    RESULTADOS: [re.compile(p, re.IGNORECASE) for p in (
+        r"ventas|ingresos",
+        r"costos? de (?:lo vendido|ventas?|servicios?)",
+        r"utilidad|p[eé]rdida",
+        r"gastos (?:de operaci[oó]n|generales|de administraci[oó]n|de venta)",
+        r"impuestos? a la utilidad|\bisr\b",
+        r"resultado (?:integral|de operaci[oó]n|neto)|estado de resultados",
+    )],
+}
+_MIN_CONCEPTOS = {BALANCE: 4, RESULTADOS: 3}
+# Cantidades como 1,234,567 o (12,300) o 1234567.00
+_CIFRA = re.compile(r"\(?\d{1,3}(?:[,.\s]\d{3})+(?:[.,]\d+)?\)?|\d{4,}")
+_MIN_CIFRAS_PAGINA = 5
+_LEGIBLE = re.compile(r"[\w\s.,;:()$%&/'\"\-+*#°ªº¿?¡!]")
+_ESPACIOS = re.compile(r"[ \t\u00a0]+")
+_LINEAS_VACIAS = re.compile(r"\n\s*\n+")
+
+
+@dataclass
+class Fragmento:
+    paginas: list[int]  # Índices (desde 0) en el PDF original
+    tipos: set[str]  # Estados que aparecen en esas páginas
+    texto: Optional[str]  # Contexto para el prompt; None → subir esas páginas
+
+
+def _limpiar(texto: str) -> str:
+    texto = _ESPACIOS.sub(" ", texto)
+    return _LINEAS_VACIAS.sub("\n", texto).strip()
+
+
+def _calidad(texto: str) -> float:
+    visibles = [c for c in texto if not c.isspace()]
+    if not visibles:
+        return 0.0
+    return len(_LEGIBLE.findall("".join(visibles))) / len(visibles)
+
+
+def _tipos_pagina(texto: str) -> set[str]:
+    if len(_CIFRA.findall(texto)) < _MIN_CIFRAS_PAGINA:
+        return set()
+    return {
+        tipo for tipo, conceptos in _CONCEPTOS.items()
+        if sum(1 for c in conceptos if c.search(texto)) >= _MIN_CONCEPTOS[tipo]
+    }
+
+
+def _texto_fragmento(paginas: list[tuple[int, str]]) -> Optional[str]:
+    total = sum(len(p) for _, p in paginas)
+    if total / len(paginas) < PDF_TEXT_MIN_CHARS_PER_PAGE:
+        return None
+    if _calidad("".join(p for _, p in paginas)) < PDF_TEXT_MIN_QUALITY:
+        return None
+    texto = "\n\n".join(f"--- Página {i + 1} ---\n{p}" for i, p in paginas)
+    return texto if len(texto) <= PDF_TEXT_MAX_CHARS else None
+
+
+def _plan_extraction(path: str) -> tuple[Optional[list[Fragmento]], str]:
+    """
+    Devuelve (fragmentos, motivo): los fragmentos a extraer o None y el motivo
+    por el que hay que subir el archivo completo.
+    """
+    reader = PdfReader(path)
+    if reader.is_encrypted:
+        return None, "cifrado"
+    n = len(reader.pages)
+    if n == 0:
+        return None, "sin páginas"
+    if n > PDF_TEXT_MAX_PAGES:
+        return None, f"{n} páginas"
+
+    relevantes = []
+    for i, pagina in enumerate(reader.pages):
+        texto = _limpiar(pagina.extract_text() or "")
+        tipos = _tipos_pagina(texto)
+        if tipos:
+            relevantes.append((i, texto, tipos))
+    if not relevantes:
+        return None, "sin páginas de estados financieros"
+
+    fragmentos = []
+    for inicio in range(0, len(relevantes), PDF_CHUNK_PAGES):
+        grupo = relevantes[inicio:inicio + PDF_CHUNK_PAGES]
+        fragmentos.append(Fragmento(
+            paginas=[i for i, _, _ in grupo],
+            tipos=set().union(*(tipos for _, _, tipos in grupo)),
+            texto=_texto_fragmento([(i, texto) for i, texto, _ in grupo]),
+        ))
+    con_texto = sum(1 for f in fragmentos if f.texto is not None)
+    return fragmentos, f"{len(relevantes)}/{n} páginas, {len(fragmentos)} fragmentos, {con_texto} con texto"
+
+
+async def plan_extraction(path: str) -> Optional[list[Fragmento]]:
+    """
+    Fragmentos de páginas relevantes del PDF en `path`; None si hay que subir el
+    archivo completo. Nunca lanza: un PDF que no se puede leer localmente se
+    sube igual que antes.
+    """
+    if not PDF_TEXT_ENABLED:
+        return None
+    try:
+        fragmentos, motivo = await run_blocking(_plan_extraction, path)
+    except Exception as e:
+        # Un 503 del pool de bloqueantes tampoco impide el camino de subida
+        print(f"[PDF_TEXT] No se pudo leer el texto de {path}: {e}")
+        return None
+    if fragmentos is None:
+        print(f"[PDF_TEXT] Se sube el archivo completo ({motivo})")
+    else:
+        print(f"[PDF_TEXT] Extracción por páginas ({motivo})")
+    return fragmentos
+
+
+def _write_pages(path: str, paginas: list[int]) -> str:
+    reader = PdfReader(path)
+    writer = PdfWriter()
+    for i in paginas:
+        writer.add_page(reader.pages[i])
+    fd, destino = tempfile.mkstemp(suffix=".pdf")
+    with os.fdopen(fd, "wb") as f:
+        writer.write(f)
+    return destino
+
+
+async def write_pages(path: str, paginas: list[int]) -> str:
+    """
+    Escribe en un temporal un PDF con sólo `paginas` de `path` y devuelve su ruta;
+    quien llama lo borra.
+    """
+    return await run_blocking(_write_pages, path, paginas)
@@ -0,0 +1,197 @@
+"""
+Pre-clasificación local de /analyze_pdf antes de preguntar a Gemini.
+
+Dos caminos rápidos, en orden:
+  1. Índice de documentos conocidos (SQLite compartido entre workers): SHA-256
+     del PDF → tipo de documento que el modelo reconoció en una petición previa.
+     Un PDF ya visto se responde sin leerlo, para cualquier tipo conocido. Las
+     clasificaciones locales no se guardan: un error de las huellas no se
+     perpetúa en el índice.
+  2. Huellas de texto y layout (utils.doc_fingerprints) sobre las primeras
+     `PRESCREEN_MAX_PAGES` páginas: si un tipo supera `PRESCREEN_MIN_CONFIDENCE`
+     y ningún otro pasa de `PRESCREEN_MAX_RIVAL`, se responde localmente.
+Si el `tipo_doc` pedido no es uno de los tipos conocidos, el PDF no tiene capa de
+texto (escaneo) o la clasificación no es concluyente, se devuelve None y se
+llama al modelo como antes.
+"""
+
+import os
+import time
+import tempfile
+from dataclasses import dataclass
+from typing import Optional
+from pypdf import PdfReader
+
+from services import metrics_service, sqlite_service
+from services.executor_service import run_blocking
+from utils import doc_fingerprints
+
+PRESCREEN_ENABLED = os.getenv("PRESCREEN_ENABLED", "true").lower() == "true"
+PRESCREEN_MIN_CONFIDENCE = float(os.getenv("PRESCREEN_MIN_CONFIDENCE", "0.7"))
+PRESCREEN_MAX_RIVAL = float(os.getenv("PRESCREEN_MAX_RIVAL", "0.3"))
+PRESCREEN_MAX_PAGES = int(os.getenv("PRESCREEN_MAX_PAGES", "5"))
+# Menos caracteres que esto en las páginas leídas se considera escaneo
+PRESCREEN_MIN_CHARS = int(os.getenv("PRESCREEN_MIN_CHARS", "100"))
+PRESCREEN_INDEX_TTL = int(os.getenv("PRESCREEN_INDEX_TTL", str(30 * 24 * 3600)))
+PRESCREEN_INDEX_PATH = os.getenv(
+    "PRESCREEN_INDEX_PATH",
+    os.path.join(tempfile.gettempdir(), "documentai_prescreen_index.sqlite3"),
+)
+
+RUTA_INDICE = "indice"
+RUTA_LOCAL = "local"
+RUTA_LLM = "llm"
+
+_SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS prescreen_index ("
+    " sha256 TEXT PRIMARY KEY,"
+    " tipo TEXT NOT NULL,"
+    " created_at REAL NOT NULL)",
+]
+
+_contadores = {RUTA_INDICE: 0, RUTA_LOCAL: 0, RUTA_LLM: 0, "sin_texto": 0, "no_concluyente": 0,
+               "tipo_desconocido": 0, "errores": 0}
+
+
+@dataclass
+class Veredicto:
+    es_valido: bool
+    detectado: str  # Mismo formato que la respuesta del modelo: "True" o "El documento corresponde a ..."
+    ruta: str
+    confianza: Optional[float] = None
+
+
+def _connect():
+    return sqlite_service.connect(PRESCREEN_INDEX_PATH, _SCHEMA)
+
+
+def _lookup(sha256: str) -> Optional[str]:
+    conn = _connect()
+    try:
+        row = conn.execute(
+            "SELECT tipo FROM prescreen_index WHERE sha256 = ? AND created_at >= ?",
+            (sha256, time.time() - PRESCREEN_INDEX_TTL),
+        ).fetchone()
+        return row[0] if row else None
+    finally:
+        conn.close()
+
+
+def _store(sha256: str, tipo: str) -> None:
+    conn = _connect()
+    try:
+        conn.execute(
+            "INSERT INTO prescreen_index (sha256, tipo, created_at) VALUES (?, ?, ?)"
+            " ON CONFLICT(sha256) DO UPDATE SET tipo = excluded.tipo, created_at = excluded.created_at",
+            (sha256, tipo, time.time()),
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def read_text(source) -> tuple[str, int]:
+    """
+    Texto normalizado de las primeras PRESCREEN_MAX_PAGES páginas de `source`
+    (ruta u objeto tipo archivo) y el número total de páginas. Un objeto tipo
+    archivo se deja en la posición 0 para subirlo después.
+    """
+    try:
+        reader = PdfReader(source)
+        if reader.is_encrypted:
+            return "", len(reader.pages)
+        partes = [pagina.extract_text() or "" for pagina in reader.pages[:PRESCREEN_MAX_PAGES]]
+        return doc_fingerprints.normalizar(" ".join(partes)), len(reader.pages)
+    finally:
+        if hasattr(source, "seek"):
+            source.seek(0)
+
+
+def _veredicto(tipo_pedido: str, tipo_documento: str, ruta: str, confianza: Optional[float]) -> Veredicto:
+    if tipo_documento == tipo_pedido:
+        return Veredicto(True, "True", ruta, confianza)
+    return Veredicto(
+        False, f"El documento corresponde a {doc_fingerprints.nombre(tipo_documento)}", ruta, confianza
+    )
+
+
+def classify_text(tipo_doc: str, texto: str, paginas: int) -> tuple[Optional[Veredicto], str]:
+    """
+    Clasificación por huellas de un texto ya leído (sin índice). Devuelve
+    (veredicto, motivo); el veredicto es None si no es concluyente.
+    """
+    pedido = doc_fingerprints.tipo_por_nombre(tipo_doc)
+    if pedido is None:
+        return None, "tipo_desconocido"
+    if len(texto) < PRESCREEN_MIN_CHARS:
+        return None, "sin_texto"
+    puntajes = doc_fingerprints.puntuar(texto, paginas)
+    resultado = doc_fingerprints.clasificar(puntajes, PRESCREEN_MIN_CONFIDENCE, PRESCREEN_MAX_RIVAL)
+    if resultado is None:
+        return None, "no_concluyente"
+    return _veredicto(pedido, resultado.tipo, RUTA_LOCAL, resultado.confianza), resultado.tipo
+
+
+async def classify(tipo_doc: str, source, sha256: str) -> Optional[Veredicto]:
+    """
+    Veredicto local para "¿`source` es un `tipo_doc`?" o None si hay que preguntar
+    al modelo. Nunca lanza: ante cualquier error se usa el modelo.
+    """
+    if not PRESCREEN_ENABLED:
+        return None
+    pedido = doc_fingerprints.tipo_por_nombre(tipo_doc)
+    if pedido is None:
+        _contadores["tipo_desconocido"] += 1
+        return None
+
+    try:
+        conocido = await run_blocking(_lookup, sha256)
+        metrics_service.cache("prescreen_indice", conocido is not None)
+        if conocido is not None:
+            _contadores[RUTA_INDICE] += 1
+            return _veredicto(pedido, conocido, RUTA_INDICE, None)
+
+        texto, paginas = await run_blocking(read_text, source)
+    except Exception as e:
+        _contadores["errores"] += 1
+        print(f"[PRESCREEN] Error en la clasificación local: {e}")
+        return None
+
+    veredicto, motivo = classify_text(tipo_doc, texto, paginas)
+    if veredicto is None:
+        _contadores[motivo] += 1
+        return None
+
+    # Con veredicto, `motivo` es el tipo reconocido
+    _contadores[RUTA_LOCAL] += 1
+    print(f"[PRESCREEN] {motivo} reconocido localmente (confianza {veredicto.confianza:.2f})")
+    return veredicto
+
+
+async def record_verdict(tipo_doc: str, sha256: str, respuesta: str) -> None:
+    """
+    Guarda en el índice el tipo que el modelo reconoció en el PDF: `tipo_doc` si
+    respondió "True", o el tipo conocido que mencione en su respuesta.
+    """
+    _contadores[RUTA_LLM] += 1
+    if not PRESCREEN_ENABLED:
+        return
+    if respuesta.strip() == "True":
+        tipo = doc_fingerprints.tipo_por_nombre(tipo_doc)
+    else:
+        tipo = doc_fingerprints.tipo_en_respuesta(respuesta)
+    if tipo is None:
+        return
+    try:
+        await run_blocking(_store, sha256, tipo)
+    except Exception as e:
+        _contadores["errores"] += 1
+        print(f"[PRESCREEN] Error guardando {sha256[:12]} en el índice: {e}")
+
+
+def stats() -> dict:
+    """
+    Peticiones de este worker por camino (índice, huellas locales o modelo) y
+    motivos por los que no se respondió localmente.
+    """
+    return {"habilitado": PRESCREEN_ENABLED, **_contadores}
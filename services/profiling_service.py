@@ -0,0 +1,192 @@
+"""
+Perfilado bajo demanda de peticiones individuales, sin redesplegar.
+
+Un muestreador en un hilo aparte toma cada `PROFILE_INTERVAL_MS` la pila de
+todos los hilos del worker (`sys._current_frames`) mientras dura la petición y
+escribe el resultado en formato "folded" (una línea `raíz;...;hoja conteo` por
+pila), que aceptan flamegraph.pl, speedscope e inferno:
+
+    flamegraph.pl /tmp/documentai_profiles/<archivo>.folded > perfil.svg
+
+La raíz de cada pila es el hilo: `loop` para el event loop y `hilo:<nombre>`
+para el resto (dependencias síncronas como la verificación del JWT y tareas de
+run_blocking). Si el loop está en `select`/`epoll` es tiempo esperando I/O
+(p. ej. la respuesta de Gemini), no CPU. Los hilos de los pools que esperan
+trabajo se omiten.
+
+El muestreo ve todo el worker: con otras peticiones en curso, sus pilas también
+aparecen. Como máximo se perfila una petición a la vez por worker, y en total
+`PROFILE_MAX_REQUESTS` archivos en `PROFILE_DIR` (compartido entre workers;
+borrar los archivos libera el cupo).
+"""
+
+import os
+import sys
+import time
+import secrets
+import tempfile
+import threading
+from collections import Counter
+from typing import Optional
+
+from services.executor_service import run_blocking
+
+# Secreto de administración de la cabecera X-Profile; vacío = perfilado deshabilitado
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN", "")
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(tempfile.gettempdir(), "documentai_profiles"))
+PROFILE_MAX_REQUESTS = int(os.getenv("PROFILE_MAX_REQUESTS", "20"))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+
+EXTENSION = ".folded"
+
+_en_curso = threading.Lock()
+_contadores = {"perfiles": 0, "omitidos_ocupado": 0, "omitidos_limite": 0, "errores": 0}
+
+
+def _etiqueta(frame) -> str:
+    code = frame.f_code
+    ruta = code.co_filename
+    # Rutas del proyecto relativas; dependencias sólo con el nombre del archivo
+    if ruta.startswith(os.getcwd() + os.sep):
+        ruta = os.path.relpath(ruta)
+    else:
+        ruta = os.path.basename(ruta)
+    return f"{code.co_name} ({ruta}:{code.co_firstlineno})".replace(";", ":")
+
+
+# (archivo, función) donde quedan los hilos de los pools esperando trabajo
+_ESPERAS = (
+    (os.path.join("concurrent", "futures", "thread.py"), "_worker"),
+    ("threading.py", "wait"),
+    ("queue.py", "get"),
+)
+
+
+def _inactivo(frame) -> bool:
+    code = frame.f_code
+    return any(code.co_filename.endswith(archivo) and code.co_name == funcion for archivo, funcion in _ESPERAS)
+
+
+class Muestreador(threading.Thread):
+    """
+    Acumula pilas "folded" de todos los hilos hasta que se llama a `detener()`.
+    """
+
+    def __init__(self, loop_ident: int, intervalo_ms: float = PROFILE_INTERVAL_MS):
+        super().__init__(name="profile-sampler", daemon=True)
+        self.loop_ident = loop_ident
+        self.intervalo = intervalo_ms / 1000
+        self.pilas: Counter[str] = Counter()
+        self.muestras = 0
+        self._alto = threading.Event()
+
+    def _pila(self, frame, raiz: str) -> str:
+        partes = []
+        while frame is not None:
+            partes.append(_etiqueta(frame))
+            frame = frame.f_back
+        partes.append(raiz)
+        return ";".join(reversed(partes))
+
+    def run(self) -> None:
+        propio = threading.get_ident()
+        while not self._alto.wait(self.intervalo):
+            nombres = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == propio:
+                    continue
+                if ident == self.loop_ident:
+                    raiz = "loop"
+                elif _inactivo(frame):
+                    continue
+                else:
+                    raiz = f"hilo:{nombres.get(ident, ident)}"
+                self.pilas[self._pila(frame, raiz)] += 1
+            self.muestras += 1
+
+    def detener(self) -> None:
+        self._alto.set()
+        self.join()
+
+
+def _perfiles_guardados() -> int:
+    if not os.path.isdir(PROFILE_DIR):
+        return 0
+    return sum(1 for nombre in os.listdir(PROFILE_DIR) if nombre.endswith(EXTENSION))
+
+
+def authorized(valor: Optional[bytes]) -> bool:
+    """
+    Indica si la cabecera X-Profile (bytes crudos) trae el secreto de
+    administración. Se compara en bytes: compare_digest no acepta str con
+    caracteres no ASCII, y cualquier valor inválido cuenta como no autorizado.
+    """
+    if not PROFILE_TOKEN or valor is None:
+        return False
+    try:
+        return secrets.compare_digest(valor, PROFILE_TOKEN.encode())
+    except (TypeError, UnicodeError):
+        return False
+
+
+def start(loop_ident: int, method: str, path: str) -> tuple[Optional[Muestreador], str]:
+    """
+    Arranca el muestreo de una petición. Devuelve (muestreador, nombre del
+    archivo) o (None, motivo) si ya hay otra en curso en este worker o se
+    alcanzó PROFILE_MAX_REQUESTS.
+    """
+    if not _en_curso.acquire(blocking=False):
+        _contadores["omitidos_ocupado"] += 1
+        return None, "ocupado"
+    # Sólo peticiones de administración: listar un directorio chico no pesa en el loop
+    if _perfiles_guardados() >= PROFILE_MAX_REQUESTS:
+        _contadores["omitidos_limite"] += 1
+        _en_curso.release()
+        return None, "limite"
+
+    ahora = time.time()
+    ruta = "".join(c if c.isalnum() else "_" for c in path.strip("/")) or "raiz"
+    nombre = (
+        f"{time.strftime('%Y%m%d-%H%M%S', time.localtime(ahora))}-{int(ahora * 1000) % 1000:03d}"
+        f"_{os.getpid()}_{method}_{ruta[:60]}{EXTENSION}"
+    )
+    muestreador = Muestreador(loop_ident)
+    muestreador.start()
+    return muestreador, nombre
+
+
+def _write(nombre: str, pilas: Counter) -> None:
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    destino = os.path.join(PROFILE_DIR, nombre)
+    temporal = destino + ".tmp"
+    with open(temporal, "w", encoding="utf-8") as f:
+        for pila, conteo in pilas.most_common():
+            f.write(f"{pila} {conteo}\n")
+    os.replace(temporal, destino)
+
+
+async def finish(muestreador: Muestreador, nombre: str, segundos: float) -> None:
+    """
+    Detiene el muestreo y escribe el perfil en PROFILE_DIR. Nunca lanza: un
+    error al escribir no afecta a la petición ya respondida.
+    """
+    try:
+        muestreador.detener()
+        await run_blocking(_write, nombre, muestreador.pilas)
+        _contadores["perfiles"] += 1
+        print(
+            f"[PROFILE] {nombre}: {segundos * 1000:.0f} ms, {muestreador.muestras} muestras "
+            f"cada {PROFILE_INTERVAL_MS:g} ms"
+        )
+    except Exception as e:
+        _contadores["errores"] += 1
+        print(f"[PROFILE] Error escribiendo {nombre}: {e}")
+    finally:
+        _en_curso.release()
+
+
+def stats() -> dict:
+    """
+    Perfiles escritos y omitidos por este worker.
+    """
+    return {"habilitado": bool(PROFILE_TOKEN), "directorio": PROFILE_DIR, **_contadores}
@@ -0,0 +1,303 @@
+"""
+Cuota de Gemini compartida entre workers (token bucket por modelo en SQLite).
+
+Cada worker de uvicorn llama a Gemini por su cuenta; sin coordinación, una ráfaga
+excede los límites de la cuenta y los 429 se propagan por los fallbacks de
+GEMINI_MODELS. Antes de cada llamada se reserva, por modelo:
+  - 1 petición del bucket RPM (capacidad `rpm`, se rellena rpm / 60 por segundo)
+  - los tokens estimados del bucket TPM (texto ≈ 4 caracteres por token, cada
+    archivo adjunto `GEMINI_QUOTA_FILE_TOKENS`, más `GEMINI_QUOTA_OUTPUT_TOKENS`)
+
+La reserva se descuenta de inmediato aunque el bucket quede en negativo; quien la
+hizo espera a que se rellene lo que le toca. Así las esperas respetan el orden
+de llegada entre workers sin sondear la base. Si la espera necesaria supera
+`GEMINI_QUOTA_MAX_WAIT` no se reserva nada y se lanza QuotaExhausted (503): los
+fallbacks pasan al siguiente modelo, que tiene su propio bucket.
+
+Al terminar la llamada se corrige el bucket TPM con `usage_metadata` real. Si
+Gemini responde 429 de todos modos (cuota consumida por otro cliente), los
+buckets del modelo quedan en deuda por `GEMINI_QUOTA_PENALTY` segundos.
+
+Los límites son por host: con varios hosts, repartir la cuota de la cuenta en
+`GEMINI_QUOTA_LIMITS`.
+"""
+
+import os
+import time
+import asyncio
+import tempfile
+from dataclasses import dataclass
+from typing import Any, Optional
+from fastapi import HTTPException, status
+
+from services import sqlite_service
+from services.executor_service import run_blocking
+
+GEMINI_QUOTA_ENABLED = os.getenv("GEMINI_QUOTA_ENABLED", "true").lower() == "true"
+# Límites por modelo: "modelo=rpm:tpm,..." (0 = sin límite)
+GEMINI_QUOTA_LIMITS = os.getenv(
+    "GEMINI_QUOTA_LIMITS",
+    "gemini-2.5-flash-lite=4000:4000000,gemini-2.5-flash=1000:1000000,gemini-2.5-pro=150:2000000",
+)
+# Límites para modelos que no aparecen en GEMINI_QUOTA_LIMITS
+GEMINI_QUOTA_DEFAULT_RPM = int(os.getenv("GEMINI_QUOTA_DEFAULT_RPM", "0"))
+GEMINI_QUOTA_DEFAULT_TPM = int(os.getenv("GEMINI_QUOTA_DEFAULT_TPM", "0"))
+GEMINI_QUOTA_MAX_WAIT = float(os.getenv("GEMINI_QUOTA_MAX_WAIT", "5"))
+GEMINI_QUOTA_FILE_TOKENS = int(os.getenv("GEMINI_QUOTA_FILE_TOKENS", "3000"))
+GEMINI_QUOTA_OUTPUT_TOKENS = int(os.getenv("GEMINI_QUOTA_OUTPUT_TOKENS", "1000"))
+GEMINI_QUOTA_PENALTY = float(os.getenv("GEMINI_QUOTA_PENALTY", "10"))
+GEMINI_QUOTA_PATH = os.getenv(
+    "GEMINI_QUOTA_PATH",
+    os.path.join(tempfile.gettempdir(), "documentai_gemini_quota.sqlite3"),
+)
+
+RPM = "rpm"
+TPM = "tpm"
+
+_SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS quota_buckets ("
+    " model TEXT NOT NULL,"
+    " kind TEXT NOT NULL,"
+    " tokens REAL NOT NULL,"
+    " updated_at REAL NOT NULL,"
+    " PRIMARY KEY (model, kind))",
+]
+
+
+def _parse_limits(raw: str) -> dict[str, tuple[int, int]]:
+    limites = {}
+    for parte in raw.split(","):
+        if "=" not in parte:
+            continue
+        model, valores = parte.rsplit("=", 1)
+        try:
+            rpm, tpm = (int(v) for v in valores.split(":"))
+        except ValueError:
+            print(f"[QUOTA] Límite inválido para '{model.strip()}': {valores}")
+            continue
+        limites[model.strip()] = (rpm, tpm)
+    return limites
+
+
+_LIMITES = _parse_limits(GEMINI_QUOTA_LIMITS)
+
+_contadores = {
+    "reservas": 0,
+    "esperas": 0,
+    "espera_total_ms": 0.0,
+    "rechazadas": 0,
+    "penalizaciones": 0,
+    "errores": 0,
+}
+
+
+class QuotaExhausted(HTTPException):
+    """
+    La cuota del modelo no alcanza dentro de GEMINI_QUOTA_MAX_WAIT.
+    """
+
+    def __init__(self, model: str, espera: float):
+        super().__init__(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=f"Cuota de {model} agotada, intenta de nuevo en unos segundos.",
+            headers={"Retry-After": str(max(1, round(espera)))},
+        )
+        self.model = model
+
+
+@dataclass
+class Reserva:
+    model: str
+    tokens: int
+
+
+def _limits(model: str) -> tuple[int, int]:
+    return _LIMITES.get(model, (GEMINI_QUOTA_DEFAULT_RPM, GEMINI_QUOTA_DEFAULT_TPM))
+
+
+def estimate_tokens(contents: Any) -> int:
+    """
+    Tokens estimados de una llamada: el texto de las partes a ~4 caracteres por
+    token, cada archivo adjunto GEMINI_QUOTA_FILE_TOKENS, más la salida esperada.
+    """
+    partes = contents if isinstance(contents, (list, tuple)) else [contents]
+    total = GEMINI_QUOTA_OUTPUT_TOKENS
+    for parte in partes:
+        total += len(parte) // 4 if isinstance(parte, str) else GEMINI_QUOTA_FILE_TOKENS
+    return total
+
+
+def _connect():
+    return sqlite_service.connect(GEMINI_QUOTA_PATH, _SCHEMA)
+
+
+def _disponible(conn, model: str, kind: str, capacidad: int, ahora: float) -> float:
+    row = conn.execute(
+        "SELECT tokens, updated_at FROM quota_buckets WHERE model = ? AND kind = ?",
+        (model, kind),
+    ).fetchone()
+    if row is None:
+        return float(capacidad)
+    tokens, updated_at = row
+    return min(capacidad, tokens + max(0.0, ahora - updated_at) * capacidad / 60)
+
+
+def _guardar(conn, model: str, kind: str, tokens: float, ahora: float) -> None:
+    conn.execute(
+        "INSERT INTO quota_buckets (model, kind, tokens, updated_at) VALUES (?, ?, ?, ?)"
+        " ON CONFLICT(model, kind) DO UPDATE SET tokens = excluded.tokens,"
+        " updated_at = excluded.updated_at",
+        (model, kind, tokens, ahora),
+    )
+
+
+def _reserve(model: str, tokens: int) -> tuple[bool, float]:
+    """
+    Reserva 1 petición y `tokens` del modelo. Devuelve (reservado, segundos de
+    espera hasta que la reserva quede cubierta por el relleno).
+    """
+    rpm, tpm = _limits(model)
+    conn = _connect()
+    try:
+        ahora = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        espera = 0.0
+        saldos = {}
+        # Una petición mayor que la capacidad TPM sólo espera a tener el bucket lleno
+        for kind, capacidad, necesario in ((RPM, rpm, 1), (TPM, tpm, min(tokens, tpm))):
+            if capacidad <= 0:
+                continue
+            disponible = _disponible(conn, model, kind, capacidad, ahora)
+            saldos[kind] = disponible - necesario
+            espera = max(espera, (necesario - disponible) * 60 / capacidad)
+        if espera > GEMINI_QUOTA_MAX_WAIT:
+            conn.rollback()
+            return False, espera
+        for kind, saldo in saldos.items():
+            _guardar(conn, model, kind, saldo, ahora)
+        conn.commit()
+        return True, espera
+    finally:
+        conn.close()
+
+
+def _adjust(model: str, delta: float) -> None:
+    # delta > 0: la llamada consumió más tokens de los reservados
+    _, tpm = _limits(model)
+    if tpm <= 0:
+        return
+    conn = _connect()
+    try:
+        ahora = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        _guardar(conn, model, TPM, _disponible(conn, model, TPM, tpm, ahora) - delta, ahora)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def _penalize(model: str) -> None:
+    # Deuda equivalente a GEMINI_QUOTA_PENALTY segundos de relleno
+    conn = _connect()
+    try:
+        ahora = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        for kind, capacidad in zip((RPM, TPM), _limits(model)):
+            if capacidad > 0:
+                saldo = min(_disponible(conn, model, kind, capacidad, ahora), 0.0)
+                _guardar(conn, model, kind, saldo - capacidad * GEMINI_QUOTA_PENALTY / 60, ahora)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+async def acquire(model: str, contents: Any) -> Optional[Reserva]:
+    """
+    Reserva cuota para una llamada a `model` con `contents` y espera lo necesario.
+    Lanza QuotaExhausted si la espera superaría GEMINI_QUOTA_MAX_WAIT. Si la base
+    de cuotas falla la llamada sigue sin medirse.
+    """
+    if not GEMINI_QUOTA_ENABLED or _limits(model) == (0, 0):
+        return None
+    tokens = estimate_tokens(contents)
+    try:
+        reservado, espera = await run_blocking(_reserve, model, tokens)
+    except HTTPException:
+        raise
+    except Exception as e:
+        _contadores["errores"] += 1
+        print(f"[QUOTA] Error reservando cuota de {model}: {e}")
+        return None
+    if not reservado:
+        _contadores["rechazadas"] += 1
+        print(f"[QUOTA] Cuota de {model} agotada (espera necesaria {espera:.1f}s)")
+        raise QuotaExhausted(model, espera)
+    _contadores["reservas"] += 1
+    if espera > 0:
+        _contadores["esperas"] += 1
+        _contadores["espera_total_ms"] += espera * 1000
+        await asyncio.sleep(espera)
+    return Reserva(model, tokens)
+
+
+async def settle(reserva: Optional[Reserva], usage_metadata: Any) -> None:
+    """
+    Corrige el bucket TPM con los tokens reales de la respuesta.
+    """
+    total = getattr(usage_metadata, "total_token_count", None)
+    if reserva is None or not total or total == reserva.tokens:
+        return
+    try:
+        await run_blocking(_adjust, reserva.model, total - reserva.tokens)
+    except Exception as e:
+        _contadores["errores"] += 1
+        print(f"[QUOTA] Error ajustando cuota de {reserva.model}: {e}")
+
+
+async def penalize(model: str) -> None:
+    """
+    Gemini respondió 429 aunque había cuota local: frena al modelo en todos los workers.
+    """
+    if not GEMINI_QUOTA_ENABLED or _limits(model) == (0, 0):
+        return
+    _contadores["penalizaciones"] += 1
+    try:
+        await run_blocking(_penalize, model)
+    except Exception as e:
+        _contadores["errores"] += 1
+        print(f"[QUOTA] Error penalizando {model}: {e}")
+
+
+def _buckets() -> dict:
+    conn = _connect()
+    try:
+        rows = conn.execute("SELECT model, kind, tokens, updated_at FROM quota_buckets").fetchall()
+    finally:
+        conn.close()
+    ahora = time.time()
+    salida: dict[str, dict] = {}
+    for model, kind, tokens, updated_at in rows:
+        capacidad = _limits(model)[0 if kind == RPM else 1]
+        if capacidad <= 0:
+            continue
+        disponible = min(capacidad, tokens + max(0.0, ahora - updated_at) * capacidad / 60)
+        salida.setdefault(model, {})[kind] = {"limite": capacidad, "disponible": round(disponible, 1)}
+    return salida
+
+
+async def stats() -> Optional[dict]:
+    """
+    Saldo de los buckets (compartidos entre workers) y contadores de este worker.
+    """
+    if not GEMINI_QUOTA_ENABLED:
+        return None
+    try:
+        buckets = await run_blocking(_buckets)
+    except Exception as e:
+        print(f"[QUOTA] Error leyendo buckets: {e}")
+        buckets = None
+    return {
+        **_contadores,
+        "espera_total_ms": round(_contadores["espera_total_ms"], 1),
+        "buckets": buckets,
+    }
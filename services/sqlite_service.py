@@ -0,0 +1,23 @@
+import sqlite3
+import threading
+
+# Rutas cuyo esquema ya se creó en este proceso
+_inicializadas: set[str] = set()
+_lock = threading.Lock()
+
+def connect(path: str, schema: list[str], timeout: float = 5) -> sqlite3.Connection:
+    """
+    Abre una conexión a la base SQLite en `path` (compartida entre workers) y,
+    la primera vez por proceso, activa WAL y ejecuta las sentencias de `schema`.
+    Las llamadas son bloqueantes: usar desde el pool de executor_service.
+    """
+    conn = sqlite3.connect(path, timeout=timeout)
+    if path not in _inicializadas:
+        with _lock:
+            if path not in _inicializadas:
+                conn.execute("PRAGMA journal_mode=WAL")
+                for statement in schema:
+                    conn.execute(statement)
+                conn.commit()
+                _inicializadas.add(path)
+    return conn
@@ -1,28 +1,117 @@
 import os
+import uuid
+import hashlib
+import mimetypes
+import tempfile
+from dataclasses import dataclass
+from typing import Optional
 from fastapi import UploadFile
 
+from services import metrics_service
+from services.executor_service import run_blocking
+
+# Tamaño de bloque al copiar el cuerpo de la petición
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(256 * 1024)))
+# Archivos hasta este tamaño se quedan en memoria; arriba pasan a disco
+UPLOAD_SPOOL_MAX_BYTES = int(os.getenv("UPLOAD_SPOOL_MAX_BYTES", str(5 * 1024 * 1024)))
+
+
+@dataclass
+class SpooledUpload:
+    file: tempfile.SpooledTemporaryFile
+    filename: str
+    mime_type: str
+    sha256: str
+    size: int
+
+    async def close(self) -> None:
+        await run_blocking(self.file.close)
+
+
+def _open_unique(destination_dir: str, filename: Optional[str]):
+    # Prefijo único: dos subidas con el mismo nombre no pueden pisarse
+    base = os.path.basename(filename or "") or "upload"
+    file_path = os.path.join(destination_dir, f"{uuid.uuid4().hex}_{base}")
+    return file_path, open(file_path, "xb")
+
+
+def _remove_file(path: str) -> None:
+    if os.path.exists(path):
+        os.remove(path)
+
+
 async def save_upload_file(
     upload: UploadFile,
     destination_dir: str
 ) -> str:
     """
-    Guarda un UploadFile en destination_dir y devuelve la ruta al archivo.
+    Guarda un UploadFile en destination_dir copiándolo por bloques y devuelve la ruta
+    al archivo. El nombre lleva un prefijo único para evitar colisiones.
     """
     if not destination_dir:
         raise ValueError("destination_dir no puede ser None al guardar un UploadFile")
 
-    file_path = os.path.join(destination_dir, upload.filename)
-    # Escritura síncrona, idéntica al monolito
-    with open(file_path, "wb") as out_buffer:
-        out_buffer.write(await upload.read())
+    with metrics_service.phase(metrics_service.GUARDADO_LOCAL):
+        file_path, out_buffer = await run_blocking(_open_unique, destination_dir, upload.filename)
+        try:
+            while chunk := await upload.read(UPLOAD_CHUNK_SIZE):
+                await run_blocking(out_buffer.write, chunk)
+        except BaseException:
+            await run_blocking(out_buffer.close)
+            await run_blocking(_remove_file, file_path)
+            raise
+        await run_blocking(out_buffer.close)
     return file_path
 
+
+async def spool_upload_file(
+    upload: UploadFile,
+    destination_dir: Optional[str] = None
+) -> SpooledUpload:
+    """
+    Copia un UploadFile por bloques a un SpooledTemporaryFile, calculando su SHA-256.
+    Hasta UPLOAD_SPOOL_MAX_BYTES el contenido se queda en memoria; si lo excede pasa a un
+    archivo temporal anónimo en destination_dir (sin colisiones de nombre).
+    El llamador debe cerrar el resultado con `close()`.
+    """
+    spool = tempfile.SpooledTemporaryFile(max_size=UPLOAD_SPOOL_MAX_BYTES, dir=destination_dir)
+    sha256 = hashlib.sha256()
+    size = 0
+    with metrics_service.phase(metrics_service.GUARDADO_LOCAL):
+        try:
+            while chunk := await upload.read(UPLOAD_CHUNK_SIZE):
+                sha256.update(chunk)
+                size += len(chunk)
+                if size > UPLOAD_SPOOL_MAX_BYTES:
+                    # Ya está (o va a pasar) a disco: no bloquear el loop
+                    await run_blocking(spool.write, chunk)
+                else:
+                    spool.write(chunk)
+            await run_blocking(spool.seek, 0)
+        except BaseException:
+            await run_blocking(spool.close)
+            raise
+
+    mime_type = (
+        upload.content_type
+        if upload.content_type and upload.content_type != "application/octet-stream"
+        else mimetypes.guess_type(upload.filename or "")[0]
+    ) or "application/pdf"
+
+    return SpooledUpload(
+        file=spool,
+        filename=upload.filename or "",
+        mime_type=mime_type,
+        sha256=sha256.hexdigest(),
+        size=size,
+    )
+
+
 async def delete_local_file(path: str) -> None:
     """
     Elimina un archivo local si existe.
     """
     try:
-        if os.path.exists(path):
-            os.remove(path)
+        await run_blocking(_remove_file, path)
     except Exception:
         pass
@@ -0,0 +1,177 @@
+"""
+Registro de archivos subidos a Gemini, indexado por SHA-256 del contenido.
+
+Evita subir el mismo PDF varias veces (p. ej. al verificarlo contra varios
+`tipo_doc` seguidos o al reintentar una extracción):
+  - `acquire(sha256, source, mime_type)` devuelve el handle remoto existente o
+    sube el archivo una sola vez, aunque lleguen peticiones concurrentes.
+  - Cada uso incrementa un contador de referencias; al salir del contexto se
+    decrementa, pero el archivo no se borra en ese momento.
+  - Una tarea en segundo plano (`run_gc`) borra de Gemini los archivos sin
+    referencias que llevan más de `GEMINI_UPLOAD_IDLE_TTL` sin usarse o que
+    superaron `GEMINI_UPLOAD_TTL` (menor a la expiración de 48 h de Gemini).
+
+El registro vive en memoria de cada worker de uvicorn.
+"""
+
+import os
+import time
+import asyncio
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Optional
+
+from services import gemini_service, metrics_service
+
+# Vida máxima de un handle; Gemini expira los archivos a las 48 h
+GEMINI_UPLOAD_TTL = int(os.getenv("GEMINI_UPLOAD_TTL", str(24 * 3600)))
+# Tiempo sin uso tras el cual un archivo sin referencias se borra
+GEMINI_UPLOAD_IDLE_TTL = int(os.getenv("GEMINI_UPLOAD_IDLE_TTL", "600"))
+GEMINI_UPLOAD_MAX_ENTRIES = int(os.getenv("GEMINI_UPLOAD_MAX_ENTRIES", "500"))
+GEMINI_UPLOAD_GC_INTERVAL = int(os.getenv("GEMINI_UPLOAD_GC_INTERVAL", "60"))
+
+
+@dataclass
+class _Entrada:
+    file: object
+    expires_at: float
+    last_used: float = field(default_factory=time.time)
+    refs: int = 0
+
+
+_registro: dict[str, _Entrada] = {}
+# Entradas reemplazadas o invalidadas que aún tienen referencias activas
+_retiradas: list[_Entrada] = []
+_upload_locks: dict[str, asyncio.Lock] = {}
+
+_contadores = {"reutilizados": 0, "subidos": 0, "borrados": 0, "errores_borrado": 0}
+
+
+def _vigente(entrada: _Entrada, ahora: float) -> bool:
+    return entrada.expires_at > ahora
+
+
+def _retirar(sha256: str) -> None:
+    entrada = _registro.pop(sha256, None)
+    if entrada is not None:
+        _retiradas.append(entrada)
+
+
+async def _obtener(sha256: str, source, mime_type: Optional[str]) -> _Entrada:
+    entrada = _registro.get(sha256)
+    if entrada is not None and _vigente(entrada, time.time()):
+        _contadores["reutilizados"] += 1
+        metrics_service.cache("subidas_gemini", True)
+        return entrada
+
+    lock = _upload_locks.setdefault(sha256, asyncio.Lock())
+    async with lock:
+        # Otra petición pudo haberlo subido mientras esperábamos
+        entrada = _registro.get(sha256)
+        if entrada is not None and _vigente(entrada, time.time()):
+            _contadores["reutilizados"] += 1
+            metrics_service.cache("subidas_gemini", True)
+            return entrada
+        if entrada is not None:
+            _retirar(sha256)
+
+        uploaded_file = await gemini_service.upload_file(source, mime_type=mime_type)
+        entrada = _Entrada(file=uploaded_file, expires_at=time.time() + GEMINI_UPLOAD_TTL)
+        _registro[sha256] = entrada
+        _contadores["subidos"] += 1
+        metrics_service.cache("subidas_gemini", False)
+        return entrada
+
+
+@asynccontextmanager
+async def acquire(sha256: str, source, mime_type: Optional[str] = None):
+    """
+    Context manager que entrega el archivo de Gemini para el contenido `sha256`,
+    subiendo `source` sólo si no hay un handle vigente.
+    """
+    entrada = await _obtener(sha256, source, mime_type)
+    entrada.refs += 1
+    try:
+        yield entrada.file
+    finally:
+        entrada.refs -= 1
+        entrada.last_used = time.time()
+
+
+def invalidate(sha256: str) -> None:
+    """
+    Descarta el handle de `sha256` (p. ej. si Gemini lo rechazó); el próximo
+    `acquire` vuelve a subir el archivo. El borrado remoto queda para el GC.
+    """
+    _retirar(sha256)
+
+
+async def _borrar(entrada: _Entrada) -> None:
+    try:
+        await gemini_service.delete_file(entrada.file)
+        _contadores["borrados"] += 1
+    except Exception as e:
+        _contadores["errores_borrado"] += 1
+        print(f"[UPLOAD_REGISTRY] Error borrando archivo Gemini: {e}")
+
+
+async def collect(force: bool = False) -> int:
+    """
+    Borra de Gemini los archivos sin referencias que expiraron, quedaron inactivos
+    o exceden GEMINI_UPLOAD_MAX_ENTRIES. Con force=True borra todos los que no
+    estén en uso. Devuelve cuántos archivos se borraron.
+    """
+    ahora = time.time()
+    a_borrar: list[_Entrada] = []
+
+    for sha256, entrada in list(_registro.items()):
+        if entrada.refs > 0:
+            continue
+        inactiva = ahora - entrada.last_used > GEMINI_UPLOAD_IDLE_TTL
+        if force or inactiva or not _vigente(entrada, ahora):
+            a_borrar.append(_registro.pop(sha256))
+            _upload_locks.pop(sha256, None)
+
+    # Si aún hay demasiadas, sacar las menos usadas recientemente
+    excedente = len(_registro) - GEMINI_UPLOAD_MAX_ENTRIES
+    if excedente > 0:
+        libres = sorted(
+            ((sha256, e) for sha256, e in _registro.items() if e.refs == 0),
+            key=lambda item: item[1].last_used,
+        )
+        for sha256, _ in libres[:excedente]:
+            a_borrar.append(_registro.pop(sha256))
+            _upload_locks.pop(sha256, None)
+
+    for entrada in list(_retiradas):
+        if entrada.refs == 0:
+            _retiradas.remove(entrada)
+            a_borrar.append(entrada)
+
+    for entrada in a_borrar:
+        await _borrar(entrada)
+    return len(a_borrar)
+
+
+async def run_gc() -> None:
+    """
+    Bucle de recolección en segundo plano; se arranca desde el lifespan de la app.
+    """
+    while True:
+        await asyncio.sleep(GEMINI_UPLOAD_GC_INTERVAL)
+        try:
+            await collect()
+        except Exception as e:
+            print(f"[UPLOAD_REGISTRY] Error en GC: {e}")
+
+
+def stats() -> dict:
+    """
+    Tamaño del registro y contadores de reutilización de este worker.
+    """
+    return {
+        "entradas": len(_registro),
+        "en_uso": sum(1 for e in _registro.values() if e.refs > 0),
+        "retiradas": len(_retiradas),
+        **_contadores,
+    }
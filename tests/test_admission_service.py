@@ -0,0 +1,116 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from services import admission_service as adm
+
+
+@pytest.fixture(autouse=True)
+def admision(monkeypatch):
+    monkeypatch.setattr(adm, "ADMISSION_ENABLED", True)
+    monkeypatch.setattr(adm, "ADMISSION_MAX_CONCURRENCY", 1)
+    monkeypatch.setattr(adm, "ADMISSION_TENANT_CONCURRENCY", 8)
+    monkeypatch.setattr(adm, "ADMISSION_TENANT_RATE", 0.0)
+    monkeypatch.setattr(adm, "ADMISSION_TENANT_BURST", 100.0)
+    monkeypatch.setattr(adm, "ADMISSION_TENANT_MAX_QUEUE", 50)
+    monkeypatch.setattr(adm, "ADMISSION_MAX_WAIT", 5.0)
+    monkeypatch.setattr(adm, "ADMISSION_TENANT_WEIGHTS", {})
+    monkeypatch.setattr(adm, "_tenants", {})
+    monkeypatch.setattr(adm, "_running", 0)
+    monkeypatch.setattr(adm, "_virtual_time", 0.0)
+
+
+def test_rechazo_por_tasa_no_avanza_la_etiqueta(monkeypatch):
+    monkeypatch.setattr(adm, "ADMISSION_TENANT_BURST", 1.0)
+
+    async def caso():
+        adm.release(await adm.acquire("a", cost=3))
+        with pytest.raises(HTTPException) as e:
+            await adm.acquire("a", cost=3)
+        return e.value.status_code
+
+    assert asyncio.run(caso()) == 429
+    assert adm._tenants["a"].last_finish == 3.0
+
+
+def test_rechazo_por_cola_llena_no_avanza_la_etiqueta(monkeypatch):
+    monkeypatch.setattr(adm, "ADMISSION_TENANT_MAX_QUEUE", 0)
+
+    async def caso():
+        ticket = await adm.acquire("a", cost=2)
+        with pytest.raises(HTTPException) as e:
+            await adm.acquire("a", cost=2)
+        adm.release(ticket)
+        return e.value.status_code
+
+    assert asyncio.run(caso()) == 429
+    assert adm._tenants["a"].last_finish == 2.0
+
+
+def test_espera_vencida_devuelve_su_avance(monkeypatch):
+    monkeypatch.setattr(adm, "ADMISSION_MAX_WAIT", 0.05)
+
+    async def caso():
+        ocupado = await adm.acquire("b")
+        # La primera espera de "a" vence; la segunda sigue en cola detrás
+        primera = asyncio.create_task(adm.acquire("a", cost=2))
+        await asyncio.sleep(0)
+        monkeypatch.setattr(adm, "ADMISSION_MAX_WAIT", 5.0)
+        segunda = asyncio.create_task(adm.acquire("a", cost=2))
+        await asyncio.sleep(0)
+        t = adm._tenants["a"]
+        antes = (t.last_finish, t.cola[1].start, t.cola[1].finish)
+        with pytest.raises(HTTPException) as e:
+            await primera
+        despues = (t.last_finish, t.cola[0].start, t.cola[0].finish)
+        adm.release(ocupado)
+        adm.release(await segunda)
+        return e.value.status_code, antes, despues
+
+    codigo, antes, despues = asyncio.run(caso())
+    assert codigo == 503
+    assert antes == (4.0, 2.0, 4.0)
+    assert despues == (2.0, 0.0, 2.0)
+
+
+def test_espera_cancelada_devuelve_su_avance():
+    async def caso():
+        ocupado = await adm.acquire("b")
+        espera = asyncio.create_task(adm.acquire("a", cost=3))
+        await asyncio.sleep(0)
+        antes = adm._tenants["a"].last_finish
+        espera.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await espera
+        adm.release(ocupado)
+        return antes
+
+    assert asyncio.run(caso()) == 3.0
+    t = adm._tenants["a"]
+    assert t.last_finish == 0.0
+    assert not t.cola
+    assert adm._running == 0
+
+
+def test_lote_grande_no_deja_sin_turno_a_otro_tenant():
+    orden = []
+
+    async def pedir(tenant):
+        ticket = await adm.acquire(tenant)
+        orden.append(tenant)
+        await asyncio.sleep(0)
+        adm.release(ticket)
+
+    async def caso():
+        ocupado = await adm.acquire("lote")
+        tareas = [asyncio.create_task(pedir("lote")) for _ in range(4)]
+        await asyncio.sleep(0)
+        tareas.append(asyncio.create_task(pedir("otro")))
+        await asyncio.sleep(0)
+        adm.release(ocupado)
+        await asyncio.gather(*tareas)
+
+    asyncio.run(caso())
+    # "otro" llega al final pero su etiqueta (1) es menor que las del lote (2..5)
+    assert orden[0] == "otro"
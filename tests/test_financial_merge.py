@@ -0,0 +1,61 @@
+from utils.financial_merge import BALANCE, RESULTADOS, combinar_extracciones
+
+
+def test_valores_vacios_se_ignoran_y_campos_sin_valor_quedan_vacios():
+    datos, conflictos = combinar_extracciones([
+        ({"2023": {"Bancos": "", "Clientes": None, "Ingresos": "500"}}, {RESULTADOS}),
+        ({"2023": {"Bancos": "120"}}, {BALANCE}),
+    ])
+    assert datos == {"2023": {"Bancos": "120", "Clientes": "", "Ingresos": "500"}}
+    assert conflictos == []
+
+
+def test_valores_iguales_con_otro_formato_no_son_conflicto():
+    datos, conflictos = combinar_extracciones([
+        ({"2023": {"Total Activo": "1,234"}}, {BALANCE}),
+        ({"2023": {"Total Activo": "1234"}}, {BALANCE}),
+    ])
+    assert datos["2023"]["Total Activo"] == "1,234"
+    assert conflictos == []
+
+
+def test_gana_el_fragmento_del_estado_al_que_pertenece_el_campo():
+    # Dos fragmentos de balance repiten un valor de Ingresos leído de una nota;
+    # el de resultados gana aunque tenga menos votos
+    datos, conflictos = combinar_extracciones([
+        ({"2023": {"Ingresos": "900", "Bancos": "10"}}, {BALANCE}),
+        ({"2023": {"Ingresos": "1000"}}, {RESULTADOS}),
+        ({"2023": {"Ingresos": "900"}}, {BALANCE}),
+    ])
+    assert datos["2023"]["Ingresos"] == "1000"
+    assert conflictos == ["2023/Ingresos: ['900', '1000'] -> 1000"]
+
+
+def test_entre_fragmentos_del_mismo_estado_gana_la_mayoria():
+    datos, _ = combinar_extracciones([
+        ({"2022": {"Proveedores": "70"}}, {BALANCE}),
+        ({"2022": {"Proveedores": "75"}}, {BALANCE}),
+        ({"2022": {"Proveedores": "75"}}, {BALANCE, RESULTADOS}),
+    ])
+    assert datos["2022"]["Proveedores"] == "75"
+
+
+def test_empate_gana_el_primer_fragmento():
+    datos, conflictos = combinar_extracciones([
+        ({"2022": {"Capital Social": "50"}}, {BALANCE}),
+        ({"2022": {"Capital Social": "55"}}, {BALANCE}),
+    ])
+    assert datos["2022"]["Capital Social"] == "50"
+    assert len(conflictos) == 1
+
+
+def test_une_anios_y_conserva_el_orden_de_campos():
+    datos, _ = combinar_extracciones([
+        ({"2023": {"Bancos": "1", "Clientes": "2"}}, {BALANCE}),
+        (None, {BALANCE}),
+        ({2022: {"Clientes": "3", "Bancos": "4"}, "2021": "no es un dict"}, {BALANCE}),
+        ({"2023": {"Ingresos": "5"}}, {RESULTADOS}),
+    ])
+    assert list(datos) == ["2023", "2022"]
+    assert list(datos["2023"]) == ["Bancos", "Clientes", "Ingresos"]
+    assert datos["2022"] == {"Clientes": "3", "Bancos": "4"}
@@ -0,0 +1,64 @@
+import asyncio
+
+from services import hedging_service, model_router_service
+
+
+def _llamadas_con(respuestas: dict, latencia: dict):
+    llamadas = []
+
+    async def call(model_name: str):
+        llamadas.append(model_name)
+        await asyncio.sleep(latencia.get(model_name, 0))
+        resultado = respuestas[model_name]
+        if isinstance(resultado, Exception):
+            raise resultado
+        return resultado
+
+    return call, llamadas
+
+
+def _sin_historial(monkeypatch, delay_ms: float = 1000):
+    async def latency_percentile(model, percentile):
+        return None
+
+    monkeypatch.setattr(model_router_service, "latency_percentile", latency_percentile)
+    monkeypatch.setattr(hedging_service, "HEDGING_DEFAULT_DELAY_MS", delay_ms)
+
+
+def test_primario_falla_de_inmediato_usa_secundario(monkeypatch):
+    _sin_historial(monkeypatch)
+    call, llamadas = _llamadas_con({"a": RuntimeError("503"), "b": "ok-b"}, {})
+
+    assert asyncio.run(hedging_service.hedged_call(call, "a", "b")) == "ok-b"
+    assert llamadas == ["a", "b"]
+
+
+def test_primario_falla_tarde_sin_credito_usa_secundario(monkeypatch):
+    _sin_historial(monkeypatch, delay_ms=10)
+    monkeypatch.setattr(hedging_service, "_creditos", 0.0)
+    monkeypatch.setattr(hedging_service, "HEDGING_MAX_RATE", 0.0)
+    call, llamadas = _llamadas_con({"a": RuntimeError("503"), "b": "ok-b"}, {"a": 0.05})
+
+    assert asyncio.run(hedging_service.hedged_call(call, "a", "b")) == "ok-b"
+    assert llamadas == ["a", "b"]
+
+
+def test_primario_exitoso_no_llama_secundario(monkeypatch):
+    _sin_historial(monkeypatch)
+    call, llamadas = _llamadas_con({"a": "ok-a", "b": "ok-b"}, {})
+
+    assert asyncio.run(hedging_service.hedged_call(call, "a", "b")) == "ok-a"
+    assert llamadas == ["a"]
+
+
+def test_ambos_fallan_propaga_ultimo_error(monkeypatch):
+    _sin_historial(monkeypatch)
+    call, llamadas = _llamadas_con({"a": RuntimeError("a"), "b": RuntimeError("b")}, {})
+
+    try:
+        asyncio.run(hedging_service.hedged_call(call, "a", "b"))
+    except RuntimeError as e:
+        assert str(e) == "b"
+    else:
+        raise AssertionError("se esperaba RuntimeError")
+    assert llamadas == ["a", "b"]
@@ -0,0 +1,155 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from services import job_service
+
+KIND = "prueba"
+
+
+@pytest.fixture
+def jobs(monkeypatch, tmp_path):
+    monkeypatch.setattr(job_service, "JOBS_PATH", str(tmp_path / "jobs.sqlite3"))
+
+    async def handler(payload):
+        return {"eco": payload}
+
+    job_service.register(KIND, handler)
+    return job_service
+
+
+def _con_servicio(corrutina):
+    async def _correr():
+        tareas = job_service.start()
+        try:
+            return await corrutina()
+        finally:
+            for tarea in tareas:
+                tarea.cancel()
+            await asyncio.gather(*tareas, return_exceptions=True)
+
+    return asyncio.run(_correr())
+
+
+def test_misma_llave_mismo_tenant_reutiliza_el_trabajo(jobs):
+    async def caso():
+        a = await jobs.submit(KIND, [1], "tenant-a", "k1")
+        b = await jobs.submit(KIND, [1], "tenant-a", "k1")
+        return a, b
+
+    a, b = _con_servicio(caso)
+    assert a["job_id"] == b["job_id"]
+    assert jobs.stats()["reutilizados"] >= 1
+
+
+def test_misma_llave_otro_cuerpo_responde_409(jobs):
+    async def caso():
+        await jobs.submit(KIND, [1], "tenant-a", "k1")
+        with pytest.raises(HTTPException) as e:
+            await jobs.submit(KIND, [2], "tenant-a", "k1")
+        return e.value.status_code
+
+    assert _con_servicio(caso) == 409
+
+
+def test_llaves_y_lecturas_aisladas_por_tenant(jobs):
+    async def caso():
+        a = await jobs.submit(KIND, [1], "tenant-a", "k1")
+        # Misma llave y otro cuerpo en otro tenant: trabajo nuevo, sin 409
+        b = await jobs.submit(KIND, [2], "tenant-b", "k1")
+        return a, b, await jobs.get(a["job_id"], "tenant-b"), await jobs.get(a["job_id"], "tenant-a")
+
+    a, b, ajeno, propio = _con_servicio(caso)
+    assert a["job_id"] != b["job_id"]
+    assert ajeno is None
+    assert propio["job_id"] == a["job_id"]
+
+
+def test_trabajo_completado_guarda_resultado(jobs):
+    async def caso():
+        job = await jobs.submit(KIND, [1, 2], "tenant-a")
+        for _ in range(100):
+            actual = await jobs.get(job["job_id"], "tenant-a")
+            if actual["estado"] == jobs.DONE:
+                return actual
+            await asyncio.sleep(0.01)
+
+    assert _con_servicio(caso)["resultado"] == {"eco": [1, 2]}
+
+
+def _envejecer(job_id: str, segundos: float) -> None:
+    conn = job_service._connect()
+    try:
+        conn.execute("UPDATE tenant_jobs SET updated_at = updated_at - ? WHERE id = ?", (segundos, job_id))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def test_limpieza_respeta_trabajos_en_cola_renovados(jobs, monkeypatch):
+    monkeypatch.setattr(job_service, "JOBS_MAX_CONCURRENCY", 1)
+    liberar = asyncio.Event()
+
+    async def lento(payload):
+        await liberar.wait()
+        return payload
+
+    job_service.register("lento", lento)
+
+    async def caso():
+        ocupado = await jobs.submit("lento", [1], "tenant-a")
+        esperando = await jobs.submit("lento", [2], "tenant-a")
+        await asyncio.sleep(0.05)
+        # Backlog largo: ambos llevan más de JOBS_STALE_AFTER desde que se crearon
+        for job in (ocupado, esperando):
+            await jobs.run_blocking(_envejecer, job["job_id"], jobs.JOBS_STALE_AFTER * 2)
+        await jobs.run_blocking(jobs._latido, list(jobs._en_cola | jobs._en_ejecucion))
+        await jobs.run_blocking(jobs._cleanup)
+        estados = [(await jobs.get(j["job_id"], "tenant-a"))["estado"] for j in (ocupado, esperando)]
+        liberar.set()
+        return estados
+
+    assert _con_servicio(caso) == [jobs.RUNNING, jobs.QUEUED]
+
+
+def test_limpieza_marca_fallidos_los_trabajos_sin_worker(jobs):
+    async def caso():
+        # Trabajo registrado por un worker que murió: nadie lo renueva
+        job, _ = await jobs.run_blocking(jobs._insert, KIND, [1], "tenant-a", None)
+        await jobs.run_blocking(_envejecer, job["job_id"], jobs.JOBS_STALE_AFTER * 2)
+        await jobs.run_blocking(jobs._cleanup)
+        return await jobs.get(job["job_id"], "tenant-a")
+
+    job = _con_servicio(caso)
+    assert job["estado"] == jobs.FAILED
+    assert job["error_code"] == 500
+
+
+def test_trabajo_pasa_por_la_admision_del_tenant(jobs, monkeypatch):
+    from services import admission_service
+
+    monkeypatch.setattr(admission_service, "ADMISSION_ENABLED", True)
+    monkeypatch.setattr(admission_service, "_tenants", {})
+    monkeypatch.setattr(admission_service, "_running", 0)
+    monkeypatch.setattr(admission_service, "_virtual_time", 0.0)
+    vistos = []
+
+    async def observado(payload):
+        t = admission_service._tenants["tenant-a"]
+        vistos.append((t.running, t.last_finish))
+        return payload
+
+    job_service.register("costoso", observado, cost=3)
+
+    async def caso():
+        job = await jobs.submit("costoso", [1], "tenant-a")
+        for _ in range(100):
+            if (await jobs.get(job["job_id"], "tenant-a"))["estado"] == jobs.DONE:
+                return
+            await asyncio.sleep(0.01)
+
+    _con_servicio(caso)
+    # En ejecución ocupa un lugar del tenant y avanza su etiqueta en el costo
+    assert vistos == [(1, 3.0)]
+    assert admission_service._tenants["tenant-a"].running == 0
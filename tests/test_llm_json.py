@@ -0,0 +1,68 @@
+import json
+import random
+
+import pytest
+
+from utils.llm_json import JsonStreamExtractor, extract_json
+
+OBJETO = {"2023": {"Bancos": "12,721", "nota": "usa {llaves} y \"comillas\" \\ aquí"}, "vacio": {}}
+
+TEXTOS = [
+    json.dumps(OBJETO),
+    "```json\n" + json.dumps(OBJETO, indent=2) + "\n```",
+    "Aquí está el resultado {nota} del análisis:\n" + json.dumps(OBJETO) + "\nSaludos {fin}",
+    # Primer tramo balanceado pero inválido: se descarta y se toma el siguiente
+    '{"a": 1,} luego {"b": {"c": "}"}}',
+    '{"incompleto": [1, 2} texto {"ok": true}',
+    '{ }',
+    '{\n  "espacios": "antes de la clave"}',
+    'prefijo {   \n   "abre": "en otro fragmento"} sufijo',
+    '{"escape": "termina en \\\\"} {"otro": 1}',
+    '[1, 2] {"despues": "de una lista"}',
+]
+
+
+def _en_fragmentos(texto: str, cortes: list[int]):
+    extractor = JsonStreamExtractor()
+    previo = 0
+    for corte in cortes + [len(texto)]:
+        extractor.feed(texto[previo:corte])
+        previo = corte
+    return extractor
+
+
+@pytest.mark.parametrize("texto", TEXTOS)
+@pytest.mark.parametrize("tamano", [1, 2, 3, 7, 64])
+def test_fragmentos_fijos_igual_que_texto_completo(texto, tamano):
+    extractor = _en_fragmentos(texto, list(range(tamano, len(texto), tamano)))
+    assert extractor.done
+    assert extractor.result == extract_json(texto)
+
+
+@pytest.mark.parametrize("texto", TEXTOS)
+def test_cortes_aleatorios_igual_que_texto_completo(texto):
+    rng = random.Random(len(texto))
+    esperado = extract_json(texto)
+    for _ in range(50):
+        cortes = sorted(rng.sample(range(1, len(texto)), min(len(texto) - 1, rng.randint(1, 8))))
+        assert _en_fragmentos(texto, cortes).result == esperado
+
+
+def test_resultados_conocidos():
+    assert extract_json(TEXTOS[2]) == OBJETO
+    assert extract_json(TEXTOS[3]) == {"b": {"c": "}"}}
+    assert extract_json(TEXTOS[4]) == {"ok": True}
+    assert extract_json(TEXTOS[8]) == {"escape": "termina en \\"}
+
+
+def test_fragmentos_posteriores_se_ignoran():
+    extractor = JsonStreamExtractor()
+    assert extractor.feed('{"a": 1}') == {"a": 1}
+    assert extractor.feed('{"b": 2}') == {"a": 1}
+
+
+@pytest.mark.parametrize("texto", ["", "sin json", "{nota} y {otra}", '{"abierto": 1', "}{"])
+def test_sin_json_valido(texto):
+    with pytest.raises(ValueError):
+        extract_json(texto)
+    assert not _en_fragmentos(texto, list(range(1, len(texto)))).done
@@ -0,0 +1,66 @@
+import pytest
+
+from utils.numberNormalizer import MODO_ENTEROS, MODO_EU, MODO_MX, parse_numero
+
+
+@pytest.mark.parametrize("valor, esperado", [
+    ("31084188", 31084188.0),
+    ("12,721", 12721.0),
+    ("12,721.65", 12721.65),
+    ("12721.65", 12721.65),
+    ("1,234,567.00", 1234567.0),
+    ("$ 26,621", 26621.0),
+    ("USD 45,000", 45000.0),
+    ("45,000 MXN", 45000.0),
+    ("$USD 5", 5.0),
+    ("(12,300)", 12300.0),
+    ("-3500", 3500.0),
+    ("+2,020,513", 2020513.0),
+    ("15%", 15.0),
+    ("12.5 %", 12.5),
+    (456408, 456408.0),
+    (-27869960.0, 27869960.0),
+])
+def test_auto_convencion_mexicana(valor, esperado):
+    assert parse_numero(valor) == esperado
+
+
+@pytest.mark.parametrize("valor, esperado", [
+    ("1.234,56", 1234.56),
+    ("1.234.567", 1234567.0),
+    ("(1.234.567,89)", 1234567.89),
+])
+def test_auto_detecta_convencion_europea(valor, esperado):
+    assert parse_numero(valor) == esperado
+
+
+def test_modos_explicitos():
+    assert parse_numero("12.721,65", MODO_EU) == 12721.65
+    assert parse_numero("12.721", MODO_EU) == 12721.0
+    assert parse_numero("12,721.65", MODO_MX) == 12721.65
+    # Comportamiento histórico: se eliminan comas y puntos
+    assert parse_numero("12721.65", MODO_ENTEROS) == 1272165.0
+
+
+@pytest.mark.parametrize("valor", [None, "", "   ", "n/a", "NA", "Sin dato", "abc", "()", [1], "\xa0"])
+def test_invalidos(valor):
+    assert parse_numero(valor) is None
+
+
+@pytest.mark.parametrize("valor, esperado", [
+    # Regresión: el normalizador anterior aceptaba NBSP tras el símbolo de moneda
+    ("$\xa01,234,567", 1234567.0),
+    ("1 234 567", 1234567.0),
+    ("12\xa0%", 12.0),
+    ("€ 1.234,56", 1234.56),
+    ("£12.50", 12.5),
+    ("−1,234", 1234.0),
+    ("(\xa012,300\xa0)", 12300.0),
+    ("１２,３４５", 12345.0),
+])
+def test_valores_no_ascii(valor, esperado):
+    assert parse_numero(valor) == esperado
+
+
+def test_no_ascii_en_modo_enteros():
+    assert parse_numero("$\xa01,234,567", MODO_ENTEROS) == 1234567.0
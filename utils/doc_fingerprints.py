@@ -0,0 +1,238 @@
+"""
+Huellas de los tipos de documento mexicanos más comunes en /analyze_pdf.
+
+Cada tipo tiene:
+  - alias: nombres con los que llega en `tipo_doc` o en la respuesta del modelo,
+  - patrones con peso sobre el texto normalizado (mayúsculas, sin acentos); los
+    marcados como requeridos (el título o un identificador único) deben aparecer,
+  - rango de páginas esperado (huella de layout); fuera de él la confianza se reduce.
+
+`puntuar` da a cada tipo la proporción de su peso que aparece en el texto
+(0 a 1). `clasificar` toma una decisión sólo si el mejor tipo supera el umbral
+de confianza y ningún otro se le acerca; en cualquier otro caso devuelve None y
+hay que preguntar al modelo.
+"""
+
+import re
+import unicodedata
+from dataclasses import dataclass, field
+from typing import Optional
+
+# Patrones comunes
+_RFC = r"\b[A-Z&Ñ]{3,4}\d{6}[A-Z0-9]{3}\b"
+_CURP = r"\b[A-Z]{4}\d{6}[HM][A-Z]{5}[A-Z0-9]\d\b"
+_UUID = r"\b[0-9A-F]{8}-[0-9A-F]{4}-[0-9A-F]{4}-[0-9A-F]{4}-[0-9A-F]{12}\b"
+
+
+@dataclass(frozen=True)
+class _Patron:
+    regex: re.Pattern
+    peso: float
+    requerido: bool = False
+
+
+def _p(regex: str, peso: float = 1, requerido: bool = False) -> _Patron:
+    return _Patron(re.compile(regex), peso, requerido)
+
+
+@dataclass(frozen=True)
+class TipoDocumento:
+    clave: str
+    nombre: str  # Como lo reportaría el modelo: "El documento corresponde a {nombre}"
+    alias: tuple[str, ...]
+    patrones: tuple[_Patron, ...]
+    paginas: tuple[int, int]
+    peso_total: float = field(init=False)
+
+    def __post_init__(self):
+        object.__setattr__(self, "peso_total", sum(p.peso for p in self.patrones))
+
+
+TIPOS = (
+    TipoDocumento(
+        "INE", "una credencial INE",
+        ("ine", "ife", "credencial para votar", "credencial de elector", "credencial ine"),
+        (
+            _p(r"INSTITUTO (?:NACIONAL|FEDERAL) ELECTORAL", 3, requerido=True),
+            _p(r"CREDENCIAL PARA VOTAR", 3),
+            _p(r"CLAVE DE ELECTOR", 2),
+            _p(_CURP, 1),
+            _p(r"\bSECCION\b", 1),
+            _p(r"\bVIGENCIA\b", 1),
+            _p(r"ANO DE REGISTRO|\bEMISION\b", 1),
+        ),
+        (1, 2),
+    ),
+    TipoDocumento(
+        "CSF", "una constancia de situación fiscal",
+        ("csf", "constancia de situacion fiscal", "cedula fiscal", "cedula de identificacion fiscal",
+         "constancia fiscal", "constancia de rfc"),
+        (
+            _p(r"CONSTANCIA DE SITUACION FISCAL|CEDULA DE IDENTIFICACION FISCAL", 3, requerido=True),
+            _p(r"SERVICIO DE ADMINISTRACION TRIBUTARIA|\bSAT\b", 1),
+            _p(r"\bIDCIF\b", 2),
+            _p(r"DATOS DE IDENTIFICACION DEL CONTRIBUYENTE", 2),
+            _p(r"DATOS DEL DOMICILIO REGISTRADO", 2),
+            _p(r"ACTIVIDADES ECONOMICAS", 1),
+            _p(r"\bREGIMEN(?:ES)?\b", 1),
+            _p(_RFC, 1),
+        ),
+        (1, 5),
+    ),
+    TipoDocumento(
+        "CFDI", "un CFDI (factura)",
+        ("cfdi", "factura", "factura electronica", "comprobante fiscal", "comprobante fiscal digital"),
+        (
+            _p(r"FOLIO FISCAL|\bUUID\b", 2, requerido=True),
+            _p(_UUID, 2),
+            _p(r"SELLO DIGITAL DEL (?:CFDI|EMISOR)", 2),
+            _p(r"SELLO (?:DIGITAL )?DEL SAT", 2),
+            _p(r"CADENA ORIGINAL DEL COMPLEMENTO", 2),
+            _p(r"USO (?:DEL )?CFDI", 1),
+            _p(r"REPRESENTACION IMPRESA DE UN CFDI", 2),
+            _p(r"CERTIFICADO DEL (?:SAT|EMISOR)|NO\.? DE SERIE DEL CERTIFICADO", 1),
+            _p(_RFC, 1),
+        ),
+        (1, 10),
+    ),
+    TipoDocumento(
+        "OPINION", "una opinión de cumplimiento de obligaciones fiscales",
+        ("opinion de cumplimiento", "opinion del cumplimiento", "32-d", "32d", "opinion positiva",
+         "opinion de cumplimiento sat"),
+        (
+            _p(r"OPINION DEL CUMPLIMIENTO DE OBLIGACIONES FISCALES", 3, requerido=True),
+            _p(r"SERVICIO DE ADMINISTRACION TRIBUTARIA|\bSAT\b", 1),
+            _p(r"SENTIDO (?:DE LA OPINION|POSITIVO|NEGATIVO)|\bPOSITIV[OA]\b", 2),
+            _p(r"ARTICULO 32-D", 2),
+            _p(r"FOLIO", 1),
+            _p(_RFC, 1),
+        ),
+        (1, 3),
+    ),
+    TipoDocumento(
+        "CURP", "una constancia CURP",
+        ("curp", "constancia curp", "constancia de la curp", "clave unica de registro de poblacion"),
+        (
+            _p(r"CLAVE UNICA DE REGISTRO DE POBLACION|CONSTANCIA DE LA CLAVE UNICA", 3, requerido=True),
+            _p(r"REGISTRO NACIONAL DE POBLACION|\bRENAPO\b", 2),
+            _p(_CURP, 2),
+            _p(r"ENTIDAD DE REGISTRO", 1),
+            _p(r"FECHA DE INSCRIPCION", 1),
+        ),
+        (1, 2),
+    ),
+    TipoDocumento(
+        "ESTADO_CUENTA", "un estado de cuenta bancario",
+        ("estado de cuenta", "estado de cuenta bancario", "estados de cuenta"),
+        (
+            _p(r"ESTADO DE CUENTA", 3, requerido=True),
+            _p(r"SALDO ANTERIOR|SALDO INICIAL", 2),
+            _p(r"SALDO (?:FINAL|AL CORTE|ACTUAL)", 2),
+            _p(r"\bCLABE\b", 2),
+            _p(r"DEPOSITOS|ABONOS", 1),
+            _p(r"RETIROS|CARGOS", 1),
+            _p(r"PERIODO", 1),
+        ),
+        (1, 60),
+    ),
+    TipoDocumento(
+        "ACTA_CONSTITUTIVA", "un acta constitutiva",
+        ("acta constitutiva", "escritura constitutiva"),
+        (
+            _p(r"ACTA CONSTITUTIVA|CONSTITUCION DE (?:LA )?SOCIEDAD|CONSTITUYEN UNA SOCIEDAD", 3, requerido=True),
+            _p(r"NOTARIO PUBLICO|NOTARIA PUBLICA", 2),
+            _p(r"ESCRITURA PUBLICA|INSTRUMENTO (?:PUBLICO|NUMERO)", 2),
+            _p(r"SOCIEDAD ANONIMA|S\.?\s?A\.? DE C\.?\s?V\.?|SOCIEDAD DE RESPONSABILIDAD LIMITADA", 1),
+            _p(r"CAPITAL SOCIAL", 1),
+            _p(r"OBJETO SOCIAL", 1),
+            _p(r"REGISTRO PUBLICO DE (?:LA PROPIEDAD|COMERCIO)", 1),
+        ),
+        (3, 300),
+    ),
+)
+
+_POR_CLAVE = {t.clave: t for t in TIPOS}
+# Penalización a la confianza cuando el número de páginas no encaja con el tipo
+_FACTOR_LAYOUT = 0.5
+_SEPARADORES = re.compile(r"[\s_\-./]+")
+
+
+def normalizar(texto: str) -> str:
+    """
+    Mayúsculas sin acentos (la Ñ se conserva) y espacios colapsados.
+    """
+    texto = texto.upper().replace("Ñ", "\0")
+    texto = "".join(c for c in unicodedata.normalize("NFKD", texto) if not unicodedata.combining(c))
+    return " ".join(texto.replace("\0", "Ñ").split())
+
+
+def _normalizar_alias(texto: str) -> str:
+    return _SEPARADORES.sub(" ", normalizar(texto).lower()).strip()
+
+
+_ALIAS = {_normalizar_alias(alias): t.clave for t in TIPOS for alias in (t.clave, *t.alias)}
+
+
+def tipo_por_nombre(nombre: str) -> Optional[str]:
+    """
+    Clave del tipo para un `tipo_doc` ("INE", "Constancia de situación fiscal"...);
+    None si no es un tipo conocido.
+    """
+    return _ALIAS.get(_normalizar_alias(nombre))
+
+
+def tipo_en_respuesta(texto: str) -> Optional[str]:
+    """
+    Tipo mencionado en una respuesta libre del modelo ("El documento corresponde
+    a un INE"); None si no se menciona ninguno o más de uno.
+    """
+    normalizado = f" {_normalizar_alias(texto)} "
+    encontrados = {clave for alias, clave in _ALIAS.items() if f" {alias} " in normalizado}
+    return encontrados.pop() if len(encontrados) == 1 else None
+
+
+def nombre(clave: str) -> str:
+    return _POR_CLAVE[clave].nombre
+
+
+def puntuar(texto: str, paginas: int) -> dict[str, float]:
+    """
+    Confianza (0 a 1) de cada tipo para un texto ya normalizado con `paginas` páginas.
+    """
+    puntajes = {}
+    for tipo in TIPOS:
+        obtenido = 0.0
+        for patron in tipo.patrones:
+            if patron.regex.search(texto):
+                obtenido += patron.peso
+            elif patron.requerido:
+                obtenido = 0.0
+                break
+        confianza = obtenido / tipo.peso_total
+        if not tipo.paginas[0] <= paginas <= tipo.paginas[1]:
+            confianza *= _FACTOR_LAYOUT
+        puntajes[tipo.clave] = round(confianza, 3)
+    return puntajes
+
+
+@dataclass
+class Clasificacion:
+    tipo: str
+    confianza: float
+    rival: Optional[str]
+    confianza_rival: float
+
+
+def clasificar(puntajes: dict[str, float], min_confianza: float, max_rival: float) -> Optional[Clasificacion]:
+    """
+    Tipo ganador si su confianza es al menos `min_confianza` y la del segundo no
+    pasa de `max_rival`; None si el resultado no es concluyente.
+    """
+    orden = sorted(puntajes.items(), key=lambda kv: kv[1], reverse=True)
+    if not orden:
+        return None
+    mejor, confianza = orden[0]
+    rival, confianza_rival = orden[1] if len(orden) > 1 else (None, 0.0)
+    if confianza < min_confianza or confianza_rival > max_rival:
+        return None
+    return Clasificacion(mejor, confianza, rival, confianza_rival)
@@ -1,38 +1,17 @@
 import json
 from typing import Optional, Union, Dict, Any
 
-def _parse_numero(valor: Union[str, float, int, None]) -> Optional[float]:
+from utils.numberNormalizer import MODO_AUTO, parse_numero
+
+def _parse_numero(valor: Union[str, float, int, None], modo: str = MODO_AUTO) -> Optional[float]:
     """
     Convierte un valor a float robustamente (bancario):
-    - Quita separadores de miles y decimales, paréntesis, signos y moneda.
+    - Quita separadores de miles, paréntesis, signos y moneda.
+    - Interpreta el punto decimal según `modo` (ver utils.numberNormalizer).
     - Maneja valores negativos por paréntesis o signo.
     - Retorna valor absoluto o None si es inválido.
     """
-    if valor is None:
-        return None
-    if isinstance(valor, (int, float)):
-        return abs(float(valor))
-    if not isinstance(valor, str):
-        return None
-
-    s = valor.strip()
-    if not s or s.lower() in ["na", "n/a", "sin dato"]:
-        return None
-    # Paréntesis = negativo
-    negativo = False
-    if s.startswith("(") and s.endswith(")"):
-        s = s[1:-1]
-        negativo = True
-    # Quitar símbolos, moneda, espacios
-    for simbolo in ["$", "USD", "MXN", "%", "+", "-"]:
-        s = s.replace(simbolo, "")
-    s = s.replace(",", "")  # Miles
-    s = s.replace(".", "")  # Decimales (se espera solo enteros)
-    try:
-        val = float(s)
-        return abs(val)
-    except ValueError:
-        return None
+    return parse_numero(valor, modo)
 
 def safe_div(a: Optional[float], b: Optional[float]) -> Optional[float]:
     if a is None or b is None or b == 0:
@@ -0,0 +1,192 @@
+"""
+Versión columnar (NumPy) de `calcular_razones_financieras_bancario` para muchas
+empresas a la vez.
+
+Todas las filas (empresa, año) se cargan en arreglos enmascarados: un valor
+None se representa como elemento enmascarado, y cada operación propaga la
+máscara igual que `safe_div`/`safe_sub`/`safe_mul` propagan None (la división
+entre cero también queda enmascarada). El redondeo replica `round(x, 2)` de
+Python, incluidos los casos de empate.
+"""
+
+import json
+from typing import Any, Dict, Optional
+import numpy as np
+
+from utils.numberNormalizer import parse_numero
+
+# Campos del balance usados por las razones (claves en minúsculas, como en el cálculo escalar)
+_CAMPOS = [
+    "bancos",
+    "clientes",
+    "inventarios",
+    "total activo circulante",
+    "proveedores",
+    "total pasivo a corto plazo",
+    "total pasivo a largo plazo",
+    "total pasivo",
+    "utilidad o pérdida del ejercicio",
+    "total capital contable",
+    "ingresos",
+    "costos de venta y/o servicio",
+    "total activo",
+]
+
+# Orden de salida idéntico al de calcular_razones_financieras_bancario
+_RAZONES = [
+    "razon_corriente",
+    "prueba_acida",
+    "capital_trabajo",
+    "razon_endeudamiento",
+    "razon_apalancamiento",
+    "razon_endeudamiento_largo_plazo",
+    "margen_utilidad",
+    "roa",
+    "roe",
+    "rotacion_cartera",
+    "rotacion_inventario",
+    "rotacion_proveedores",
+    "cobertura_intereses",
+]
+_INCREMENTOS = [
+    "incremento_ventas_pct",
+    "incremento_utilidad_pct",
+    "incremento_activo_pct",
+]
+
+
+def _round2(x: np.ma.MaskedArray) -> np.ma.MaskedArray:
+    """
+    round(x, 2) vectorizado. np.round puede diferir de Python cerca de los empates
+    (x * 100 ≈ k + 0.5); esos pocos elementos se redondean con round().
+    """
+    datos = x.filled(0.0)
+    redondeado = np.round(datos, 2)
+    escalado = datos * 100
+    fraccion = escalado - np.floor(escalado)
+    cerca_empate = np.abs(fraccion - 0.5) <= 1e-7 * np.maximum(1.0, np.abs(escalado))
+    cerca_empate &= ~np.ma.getmaskarray(x)
+    for i in np.flatnonzero(cerca_empate):
+        redondeado[i] = round(float(datos[i]), 2)
+    return np.ma.array(redondeado, mask=np.ma.getmaskarray(x))
+
+
+def _div(a: np.ma.MaskedArray, b: np.ma.MaskedArray) -> np.ma.MaskedArray:
+    # np.ma.divide enmascara b == 0, como safe_div devuelve None
+    return _round2(np.ma.divide(a, b))
+
+
+def _sub(a: np.ma.MaskedArray, b: np.ma.MaskedArray) -> np.ma.MaskedArray:
+    return _round2(a - b)
+
+
+def _mul(a: np.ma.MaskedArray, b: float) -> np.ma.MaskedArray:
+    return _round2(a * b)
+
+
+def _columna(valores: list) -> np.ma.MaskedArray:
+    # Con dtype=float, None (valor inválido) queda como NaN y luego enmascarado
+    return np.ma.masked_invalid(np.array([parse_numero(v) for v in valores], dtype=float))
+
+
+def _anterior(col: np.ma.MaskedArray, misma_empresa: np.ndarray) -> np.ma.MaskedArray:
+    # Valor de la fila previa si pertenece a la misma empresa; si no, enmascarado
+    previo = np.ma.masked_all(col.shape, dtype=float)
+    previo[1:] = col[:-1]
+    previo[~misma_empresa] = np.ma.masked
+    return previo
+
+
+def calcular_razones_financieras_batch(
+    empresas: Dict[str, Dict[str, Dict[str, Any]]]
+) -> Dict[str, Dict[str, Dict[str, Optional[float]]]]:
+    """
+    Calcula las razones financieras bancarias de muchas empresas en una pasada columnar.
+    Recibe {empresa: {año: datos}} y devuelve {empresa: razones}, donde cada `razones`
+    es idéntico a lo que devuelve calcular_razones_financieras_bancario para esa empresa.
+    """
+    filas: list[tuple[str, str]] = []
+    valores: Dict[str, list] = {campo: [] for campo in _CAMPOS}
+
+    for empresa, datos_balance in empresas.items():
+        for anio in sorted(datos_balance.keys()):
+            bal = {k.lower(): v for k, v in datos_balance.get(anio, {}).items()}
+            filas.append((empresa, anio))
+            for campo in _CAMPOS:
+                valores[campo].append(bal.get(campo))
+
+    salida: Dict[str, Dict[str, Dict[str, Optional[float]]]] = {empresa: {} for empresa in empresas}
+    if not filas:
+        return salida
+
+    c = {campo: _columna(valores[campo]) for campo in _CAMPOS}
+    n = len(filas)
+
+    ac = c["total activo circulante"]
+    pcp = c["total pasivo a corto plazo"]
+    at = c["total activo"]
+    tp = c["total pasivo"]
+    tcc = c["total capital contable"]
+    ue = c["utilidad o pérdida del ejercicio"]
+    vt = c["ingresos"]
+    cv = c["costos de venta y/o servicio"]
+
+    razones = {
+        # Razones de liquidez
+        "razon_corriente": _div(ac, pcp),
+        "prueba_acida": _div(_sub(_sub(ac, c["inventarios"]), c["bancos"]), pcp),
+        "capital_trabajo": _sub(ac, pcp),
+        # Razones de endeudamiento
+        "razon_endeudamiento": _div(tp, at),
+        "razon_apalancamiento": _div(tp, tcc),
+        "razon_endeudamiento_largo_plazo": _div(c["total pasivo a largo plazo"], at),
+        # Rentabilidad y márgenes
+        "margen_utilidad": _div(ue, vt),
+        "roa": _div(ue, at),
+        "roe": _div(ue, tcc),
+        # Eficiencia operativa (rotaciones)
+        "rotacion_cartera": _div(vt, c["clientes"]),
+        "rotacion_inventario": _div(cv, c["inventarios"]),
+        "rotacion_proveedores": _div(cv, c["proveedores"]),
+        # Cobertura y otros
+        "cobertura_intereses": np.ma.masked_all(n, dtype=float),
+    }
+
+    # Incrementos interanuales: fila previa de la misma empresa (años ya ordenados)
+    empresas_col = [empresa for empresa, _ in filas]
+    misma_empresa = np.zeros(n, dtype=bool)
+    misma_empresa[1:] = [empresas_col[i] == empresas_col[i - 1] for i in range(1, n)]
+
+    incrementos = {}
+    for nombre, col in (
+        ("incremento_ventas_pct", vt),
+        ("incremento_utilidad_pct", ue),
+        ("incremento_activo_pct", at),
+    ):
+        previo = _anterior(col, misma_empresa)
+        incrementos[nombre] = _mul(_div(_sub(col, previo), previo), 100)
+
+    razones_listas = {k: v.tolist() for k, v in razones.items()}
+    incrementos_listas = {k: v.tolist() for k, v in incrementos.items()}
+
+    for i, (empresa, anio) in enumerate(filas):
+        fila = {k: razones_listas[k][i] for k in _RAZONES}
+        if misma_empresa[i]:
+            fila.update({k: incrementos_listas[k][i] for k in _INCREMENTOS})
+        salida[empresa][anio] = fila
+
+    return salida
+
+
+# Ejemplo de uso:
+if __name__ == "__main__":
+    empresas = {
+        "empresa_a": {
+            "2019": {"Total Activo Circulante": "10500000", "Total Pasivo a Corto Plazo": "6500", "Ingresos": "31084188"},
+            "2020": {"Total Activo Circulante": "12000000", "Total Pasivo a Corto Plazo": "7000", "Ingresos": "26507587"},
+        },
+        "empresa_b": {
+            "2021": {"Total Activo": "34623840", "Total Pasivo": "16180.11"},
+        },
+    }
+    print(json.dumps(calcular_razones_financieras_batch(empresas), indent=2, ensure_ascii=False))
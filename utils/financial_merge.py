@@ -0,0 +1,88 @@
+"""
+Combinación de extracciones parciales {año: {campo: valor}} de un mismo PDF.
+
+Cuando un reporte se extrae por fragmentos de páginas, el mismo campo puede
+llegar de varios fragmentos (p. ej. "Utilidad o pérdida del ejercicio" aparece en
+el balance y en el estado de resultados, o el mismo estado se repite en la
+sección comparativa). Por año y campo:
+  1. Se ignoran los valores vacíos; si no hay ninguno el campo queda "".
+  2. Los valores se comparan ya normalizados (parse_numero), así "1,234" y
+     "1234" cuentan como el mismo.
+  3. Gana el valor que proviene de un fragmento del estado al que pertenece el
+     campo (balance o resultados); entre esos, el que más fragmentos reportan;
+     si aún empatan, el del primer fragmento (orden de páginas).
+"""
+
+from typing import Iterable, Optional
+
+from utils.numberNormalizer import parse_numero
+
+BALANCE = "balance"
+RESULTADOS = "resultados"
+
+# Campos del estado de resultados; el resto pertenece al balance
+CAMPOS_RESULTADOS = frozenset({
+    "Ingresos",
+    "Costos de venta y/o servicio",
+    "Utilidad o pérdida del ejercicio",
+})
+
+
+def _clave(valor) -> Optional[object]:
+    numero = parse_numero(valor)
+    if numero is not None:
+        return numero
+    texto = str(valor).strip()
+    return texto or None
+
+
+def combinar_extracciones(parciales: Iterable[tuple[dict, set[str]]]) -> tuple[dict, list[str]]:
+    """
+    Combina extracciones parciales en un solo {año: {campo: valor}}.
+    `parciales` son pares (datos, tipos del fragmento), en orden de páginas.
+    Devuelve (datos combinados, descripción de los conflictos resueltos).
+    """
+    # (año, campo) -> {clave normalizada: [valor original, votos, prioridad, orden]}
+    candidatos: dict[tuple[str, str], dict] = {}
+    anios: dict[str, list[str]] = {}
+
+    for orden, (datos, tipos) in enumerate(parciales):
+        if not isinstance(datos, dict):
+            continue
+        for anio, campos in datos.items():
+            if not isinstance(campos, dict):
+                continue
+            orden_campos = anios.setdefault(str(anio), [])
+            for campo, valor in campos.items():
+                if campo not in orden_campos:
+                    orden_campos.append(campo)
+                if valor in ("", None):
+                    continue
+                clave = _clave(valor)
+                if clave is None:
+                    continue
+                estado = RESULTADOS if campo in CAMPOS_RESULTADOS else BALANCE
+                votos = candidatos.setdefault((str(anio), campo), {})
+                actual = votos.get(clave)
+                if actual is None:
+                    votos[clave] = [valor, 1, estado in tipos, orden]
+                else:
+                    actual[1] += 1
+                    actual[2] = actual[2] or estado in tipos
+
+    combinados: dict[str, dict] = {}
+    conflictos: list[str] = []
+    for anio, campos in anios.items():
+        combinados[anio] = {}
+        for campo in campos:
+            votos = candidatos.get((anio, campo))
+            if not votos:
+                combinados[anio][campo] = ""
+                continue
+            ganador = max(votos.values(), key=lambda v: (v[2], v[1], -v[3]))
+            combinados[anio][campo] = ganador[0]
+            if len(votos) > 1:
+                conflictos.append(
+                    f"{anio}/{campo}: {[v[0] for v in votos.values()]} -> {ganador[0]}"
+                )
+    return combinados, conflictos
@@ -0,0 +1,158 @@
+"""
+Extracción del primer objeto JSON de una respuesta de LLM.
+
+Una sola pasada sobre el texto: fuera de un objeto sólo se busca una `{` seguida
+de comillas o `}` (una llave como "{nota}" en la prosa no puede abrir un objeto
+JSON); dentro se lleva la profundidad de llaves y si se está dentro de una cadena
+(con escapes), así que las llaves dentro de strings no cuentan. Cuando la
+profundidad vuelve a cero el tramo balanceado se decodifica con `raw_decode`; si
+no es JSON válido se descarta y se sigue con el siguiente. Los tramos son
+disjuntos, así que el costo total es lineal en el tamaño del texto.
+
+`JsonStreamExtractor` recibe el texto por fragmentos (streaming) y conserva sólo
+el tramo del objeto en curso; `extract_json` es el caso de texto completo.
+"""
+
+import json
+import re
+from typing import Any, Optional
+
+_decoder = json.JSONDecoder()
+# Dentro de un objeto (fuera de cadenas) sólo importan llaves y comillas
+_ESTRUCTURA = re.compile(r'[{}"]')
+_CADENA = re.compile(r'["\\]')
+# Un objeto JSON empieza con "{" seguido de una clave o de "}"; descarta "{nota}" sin decodificar
+_INICIO_OBJETO = re.compile(r'\{\s*["}]')
+# "{" al final del fragmento: lo que sigue llega en el próximo
+_INICIO_INCOMPLETO = re.compile(r'\{\s*\Z')
+_NO_ESPACIO = re.compile(r'\S')
+# Intentos de raw_decode directo al abrir un tramo. Cubren el caso común (el primer
+# objeto es el JSON) a velocidad de C; se limitan porque cada fallo cuesta O(n).
+_INTENTOS_OPTIMISTAS = 2
+
+
+class JsonStreamExtractor:
+    """
+    Busca el primer objeto JSON válido en un texto que llega por fragmentos.
+    `feed()` devuelve el objeto en cuanto se completa (y lo guarda en `result`);
+    los fragmentos posteriores se ignoran.
+    """
+
+    def __init__(self):
+        self.result: Optional[Any] = None
+        self.done = False
+        self._partes: list[str] = []  # Texto del objeto en curso
+        self._profundidad = 0
+        self._en_cadena = False
+        self._escape = False  # El fragmento anterior terminó en "\" dentro de una cadena
+        self._inicio_pendiente = False  # Tramo abierto con "{" al final del fragmento anterior
+        self._intentos = _INTENTOS_OPTIMISTAS
+
+    def _terminar(self, valor: Any) -> Any:
+        self.result = valor
+        self.done = True
+        self._partes = []
+        return valor
+
+    def feed(self, chunk: str) -> Optional[Any]:
+        if self.done or not chunk:
+            return self.result
+
+        n = len(chunk)
+        pos = 0
+        inicio = 0
+        if self._inicio_pendiente:
+            m = _NO_ESPACIO.search(chunk)
+            if m is None:
+                self._partes.append(chunk)
+                return None
+            self._inicio_pendiente = False
+            if chunk[m.start()] not in '"}':
+                # Era una llave de la prosa ("{nota}"): descartar el tramo
+                self._profundidad = 0
+                self._partes = []
+        if self._escape:
+            # El carácter escapado es el primero de este fragmento
+            self._escape = False
+            pos = 1
+
+        while pos < n:
+            if self._profundidad == 0:
+                # Fuera de un objeto sólo "{" abre un tramo; el resto es prosa
+                i = chunk.find("{", pos)
+                if i == -1:
+                    return None
+                pos = i + 1
+                parece_objeto = _INICIO_OBJETO.match(chunk, i) is not None
+                if not parece_objeto and not _INICIO_INCOMPLETO.match(chunk, i):
+                    # "{nota}": no puede abrir un objeto JSON, se trata como prosa
+                    continue
+                inicio = i
+                self._partes = []
+                self._profundidad = 1
+                self._en_cadena = False
+                self._inicio_pendiente = not parece_objeto
+                if self._intentos and parece_objeto:
+                    self._intentos -= 1
+                    try:
+                        valor, _ = _decoder.raw_decode(chunk, i)
+                    except (ValueError, RecursionError):
+                        pass  # Incompleto o inválido: lo resuelve el escaneo
+                    else:
+                        return self._terminar(valor)
+                continue
+
+            if self._en_cadena:
+                m = _CADENA.search(chunk, pos)
+                if m is None:
+                    break
+                i = m.start()
+                if chunk[i] == "\\":
+                    if i + 1 >= n:
+                        self._escape = True
+                    pos = i + 2
+                else:
+                    self._en_cadena = False
+                    pos = i + 1
+                continue
+
+            m = _ESTRUCTURA.search(chunk, pos)
+            if m is None:
+                break
+            i = m.start()
+            pos = i + 1
+            c = chunk[i]
+            if c == '"':
+                self._en_cadena = True
+            elif c == "{":
+                self._profundidad += 1
+            else:
+                self._profundidad -= 1
+                if self._profundidad == 0:
+                    self._partes.append(chunk[inicio:pos])
+                    texto = "".join(self._partes)
+                    self._partes = []
+                    if not _INICIO_OBJETO.match(texto):
+                        continue
+                    try:
+                        valor, _ = _decoder.raw_decode(texto)
+                    except (ValueError, RecursionError):
+                        # Tramo balanceado pero no es JSON (o anidado en exceso): seguir buscando
+                        continue
+                    return self._terminar(valor)
+
+        if self._profundidad > 0:
+            self._partes.append(chunk[inicio:])
+        return None
+
+
+def extract_json(text):
+    """
+    Extrae el primer bloque JSON de una respuesta de LLM, ignorando encabezados
+    tipo markdown y texto alrededor.
+    """
+    extractor = JsonStreamExtractor()
+    extractor.feed(text)
+    if extractor.done:
+        return extractor.result
+    raise ValueError("No se encontró un JSON válido en la respuesta.")
@@ -0,0 +1,133 @@
+"""
+Normalizador numérico para los valores que devuelve el LLM en los estados financieros.
+
+Una sola pasada por valor: `bytes.translate` con una tabla por modo elimina signos,
+%, $ y separadores de miles (y convierte la coma decimal) a la vez; USD/MXN sólo se
+buscan cuando el valor empieza o termina en letra. El caso más común (sólo dígitos)
+tiene un atajo. Los valores con caracteres no ASCII (NBSP, €, dígitos de ancho
+completo) se normalizan antes a ASCII y siguen el mismo camino.
+
+Modos de separadores (`modo`):
+  - "auto" (default): convención mexicana (coma = miles, punto = decimal), pero
+    si el último separador es una coma precedida de puntos ("1.234,56") o hay
+    varios puntos ("1.234.567"), se interpreta como convención europea.
+  - "mx": coma = miles, punto = decimal ("12,721.65" → 12721.65).
+  - "eu": punto = miles, coma = decimal ("12.721,65" → 12721.65).
+  - "enteros": comportamiento histórico; elimina comas y puntos
+    ("12721.65" → 1272165). Sólo para datos ya normalizados a enteros.
+"""
+
+import unicodedata
+from typing import Optional, Union
+
+MODO_AUTO = "auto"
+MODO_MX = "mx"
+MODO_EU = "eu"
+MODO_ENTEROS = "enteros"
+MODOS = (MODO_AUTO, MODO_MX, MODO_EU, MODO_ENTEROS)
+
+_VACIOS = frozenset({"na", "n/a", "sin dato"})
+_SIMBOLOS = b"$%+-"
+# Por modo: (tabla de reemplazo, bytes a eliminar). bytes.translate aplica ambas en
+# una sola pasada en C; float() acepta bytes directamente.
+_COMA_A_PUNTO = bytes.maketrans(b",", b".")
+_TABLAS = {
+    MODO_ENTEROS: (None, _SIMBOLOS + b",."),
+    MODO_MX: (None, _SIMBOLOS + b","),
+    MODO_EU: (_COMA_A_PUNTO, _SIMBOLOS + b"."),
+}
+
+
+_TABLA_MX = _TABLAS[MODO_MX]
+_TABLA_EU = _TABLAS[MODO_EU]
+_TABLA_ENTEROS = _TABLAS[MODO_ENTEROS]
+
+
+def _normalizar_unicode(s: str) -> str:
+    """
+    Lleva a ASCII lo que el LLM copia tal cual del PDF: quita espacios Unicode
+    (NBSP, espacio fino) y símbolos de moneda (€, £), cambia el signo menos "−"
+    por "-", y NFKC convierte dígitos y signos de ancho completo.
+    """
+    s = "".join(
+        "-" if c == "\u2212" else c
+        for c in s
+        if c.isascii() or not (c.isspace() or unicodedata.category(c) == "Sc")
+    )
+    return unicodedata.normalize("NFKC", s).strip()
+
+
+def _tabla_auto(b: bytes, punto: int) -> tuple:
+    # `punto`: posición del último "." (> -1), ya calculada por parse_numero
+    if b.rfind(b",") > punto:
+        # "1.234,56": último separador coma con puntos antes → europeo
+        return _TABLA_EU
+    if b.find(b".") != punto:
+        # "1.234.567": puntos como miles
+        return _TABLA_ENTEROS
+    return _TABLA_MX
+
+
+def parse_numero(valor: Union[str, float, int, None], modo: str = MODO_AUTO) -> Optional[float]:
+    """
+    Convierte un valor a float (valor absoluto) o None si es inválido:
+    - Paréntesis o signo = negativo; se devuelve el valor absoluto.
+    - Quita símbolos de moneda ($, USD, MXN), % y signos.
+    - Interpreta separadores de miles/decimales según `modo`.
+    """
+    if valor is None:
+        return None
+    # str antes que el isinstance con tupla: es lo que llega del LLM
+    if not isinstance(valor, str):
+        if isinstance(valor, (int, float)):
+            return abs(float(valor))
+        return None
+
+    s = valor.strip()
+    # Atajo: sólo dígitos ASCII (lo que pide el prompt)
+    if s.isdigit() and s.isascii():
+        return float(s)
+    if not s:
+        return None
+    if not s.isascii():
+        s = _normalizar_unicode(s)
+        if not s:
+            return None
+        if not s.isascii():
+            # Quedan caracteres sin equivalente ASCII (p. ej. otros dígitos Unicode)
+            if s[0] == "(" and s[-1] == ")":
+                s = s[1:-1]
+            try:
+                return abs(float(s))
+            except ValueError:
+                return None
+    b = s.encode("ascii")
+    primero, ultimo = b[0], b[-1]
+    if primero == 40 and ultimo == 41:  # "(...)"
+        b = b[1:-1]
+    # Letra al inicio o al final (>= "A"): vacíos ("n/a") o código de moneda
+    # ("USD 45,000", "45,000 MXN")
+    if primero >= 65 or ultimo >= 65:
+        if s.lower() in _VACIOS:
+            return None
+        b = b.replace(b"USD", b"").replace(b"MXN", b"")
+    if modo != MODO_AUTO:
+        tabla, borrar = _TABLAS[modo]
+    else:
+        punto = b.rfind(b".")
+        # Sin puntos (lo más común con formato): convención mexicana
+        tabla, borrar = _TABLA_MX if punto == -1 else _tabla_auto(b, punto)
+    try:
+        # Los signos ya se eliminaron: el resultado no puede ser negativo
+        return float(b.translate(tabla, borrar))
+    except ValueError:
+        pass
+    # Poco común: código de moneda en medio ("$USD 5")
+    if b"USD" in b or b"MXN" in b:
+        b = b.replace(b"USD", b"").replace(b"MXN", b"")
+        try:
+            return float(b.translate(tabla, borrar))
+        except ValueError:
+            pass
+    return None
+
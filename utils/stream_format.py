@@ -0,0 +1,43 @@
+"""
+Formato de eventos para respuestas en streaming: NDJSON por defecto o
+Server-Sent Events si el cliente envía `Accept: text/event-stream`.
+"""
+
+import json
+from typing import AsyncIterator, Callable
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+
+
+def formato_sse(evento: dict) -> str:
+    return f"event: {evento['tipo']}\ndata: {json.dumps(evento, ensure_ascii=False)}\n\n"
+
+
+def formato_ndjson(evento: dict) -> str:
+    return json.dumps(evento, ensure_ascii=False) + "\n"
+
+
+def _elegir_formato(request: Request) -> tuple[Callable[[dict], str], str]:
+    if "text/event-stream" in request.headers.get("accept", ""):
+        return formato_sse, "text/event-stream"
+    return formato_ndjson, "application/x-ndjson"
+
+
+def streaming_response(request: Request, eventos: AsyncIterator[dict]) -> StreamingResponse:
+    """
+    Envuelve un generador de eventos (dicts con clave "tipo") en una
+    StreamingResponse con el formato que pide el cliente. Si el cliente se
+    desconecta, Starlette cancela el generador.
+    """
+    formato, media_type = _elegir_formato(request)
+
+    async def cuerpo():
+        async for evento in eventos:
+            yield formato(evento)
+
+    return StreamingResponse(
+        cuerpo(),
+        media_type=media_type,
+        # Evita que proxies (nginx) acumulen la respuesta
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -52,6 +52,19 @@ $context
 ### RESPUESTA:
 """.strip())
 
+# Variante para salida estructurada (response_schema + JSON): mismas reglas y
+# conceptos; la forma de la respuesta la fija el esquema, no el ejemplo.
+PROMPT_ESTADO_SITUACION_FINANCIERA_ESTRUCTURADO = Template(
+    PROMPT_ESTADO_SITUACION_FINANCIERA.template.split("**Estructura tu respuesta JSON así:**")[0]
+    + """**Formato de respuesta:**
+Devuelve un objeto con la lista "anios": una entrada por cada año presente en el contexto, con el año en "anio" y todas las claves estándar (con "" si no están).
+
+### CONTEXTO PROPORCIONADO:
+$context
+
+### RESPUESTA:"""
+)
+
 
 
 